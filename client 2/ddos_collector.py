@@ -0,0 +1,286 @@
+import argparse
+import json
+import logging
+import math
+import os
+import queue
+import random
+import socket
+import threading
+import time
+import urllib.request
+from collections import deque
+from datetime import datetime
+
+import psutil
+
+from utils.segments import SegmentWriter
+
+# Long-running version of the window detector in sample2.py: fixed-cadence
+# sampling of psutil.net_io_counters, thresholds from an incrementally
+# maintained sliding baseline, windows written through a buffered segment
+# writer (plus the JSON logs the dashboard reads) and shipped to the server's
+# /alerts/batch endpoint in batches.
+
+ATTACK_FLAG_PATH = "attack_status.json"
+log = logging.getLogger("ddos_collector")
+
+
+def inject_attack_spikes(packets, bytes_recv, dropped, strength=300):
+    tampered_packets = packets + strength
+    tampered_bytes = bytes_recv + strength * 2000
+    tampered_dropped = dropped + 30
+    log.debug("Injected Attack -> Packets=%s, Bytes=%s, Dropped=%s", tampered_packets, tampered_bytes, tampered_dropped)
+    return tampered_packets, tampered_bytes, tampered_dropped
+
+
+class SlidingThreshold:
+    # mean + k * stdev over the last `size` samples, kept with running sums so
+    # each update and each threshold read is O(1).
+
+    def __init__(self, size, k=1.5, floor=1.0):
+        self.values = deque(maxlen=size)
+        self.k = k
+        self.floor = floor
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def update(self, x):
+        if len(self.values) == self.values.maxlen:
+            old = self.values[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.values.append(x)
+        self.total += x
+        self.total_sq += x * x
+
+    def threshold(self):
+        n = len(self.values)
+        if n < 2:
+            return math.inf
+        mean = self.total / n
+        var = max(0.0, (self.total_sq - n * mean * mean) / (n - 1))
+        return mean + self.k * max(math.sqrt(var), self.floor)
+
+
+class BatchShipper:
+    # Sends records to POST /alerts/batch from a background thread so a slow or
+    # unreachable server never delays sampling. Oldest records are dropped
+    # when the queue is full.
+
+    def __init__(self, url, batch_size=200, interval=2.0, max_queue=10000):
+        self.url = url
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ddos-shipper", daemon=True)
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        self._thread.start()
+
+    def put(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            self._queue.put_nowait(record)
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _post(self, batch):
+        body = json.dumps(batch).encode()
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+            self.sent += len(batch)
+        except OSError as e:
+            self.failed += len(batch)
+            log.warning("Shipping %d records failed: %s", len(batch), e)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            while True:
+                batch = self._drain()
+                if not batch:
+                    break
+                self._post(batch)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        batch = self._drain()
+        if batch:
+            self._post(batch)
+
+
+class DDoSCollector:
+    def __init__(self, rate=10.0, window_seconds=3.0, baseline_seconds=60.0, logs_path="logs", json_logs=True,
+                 server=None, simulate_attack=False, attack_probability=0.3, agent_id=None, flush_every=10, adapt_after=10):
+        self.period = 1.0 / rate
+        self.samples_per_window = max(1, int(round(window_seconds * rate)))
+        self.min_spikes = max(1, self.samples_per_window // 3)
+        baseline = max(2, int(baseline_seconds * rate))
+        self.thresholds = {name: SlidingThreshold(baseline) for name in ("packets", "bytes", "dropped")}
+        self.adapt_after = adapt_after
+        self._flagged = []  # the current run of consecutive flagged windows, up to adapt_after
+        self.logs_path = logs_path
+        self.json_logs = json_logs
+        self.simulate_attack = simulate_attack
+        self.attack_probability = attack_probability
+        self.agent_id = agent_id or socket.gethostname()
+        self.flush_every = flush_every
+        os.makedirs(logs_path, exist_ok=True)
+        self.writer = SegmentWriter(os.path.join(logs_path, "segments"))
+        self.shipper = BatchShipper(server.rstrip("/") + "/alerts/batch") if server else None
+        self.window_count = self._next_window_number()
+        self.missed_ticks = 0
+        self._stop = threading.Event()
+
+    def _next_window_number(self):
+        numbers = [int(n[7:-5]) for n in os.listdir(self.logs_path) if n.startswith("window_") and n.endswith(".json")]
+        return max(numbers, default=0) + 1
+
+    def _sample(self, prev, prev_time, inject):
+        now = time.monotonic()
+        net = psutil.net_io_counters()
+        dt = max(now - prev_time, 1e-6)
+        # Per-second rates, so thresholds do not depend on the sampling rate
+        packets = (net.packets_recv - prev.packets_recv) / dt
+        bytes_recv = (net.bytes_recv - prev.bytes_recv) / dt
+        bytes_sent = (net.bytes_sent - prev.bytes_sent) / dt
+        dropped = ((net.dropin + net.dropout) - (prev.dropin + prev.dropout)) / dt
+        if inject:
+            packets, bytes_recv, dropped = inject_attack_spikes(packets, bytes_recv, dropped)
+        sample = {"timestamp": str(datetime.now().astimezone()), "packets": int(packets), "bytes": int(bytes_recv), "dropped": int(dropped)}
+        return sample, bytes_sent, net, now
+
+    def _fold(self, window):
+        for sample in window:
+            for name, threshold in self.thresholds.items():
+                threshold.update(sample[name])
+
+    def _evaluate(self, window):
+        # Compare against the baseline built from earlier windows, then fold
+        # this window in only if it looked normal so attacks don't raise the
+        # bar. A level that stays flagged for adapt_after windows in a row is
+        # taken as the new normal (a lasting legitimate rise): the held
+        # windows and every further one in the run are folded in until the
+        # baseline catches up.
+        spikes = {}
+        for name, threshold in self.thresholds.items():
+            limit = threshold.threshold()
+            spikes[name] = sum(sample[name] > limit for sample in window)
+        is_attack = spikes["packets"] >= self.min_spikes and (spikes["bytes"] >= self.min_spikes or spikes["dropped"] >= self.min_spikes)
+        if not is_attack:
+            self._flagged.clear()
+            self._fold(window)
+        elif len(self._flagged) < self.adapt_after:
+            self._flagged.append(window)
+            if len(self._flagged) == self.adapt_after:
+                log.info("Flagged for %d windows in a row; adapting the baseline", self.adapt_after)
+                for held in self._flagged:
+                    self._fold(held)
+        else:
+            self._fold(window)
+        return is_attack, spikes
+
+    def _write_window(self, window, is_attack):
+        number = self.window_count
+        self.writer.append_window(number, window, is_attack)
+        if number % self.flush_every == 0:
+            self.writer.flush()
+        if self.json_logs:
+            with open(os.path.join(self.logs_path, f"window_{number}.json"), "w") as f:
+                json.dump({"window": number, "timestamp": datetime.now().isoformat(), "metrics": window, "attack_detected": is_attack}, f, indent=2)
+        if is_attack:
+            with open(ATTACK_FLAG_PATH, "w") as f:
+                json.dump({"attack_detected": True, "timestamp": datetime.now().isoformat()}, f)
+        self.window_count += 1
+
+    def run(self, max_windows=None):
+        if self.shipper is not None:
+            self.shipper.start()
+        prev = psutil.net_io_counters()
+        prev_time = time.monotonic()
+        next_tick = prev_time + self.period
+        windows = 0
+        cpu_start, wall_start = time.process_time(), time.monotonic()
+        try:
+            while not self._stop.is_set() and (max_windows is None or windows < max_windows):
+                inject = self.simulate_attack and random.random() < self.attack_probability
+                window = []
+                while len(window) < self.samples_per_window:
+                    delay = next_tick - time.monotonic()
+                    if delay > 0:
+                        if self._stop.wait(delay):
+                            return
+                    elif -delay > self.period:
+                        # Fell behind (e.g. suspended); skip missed ticks instead of bursting
+                        skipped = int(-delay // self.period)
+                        self.missed_ticks += skipped
+                        next_tick += skipped * self.period
+                    sample, bytes_sent, prev, prev_time = self._sample(prev, prev_time, inject)
+                    window.append(sample)
+                    if self.shipper is not None:
+                        self.shipper.put({
+                            "agent_id": self.agent_id,
+                            "timestamp": sample["timestamp"],
+                            "packets_per_sec": sample["packets"],
+                            "net_io": {"recv": sample["bytes"], "sent": int(bytes_sent)},
+                            "dropped": sample["dropped"],
+                        })
+                    next_tick += self.period
+                is_attack, spikes = self._evaluate(window)
+                if is_attack:
+                    log.warning("DDoS Attack Detected! window=%d spikes=%s", self.window_count, spikes)
+                self._write_window(window, is_attack)
+                windows += 1
+        finally:
+            self.writer.close()
+            if self.shipper is not None:
+                self.shipper.stop()
+            wall = time.monotonic() - wall_start
+            self.cpu_fraction = (time.process_time() - cpu_start) / wall if wall else 0.0
+            log.info("Stopped after %d windows, %d missed ticks, CPU %.2f%% of a core", windows, self.missed_ticks, self.cpu_fraction * 100)
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-running DDoS window collector")
+    parser.add_argument("--rate", type=float, default=10.0, help="samples per second")
+    parser.add_argument("--window", type=float, default=3.0, help="seconds per detection window")
+    parser.add_argument("--baseline", type=float, default=60.0, help="seconds of normal traffic in the threshold baseline")
+    parser.add_argument("--logs", default="logs")
+    parser.add_argument("--no-json-logs", action="store_true", help="only write binary segments")
+    parser.add_argument("--server", default=None, help="e.g. http://localhost:8000")
+    parser.add_argument("--simulate-attack", action="store_true")
+    parser.add_argument("--windows", type=int, default=None, help="stop after this many windows")
+    parser.add_argument("--adapt-after", type=int, default=10, help="consecutive flagged windows before the baseline follows them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s")
+    collector = DDoSCollector(rate=args.rate, window_seconds=args.window, baseline_seconds=args.baseline, logs_path=args.logs,
+                              json_logs=not args.no_json_logs, server=args.server, simulate_attack=args.simulate_attack,
+                              adapt_after=args.adapt_after)
+    try:
+        collector.run(max_windows=args.windows)
+    except KeyboardInterrupt:
+        print("\n[!] Monitoring stopped by user.")
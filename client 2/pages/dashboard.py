@@ -6,13 +6,17 @@ import json
 
 from utils.metrics import (
     get_system_metrics,
+    get_metrics_frame,
     load_latest_log,
-    trigger_attack_simulation,  # 🔁 this must exist in utils.metrics.py
+    trigger_attack_simulation,
     get_attack_status,          # 🔁 new helper function to check persistent attack
     clear_attack_status         # 🔁 new helper function to clear the alert
 )
 
 from utils.charts import create_gauge_chart, create_line_chart
+from utils.chart_data import DEFAULT_POINT_BUDGET
+
+CHART_COLUMNS = ['cpu_usage', 'disk_usage', 'memory_usage', 'network_sent']
 
 def show():
     st.title("System Metrics Dashboard")
@@ -24,16 +28,13 @@ def show():
         if st.button("✅ Clear Alert"):
             clear_attack_status()
 
-
-# Load latest log and show alert
-log = load_latest_log()
-log = load_latest_log()
-attack_active, attack_time = get_attack_status()
-if attack_active:
-    st.error("🚨 DDoS Attack Detected!")
-    if attack_time:
-        st.markdown(f"Detected at: `{attack_time}`")
-
+    # Load latest log and show alert
+    log = load_latest_log()
+    attack_active, attack_time = get_attack_status()
+    if attack_active:
+        st.error("🚨 DDoS Attack Detected!")
+        if attack_time:
+            st.markdown(f"Detected at: `{attack_time}`")
 
     refresh_rate = st.session_state.refresh_rate
     placeholder = st.empty()
@@ -42,10 +43,6 @@ if attack_active:
         current_metrics = get_system_metrics()
 
         if current_metrics:
-            st.session_state.metrics_data.append(current_metrics)
-            if len(st.session_state.metrics_data) > 100:
-                st.session_state.metrics_data.pop(0)
-
             col1, col2 = st.columns(2)
             col1.markdown(f"**Last Updated:** {current_metrics['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
             col2.markdown(f"**Refresh Rate:** {refresh_rate} seconds")
@@ -58,8 +55,8 @@ if attack_active:
             c.plotly_chart(create_gauge_chart(current_metrics['disk_usage'], "Disk Usage (%)"), use_container_width=True)
 
             st.subheader("Historical Data")
-            if len(st.session_state.metrics_data) > 1:
-                data = st.session_state.metrics_data
+            data = get_metrics_frame(CHART_COLUMNS, st.session_state.get('chart_points', DEFAULT_POINT_BUDGET))
+            if len(data) > 1:
                 d1, d2 = st.columns(2)
                 d1.plotly_chart(create_line_chart(data, 'cpu_usage', 'CPU Usage Over Time', 'red'), use_container_width=True)
                 d1.plotly_chart(create_line_chart(data, 'disk_usage', 'Disk Usage Over Time', 'orange'), use_container_width=True)
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.sampler import COLUMN
+
+DEFAULT_POINT_BUDGET = 500
+
+
+def lttb(x, y, budget):
+    # Largest-Triangle-Three-Buckets: indices of `budget` points that keep the
+    # visual shape of (x, y). First and last points are always kept.
+    n = len(x)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    selected = np.empty(budget, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(budget - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket is the third triangle vertex
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nlo:nhi].mean() if nhi > nlo else x[-1]
+        avg_y = y[nlo:nhi].mean() if nhi > nlo else y[-1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area)) if len(area) else lo
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, budget):
+    # Min and max of each of budget/2 buckets, in time order
+    n = len(y)
+    if budget >= n or budget < 2:
+        return np.arange(n)
+    buckets = budget // 2
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    picks = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi <= lo:
+            continue
+        chunk = y[lo:hi]
+        picks.extend(sorted((lo + int(np.argmin(chunk)), lo + int(np.argmax(chunk)))))
+    return np.unique(picks)
+
+
+def chart_frame(rows, columns, budget=DEFAULT_POINT_BUDGET, method="lttb"):
+    # One DataFrame for every chart on a refresh, built from sampler ring rows.
+    # Each series gets an equal share of the budget and the frame keeps the
+    # union of the chosen rows, so all charts share the same x values and the
+    # frame never exceeds `budget` rows.
+    if len(rows) == 0:
+        return pd.DataFrame(columns=["timestamp", *columns])
+    x = rows[:, COLUMN["timestamp"]]
+    if len(rows) > budget:
+        share = max(3, budget // max(1, len(columns)))
+        keep = set()
+        for name in columns:
+            y = rows[:, COLUMN[name]]
+            keep.update((lttb(x, y, share) if method == "lttb" else minmax(y, share)).tolist())
+        rows = rows[np.fromiter(sorted(keep), dtype=np.int64)]
+        x = rows[:, COLUMN["timestamp"]]
+    frame = pd.DataFrame({name: rows[:, COLUMN[name]] for name in columns})
+    local = datetime.now().astimezone().tzinfo
+    frame.insert(0, "timestamp", pd.to_datetime(x, unit="s", utc=True).tz_convert(local).tz_localize(None))
+    return frame
@@ -26,9 +26,10 @@ def create_gauge_chart(value, title, max_value=100):
     return fig
 
 def create_line_chart(data, y_column, title, color):
-    if not data:
+    # data is a shared frame from utils.chart_data.chart_frame or a list of dicts
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    if df.empty:
         return go.Figure()
-    df = pd.DataFrame(data)
     fig = px.line(df, x='timestamp', y=y_column, title=title, color_discrete_sequence=[color])
     fig.update_layout(height=300)
     return fig
@@ -0,0 +1,233 @@
+import json
+import math
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import NamedTuple
+
+WINDOW_RE = re.compile(r"^window_(\d+)\.json$")
+INDEX_FILE = ".index.json"
+RESCAN_POLLS = 10  # without watchdog, stat every file every N polls to catch in-place rewrites
+
+
+class WindowEntry(NamedTuple):
+    window: int
+    timestamp: float
+    attack: bool
+    mtime: int = 0  # st_mtime_ns and st_size of the file when it was read
+    size: int = -1
+
+
+class LogStore:
+    # Index of the window_N.json files written by the DDoS monitor: window
+    # number, timestamp and attack flag for every file, kept sorted and saved
+    # next to the logs so a restart does not re-read every file. New files are
+    # picked up by a watcher (watchdog/inotify when installed, otherwise by
+    # polling the directory mtime), so "latest window" is O(1) and history
+    # scans open one file at a time. A file whose mtime or size changed is
+    # read again: sample2.py restarts at window 1 and rewrites files in place,
+    # so window numbers are not always in time order.
+
+    def __init__(self, logs_path="logs", poll_interval=1.0):
+        self.logs_path = logs_path
+        self.poll_interval = poll_interval
+        self.entries = {}
+        self.windows = []  # sorted window numbers
+        self.by_time = []  # sorted (timestamp, window)
+        self._pending = set()  # files seen but not yet readable (still being written)
+        self._dir_mtime = None
+        self._dirty = False
+        self._latest_cache = (None, None)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+        self._load_index()
+        self.refresh(force=True)
+
+    def path(self, window):
+        return os.path.join(self.logs_path, f"window_{window}.json")
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.logs_path, INDEX_FILE)) as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            return
+        for row in rows:
+            entry = WindowEntry(*row)
+            self.entries[entry.window] = entry
+        self.windows = sorted(self.entries)
+        self.by_time = sorted((e.timestamp, e.window) for e in self.entries.values())
+
+    def save_index(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            rows = [list(self.entries[w]) for w in self.windows]
+            self._dirty = False
+        tmp = os.path.join(self.logs_path, INDEX_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(rows, f)
+        os.replace(tmp, os.path.join(self.logs_path, INDEX_FILE))
+
+    def _read_entry(self, window):
+        try:
+            with open(self.path(window)) as f:
+                stat = os.fstat(f.fileno())
+                data = json.load(f)
+            timestamp = datetime.fromisoformat(data["timestamp"]).timestamp()
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return WindowEntry(window, timestamp, bool(data.get("attack_detected", False)), stat.st_mtime_ns, stat.st_size)
+
+    def add(self, window, stat=None):
+        # New windows are read; known ones only if their mtime or size changed.
+        # `stat` saves a syscall when the caller already has it (scandir).
+        current = self.entries.get(window)
+        if current is not None:
+            try:
+                stat = stat or os.stat(self.path(window))
+            except FileNotFoundError:
+                return
+            if (stat.st_mtime_ns, stat.st_size) == (current.mtime, current.size):
+                return
+        entry = self._read_entry(window)
+        with self._lock:
+            if entry is None:
+                self._pending.add(window)
+                return
+            self._pending.discard(window)
+            current = self.entries.get(window)
+            if current is None:
+                insort(self.windows, window)
+            else:
+                del self.by_time[bisect_left(self.by_time, (current.timestamp, window))]
+            insort(self.by_time, (entry.timestamp, window))
+            self.entries[window] = entry
+            self._dirty = True
+
+    def refresh(self, force=False):
+        # Polling fallback: rescan names only when the directory changed;
+        # `force` also stats known files to catch in-place rewrites
+        try:
+            mtime = os.stat(self.logs_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if not force and mtime == self._dir_mtime and not self._pending:
+            return
+        self._dir_mtime = mtime
+        with os.scandir(self.logs_path) as it:
+            for entry in it:
+                match = WINDOW_RE.match(entry.name)
+                if match is None:
+                    continue
+                window = int(match.group(1))
+                if window not in self.entries:
+                    self.add(window)
+                elif force:
+                    self.add(window, entry.stat())
+        for window in list(self._pending):
+            self.add(window)
+
+    def __len__(self):
+        return len(self.windows)
+
+    def latest_entry(self):
+        # Most recently written window, which after a rewrite need not be the highest number
+        return self.entries[self.by_time[-1][1]] if self.by_time else None
+
+    def latest(self):
+        entry = self.latest_entry()
+        if entry is None:
+            return None
+        # Keyed by the whole entry, so a rewritten file is not served from cache
+        cached, data = self._latest_cache
+        if cached != entry:
+            with open(self.path(entry.window)) as f:
+                data = json.load(f)
+            self._latest_cache = (entry, data)
+        return data
+
+    def entries_between(self, start=None, end=None):
+        # In time order
+        with self._lock:
+            lo = 0 if start is None else bisect_left(self.by_time, (start.timestamp(),))
+            hi = len(self.by_time) if end is None else bisect_right(self.by_time, (end.timestamp(), math.inf))
+            return [self.entries[w] for _, w in self.by_time[lo:hi]]
+
+    def iter_windows(self, start=None, end=None, attacks_only=False):
+        # Streams parsed windows in a time range, one file open at a time
+        for entry in self.entries_between(start, end):
+            if attacks_only and not entry.attack:
+                continue
+            try:
+                with open(self.path(entry.window)) as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def start(self):
+        if self._thread is not None:
+            return
+        # The poll thread also persists the index; with watchdog it is only a safety net
+        self._thread = threading.Thread(target=self._poll, name="log-store-poll", daemon=True)
+        self._thread.start()
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return
+
+        store = self
+
+        class Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                self._handle(event.src_path)
+
+            def on_modified(self, event):
+                self._handle(event.src_path)
+
+            def _handle(self, path):
+                match = WINDOW_RE.match(os.path.basename(path))
+                if match:
+                    store.add(int(match.group(1)))
+
+        self._observer = Observer()
+        self._observer.schedule(Handler(), self.logs_path, recursive=False)
+        self._observer.daemon = True
+        self._observer.start()
+
+    def _poll(self):
+        polls = 0
+        while not self._stop.wait(self.poll_interval):
+            polls += 1
+            self.refresh(force=self._observer is None and polls % RESCAN_POLLS == 0)
+            self.save_index()
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        self._thread = None
+        self.save_index()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_log_store(logs_path="logs"):
+    # One watched store per process, shared by every session
+    global _store
+    with _store_lock:
+        if _store is None:
+            if not os.path.exists(logs_path):
+                return None
+            _store = LogStore(logs_path)
+            _store.save_index()
+            _store.start()
+        return _store
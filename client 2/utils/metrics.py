@@ -1,49 +1,32 @@
-import psutil
-from datetime import datetime
 import os
 import json
+from datetime import datetime
+from utils.log_store import get_log_store
+from utils.sampler import get_sampler
+from utils.chart_data import DEFAULT_POINT_BUDGET, chart_frame
 
 
 ATTACK_FLAG_PATH = "attack_status.json"
 
 def load_latest_log():
-    logs_path = "logs"
-    if not os.path.exists(logs_path):
-        return None
-
-    log_files = sorted(
-        [f for f in os.listdir(logs_path) if f.startswith("window_") and f.endswith(".json")],
-        key=lambda x: int(x.split("_")[1].split(".")[0]),
-        reverse=True
-    )
-
-    if not log_files:
+    store = get_log_store("logs")
+    if store is None:
         return None
-
-    with open(os.path.join(logs_path, log_files[0]), "r") as f:
-        return json.load(f)
+    return store.latest()
         
 def get_system_metrics():
-    cpu = psutil.cpu_percent(interval=0.1)
-    memory = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
-    network = psutil.net_io_counters()
-
-    return {
-        'timestamp': datetime.now(),
-        'cpu_usage': cpu,
-        'memory_usage': memory.percent,
-        'memory_available': memory.available / (1024**3),
-        'memory_total': memory.total / (1024**3),
-        'disk_usage': disk.percent,
-        'disk_free': disk.free / (1024**3),
-        'disk_total': disk.total / (1024**3),
-        'network_sent': network.bytes_sent / (1024**2),
-        'network_recv': network.bytes_recv / (1024**2),
-    }
+    # Latest sample from the shared background sampler; never blocks on psutil
+    return get_sampler().latest()
+
 
+def get_metrics_history(n=100):
+    return get_sampler().history(n)
 
 
+def get_metrics_frame(columns, budget=DEFAULT_POINT_BUDGET, method="lttb"):
+    # Whole sampler history, downsampled to `budget` points per series
+    return chart_frame(get_sampler().snapshot(), columns, budget, method)
+
 def get_attack_status():
     if not os.path.exists(ATTACK_FLAG_PATH):
         return False, None
@@ -51,6 +34,11 @@ def get_attack_status():
         data = json.load(f)
         return data.get("attack_detected", False), data.get("timestamp")
 
+def trigger_attack_simulation():
+    # Raises the same persistent flag the DDoS monitor writes, for demos
+    with open(ATTACK_FLAG_PATH, "w") as f:
+        json.dump({"attack_detected": True, "timestamp": datetime.now().isoformat(), "simulated": True}, f)
+
 def clear_attack_status():
     if os.path.exists(ATTACK_FLAG_PATH):
         os.remove(ATTACK_FLAG_PATH)
\ No newline at end of file
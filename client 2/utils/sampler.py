@@ -0,0 +1,123 @@
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import psutil
+
+FIELDS = (
+    "timestamp",
+    "cpu_usage",
+    "memory_usage",
+    "memory_available",
+    "memory_total",
+    "disk_usage",
+    "disk_free",
+    "disk_total",
+    "network_sent",
+    "network_recv",
+)
+COLUMN = {name: i for i, name in enumerate(FIELDS)}
+GB = 1024 ** 3
+MB = 1024 ** 2
+
+
+def read_metrics():
+    # Non-blocking: cpu_percent(None) reports usage since the previous call
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage('/')
+    network = psutil.net_io_counters()
+    return (
+        time.time(),
+        psutil.cpu_percent(interval=None),
+        memory.percent,
+        memory.available / GB,
+        memory.total / GB,
+        disk.percent,
+        disk.free / GB,
+        disk.total / GB,
+        network.bytes_sent / MB,
+        network.bytes_recv / MB,
+    )
+
+
+def _as_dict(row):
+    metrics = dict(zip(FIELDS, row.tolist()))
+    metrics["timestamp"] = datetime.fromtimestamp(metrics["timestamp"])
+    return metrics
+
+
+class MetricsSampler:
+    # One background thread samples psutil every `interval` seconds into a
+    # fixed-size ring, so page renders only copy out the latest rows and the
+    # psutil cost is paid once per process however many sessions are open.
+
+    def __init__(self, interval=1.0, capacity=4 * 3600):
+        self.interval = interval
+        self.capacity = capacity
+        self._ring = np.zeros((capacity, len(FIELDS)), dtype=np.float64)
+        self._count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        psutil.cpu_percent(interval=None)  # prime the CPU counter
+        self._record()
+        self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+        self._thread.start()
+
+    def _record(self):
+        row = read_metrics()
+        with self._lock:
+            self._ring[self._count % self.capacity] = row
+            self._count += 1
+
+    def _run(self):
+        next_tick = time.monotonic() + self.interval
+        while not self._stop.wait(max(0.0, next_tick - time.monotonic())):
+            self._record()
+            next_tick += self.interval
+            if next_tick < time.monotonic():
+                next_tick = time.monotonic() + self.interval
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def snapshot(self, n=None):
+        # Copy of the last n samples, oldest first
+        with self._lock:
+            size = min(self._count, self.capacity)
+            n = size if n is None else min(n, size)
+            end = self._count % self.capacity
+            idx = (np.arange(end - n, end)) % self.capacity
+            return self._ring[idx]
+
+    def latest(self):
+        rows = self.snapshot(1)
+        return _as_dict(rows[0]) if len(rows) else None
+
+    def history(self, n=None):
+        return [_as_dict(row) for row in self.snapshot(n)]
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler(interval=1.0, capacity=4 * 3600):
+    # One sampler per process, shared by every session
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = MetricsSampler(interval, capacity)
+            _sampler.start()
+        return _sampler
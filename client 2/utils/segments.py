@@ -0,0 +1,182 @@
+import os
+import struct
+import sys
+from datetime import datetime
+
+import numpy as np
+
+# Fixed-width binary segments for DDoS window samples. A segment is a 16-byte
+# header followed by 48-byte little-endian records, one per sample, so it can
+# be memory-mapped straight into a NumPy structured array.
+MAGIC = b"AEGISWN1"
+VERSION = 1
+HEADER = struct.Struct("<8sII")  # magic, version, record size
+RECORD_DTYPE = np.dtype([
+    ("timestamp_ns", "<i8"),
+    ("window", "<i8"),
+    ("packets", "<i8"),
+    ("bytes", "<i8"),
+    ("dropped", "<i8"),
+    ("attack", "u1"),
+    ("_pad", "u1", (7,)),
+])
+SEGMENT_RECORDS = 1 << 20  # ~48 MB per segment before rolling over
+
+
+def to_ns(timestamp):
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if isinstance(timestamp, datetime):
+        return int(timestamp.timestamp()) * 1_000_000_000 + timestamp.microsecond * 1000
+    return int(timestamp * 1e9)
+
+
+def segment_path(directory, number):
+    return os.path.join(directory, f"segment_{number:06d}.seg")
+
+
+def list_segments(directory):
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(n for n in os.listdir(directory) if n.startswith("segment_") and n.endswith(".seg"))
+    return [os.path.join(directory, n) for n in names]
+
+
+class SegmentWriter:
+    # Appends windows to the newest segment in `directory`, rolling over to a
+    # new file every `segment_records` samples. Records are buffered in a
+    # NumPy array and written with one syscall per flush.
+
+    def __init__(self, directory, segment_records=SEGMENT_RECORDS, buffer_records=4096):
+        self.directory = directory
+        self.segment_records = segment_records
+        self._buffer = np.zeros(buffer_records, dtype=RECORD_DTYPE)
+        self._buffered = 0
+        os.makedirs(directory, exist_ok=True)
+        existing = list_segments(directory)
+        self._number = int(os.path.basename(existing[-1])[8:14]) if existing else 1
+        self._open()
+
+    def _open(self):
+        path = segment_path(self.directory, self._number)
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize))
+        self._records = (self._file.tell() - HEADER.size) // RECORD_DTYPE.itemsize
+
+    def append_window(self, window, samples, attack):
+        for sample in samples:
+            if self._buffered == len(self._buffer):
+                self.flush()
+            row = self._buffer[self._buffered]
+            row["timestamp_ns"] = to_ns(sample["timestamp"])
+            row["window"] = window
+            row["packets"] = sample["packets"]
+            row["bytes"] = sample["bytes"]
+            row["dropped"] = sample["dropped"]
+            row["attack"] = attack
+            self._buffered += 1
+
+    def flush(self):
+        start = 0
+        while start < self._buffered:
+            room = self.segment_records - self._records
+            if room <= 0:
+                self._file.close()
+                self._number += 1
+                self._open()
+                continue
+            chunk = self._buffer[start:min(self._buffered, start + room)]
+            self._file.write(chunk.tobytes())
+            self._records += len(chunk)
+            start += len(chunk)
+        self._buffered = 0
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class SegmentReader:
+    # Memory-mapped view of one segment. Columns are zero-copy views into the
+    # mapping; nothing is read from disk until it is touched.
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, version, record_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f"Not a window segment: {path}")
+        count = (os.path.getsize(path) - HEADER.size) // RECORD_DTYPE.itemsize
+        self.path = path
+        self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(count,)) if count else np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def column(self, name):
+        return self.records[name]
+
+    def between(self, start=None, end=None):
+        # Samples are appended in time order, so a time range is one slice
+        ts = self.records["timestamp_ns"]
+        lo = 0 if start is None else np.searchsorted(ts, to_ns(start), side="left")
+        hi = len(ts) if end is None else np.searchsorted(ts, to_ns(end), side="right")
+        return self.records[lo:hi]
+
+    def windows(self):
+        # (window numbers, attack flags), one entry per window
+        window = self.records["window"]
+        first = np.flatnonzero(np.diff(window, prepend=window[:1] - 1) != 0)
+        return window[first], self.records["attack"][first].astype(bool)
+
+
+def last_timestamp_ns(directory):
+    # Newest sample already stored in `directory`, or None
+    for path in reversed(list_segments(directory)):
+        reader = SegmentReader(path)
+        if len(reader):
+            return int(reader.records["timestamp_ns"][-1])
+    return None
+
+
+def read_range(directory, start=None, end=None):
+    # Samples in [start, end] across all segments; a view when one segment covers it
+    parts = [r.between(start, end) for r in map(SegmentReader, list_segments(directory))]
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def compact_json_logs(logs_path="logs", out_dir=os.path.join("logs", "segments"), remove=False):
+    # Conversion of window_N.json files into segments, in time order. Windows
+    # whose samples are not newer than the last stored one were written by an
+    # earlier run (or by ddos_collector.py) and are skipped, so running it
+    # again only appends what is new.
+    from utils.log_store import LogStore
+
+    store = LogStore(logs_path)
+    stored = last_timestamp_ns(out_dir)
+    writer = SegmentWriter(out_dir)
+    converted = 0
+    for data in store.iter_windows():
+        metrics = data["metrics"]
+        if stored is not None and (not metrics or to_ns(metrics[0]["timestamp"]) <= stored):
+            continue
+        writer.append_window(data["window"], metrics, data.get("attack_detected", False))
+        converted += 1
+    writer.close()
+    if remove:
+        for window in store.windows:
+            os.remove(store.path(window))
+    return converted
+
+
+if __name__ == "__main__":
+    # python -m utils.segments [logs_dir] [out_dir] [--remove]
+    args = [a for a in sys.argv[1:] if a != "--remove"]
+    logs_path = args[0] if args else "logs"
+    out_dir = args[1] if len(args) > 1 else os.path.join(logs_path, "segments")
+    count = compact_json_logs(logs_path, out_dir, remove="--remove" in sys.argv)
+    print(f"Compacted {count} windows into {out_dir}")
@@ -1,12 +1,14 @@
 import streamlit as st
 import queue
 
+from utils.chart_data import DEFAULT_POINT_BUDGET
+
 def init_session_state():
-    if 'metrics_data' not in st.session_state:
-        st.session_state.metrics_data = []
     if 'refresh_rate' not in st.session_state:
         st.session_state.refresh_rate = 5
     if 'data_queue' not in st.session_state:
         st.session_state.data_queue = queue.Queue()
+    if 'chart_points' not in st.session_state:
+        st.session_state.chart_points = DEFAULT_POINT_BUDGET  # rows in the chart frame, shared by all its series
     if 'active_page' not in st.session_state:
         st.session_state.active_page = "Home"
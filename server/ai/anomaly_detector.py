@@ -1,16 +1,42 @@
+import os
 from collections import defaultdict, deque
-import numpy as np
-from database import PROFILES
+from ai.model_registry import MODEL_REGISTRY
+from ai.baselines import BASELINES
+from ai.pipeline import DetectorRegistry, Pipeline, EXPENSIVE
+from ai.correlation import CORRELATOR
+from ai.rolling_stats import SERIES
+from instrumentation import instrument
+from startup import lazy_import
+from schemas import to_builtins
+from history_store import field_value
+from database import HISTORY_LEN, add_historical_metrics, get_history_window, get_rolling_stats
+
+np = lazy_import("numpy", globals(), "np")
+REGISTRY = DetectorRegistry()
+# Latest packets/sec over the window average that counts as a DDoS; tune with replay.py
+DDOS_FACTOR = float(os.environ.get("AEGIS_DDOS_FACTOR", 2.5))
 
 def detect_ddos(metrics_window):
     # Input: List[Dict] of past metrics (eg., past 30 sec)
     pps = [m['packets_per_sec'] for m in metrics_window]
     avg = sum(pps[:-1]) / max(len(pps) - 1, 1)
-    if pps[-1] > avg * 2.5:
+    if pps[-1] > avg * DDOS_FACTOR:
         return True
     return False
 
+def detect_ddos_for_agent(agent_id):
+    # Same rule as detect_ddos over the agent's history window, read from rolling sums
+    pps = get_rolling_stats(agent_id, "packets_per_sec")
+    if pps is None or pps.count < 2:
+        return None
+    n = pps.filled(HISTORY_LEN)
+    avg = (pps.window_sum(HISTORY_LEN) - pps.last) / max(n - 1, 1)
+    if pps.last > avg * DDOS_FACTOR:
+        return {"type": "DDOS", "details": {"agent_id": agent_id, "packets_per_sec": pps.last, "baseline": avg}}
+    return None
+
 def detect_rogue_cpu_spike(data, known_procs):
+    # known_procs: a set (baselines hand out frozensets), so each check is O(1)
     for proc in data['per_process']:
         if proc['cpu'] > 50 and proc['name'] not in known_procs:
             return {
@@ -20,9 +46,6 @@ def detect_rogue_cpu_spike(data, known_procs):
     return {"status":"NORMAL"}
 
 
-
-
-
 def detect_malware_flow(metric_record):
     # Example: flag if outbound connections > threshold
     net_io = metric_record.get("net_io", {})
@@ -32,46 +55,143 @@ def detect_malware_flow(metric_record):
 
 def detect_unrecognized_agent(metric_record):
     agent_id = metric_record.get("agent_id")
-    if agent_id not in PROFILES:
+    if not BASELINES.is_known_agent(agent_id):
         return {"type": "UNRECOGNIZED_AGENT", "details": {"agent_id": agent_id}}
     return None
 
-def predict_traffic_spike(agent_id):
-    history = get_historical_metrics(agent_id)
-    if len(history) < 10:
+def _window(agent_id, field):
+    values = get_history_window(agent_id, field)
+    if np.isnan(values).any():
+        values = values[~np.isnan(values)]
+    return values
+
+def _trend(agent_id, series):
+    # Mean of the last 5 samples and of the 5 before them, or None if under 10
+    # samples. Records without the series are skipped: the window sums only
+    # cover the last 10 records, so with gaps in them the samples come from the
+    # history instead.
+    stats = get_rolling_stats(agent_id, series)
+    if stats is None or stats.count < 10:
+        return None
+    if stats.filled(10) == 10:
+        last = stats.window_sum(5) / 5
+        prev = (stats.window_sum(10) - stats.window_sum(5)) / 5
+        return last, prev
+    values = sum(get_history_window(agent_id, field).astype(np.float64) for field in SERIES[series])
+    values = values[~np.isnan(values)]
+    if len(values) < 10:
         return None
-    traffic = np.array([rec["net_io"]["sent"] + rec["net_io"]["recv"] for rec in history if "net_io" in rec])
-    if len(traffic) < 10:
+    return float(values[-5:].mean()), float(values[-10:-5].mean())
+
+def predict_traffic_spike(agent_id):
+    trend = _trend(agent_id, "traffic")
+    if trend is None:
         return None
     # Simple trend: compare last 5 to previous 5
-    if traffic[-5:].mean() > 2 * traffic[-10:-5].mean():
-        return {"type": "PREDICTED_TRAFFIC_SPIKE", "details": {"predicted_traffic": float(traffic[-5:].mean())}}
+    last, prev = trend
+    if last > 2 * prev:
+        return {"type": "PREDICTED_TRAFFIC_SPIKE", "details": {"predicted_traffic": float(last)}}
     return None
 
 def predict_cpu_bottleneck(agent_id):
-    history = get_historical_metrics(agent_id)
-    if len(history) < 10:
-        return None
-    cpu_usage = np.array([rec["cpu"] for rec in history if "cpu" in rec])
-    if len(cpu_usage) < 10:
+    trend = _trend(agent_id, "cpu")
+    if trend is None:
         return None
     # Simple trend: compare last 5 to previous 5
-    if cpu_usage[-5:].mean() > 2 * cpu_usage[-10:-5].mean():
-        return {"type": "PREDICTED_CPU_BOTTLENECK", "details": {"predicted_cpu": float(cpu_usage[-5:].mean())}}
+    last, prev = trend
+    if last > 2 * prev:
+        return {"type": "PREDICTED_CPU_BOTTLENECK", "details": {"predicted_cpu": float(last)}}
     return None
 
 def detect_ml_anomaly(agent_id):
-    history = get_historical_metrics(agent_id)
-    if len(history) < 10:
-        return None
-    
-    # Example: IsolationForest for CPU anomaly
-    cpu_values = np.array([rec["cpu"] for rec in history if "cpu" in rec])
+    cpu_values = _window(agent_id, "cpu")
     if len(cpu_values) < 10:
         return None
-    
-    # Fit IsolationForest on historical data
-    from sklearn.ensemble import IsolationForest
-    clf = IsolationForest(contamination=0.05, random_state=42) # 5% contamination
-    clf.fit(cpu_values.reshape(-1, 1))
 
+    # IsolationForest per agent, fitted in the background and scored from cache
+    MODEL_REGISTRY.observe(agent_id, cpu_values)
+    score = MODEL_REGISTRY.score(agent_id, cpu_values[-1])
+    if score is not None and score < 0:
+        return {"type": "ML_ANOMALY", "details": {"agent_id": agent_id, "cpu": float(cpu_values[-1]), "score": score}}
+    return None
+
+# Pipeline adapters: every registered detector takes the metric record and
+# returns an alert or None. `fields` must be present for it to run at all.
+
+REGISTRY.register("malware_flow", detect_malware_flow, fields=("net_io.outbound_connections",))
+REGISTRY.register("unrecognized_agent", detect_unrecognized_agent, fields=("agent_id",))
+
+@REGISTRY.detector("ddos", fields=("agent_id", "packets_per_sec"), window=HISTORY_LEN)
+def _ddos(record):
+    return detect_ddos_for_agent(record["agent_id"])
+
+@REGISTRY.detector("rogue_cpu_spike", fields=("agent_id", "per_process"))
+def _rogue_cpu_spike(record):
+    known = BASELINES.known_processes(record["agent_id"])
+    if known is None:  # no profile and still learning: nothing to compare against
+        return None
+    result = detect_rogue_cpu_spike(record, known)
+    if result["status"] == "NORMAL":
+        return None
+    return {"type": result["status"], "details": {"offending_proc": to_builtins(result["offending_proc"])}}
+
+# Trend predictors read O(1) rolling sums, so they stay inline
+@REGISTRY.detector("cpu_bottleneck", fields=("agent_id", "cpu"), window=10)
+def _cpu_bottleneck(record):
+    return predict_cpu_bottleneck(record["agent_id"])
+
+@REGISTRY.detector("traffic_spike", fields=("agent_id", "net_io.sent", "net_io.recv"), window=10)
+def _traffic_spike(record):
+    return predict_traffic_spike(record["agent_id"])
+
+@REGISTRY.detector("ml_anomaly", fields=("agent_id", "cpu"), cost=EXPENSIVE, window=HISTORY_LEN)
+def _ml_anomaly(record):
+    return detect_ml_anomaly(record["agent_id"])
+
+PIPELINE = Pipeline(REGISTRY, on_alert=CORRELATOR.submit)
+# Rules over rolling sums, which detect_batch checks as each record is
+# appended: a spike in the middle of a batch is not visible at its end
+STEPPED = ("ddos", "cpu_bottleneck", "traffic_spike")
+# Inline detectors detect_batch computes itself; any other inline detector
+# still runs per record through PIPELINE
+VECTORIZED = frozenset({"malware_flow", "unrecognized_agent", *STEPPED})
+
+
+def detect(metric_record):
+    # Inline alerts are returned; background detectors log their own alerts
+    return PIPELINE.run(metric_record)
+
+@instrument
+def detect_batch(records):
+    # Appends the batch to the history and runs detection over it, raising
+    # what add_historical_metric + detect would have for each record.
+    # Returns {agent_id: [alerts]} for agents that raised anything.
+    results = defaultdict(list)
+    if not records:
+        return results
+
+    stepped = [PIPELINE.registry.detectors[name] for name in STEPPED]
+    def each(record):
+        for detector in stepped:
+            alert = detector(record)
+            if alert:
+                results[record["agent_id"]].append(alert)
+    add_historical_metrics(records, each=each)
+
+    agent_ids = [r["agent_id"] for r in records]
+    outbound = np.array([field_value(r, "net_io.outbound_connections") or 0 for r in records], dtype=np.float64)
+    for i in np.flatnonzero(outbound > 100):
+        results[agent_ids[i]].append({"type": "MALWARE_FLOW", "details": {"outbound_connections": records[i]["net_io"]["outbound_connections"]}})
+
+    for record, alert in PIPELINE.run_each(records, skip=VECTORIZED):
+        results[record["agent_id"]].append(alert)
+
+    latest = dict(zip(agent_ids, records))
+    PIPELINE.schedule_expensive_batch(list(latest.values()))
+    for agent_id in latest:
+        if not BASELINES.is_known_agent(agent_id):
+            results[agent_id].append({"type": "UNRECOGNIZED_AGENT", "details": {"agent_id": agent_id}})
+    for agent_id, alerts in results.items():
+        for alert in alerts:
+            alert.setdefault("agent_id", agent_id)
+    return results
@@ -0,0 +1,187 @@
+import json
+import os
+import sys
+import threading
+
+LEARN_SAMPLES = int(os.environ.get("AEGIS_BASELINE_SAMPLES", 30))
+RANGE_SIGMAS = 3.0
+LEARN_MAX_CPU = 50  # a process already spiking is not learned as normal
+SNAPSHOT_FILE = "baselines.json"
+_EMPTY = frozenset()
+
+
+class ProcessTable:
+    # Global interned process names. Thousands of agents report the same few
+    # hundred names; each is stored once, and set lookups of interned strings
+    # compare by identity after the (cached) hash matches.
+    def __init__(self):
+        self._names = {}
+
+    def intern(self, name):
+        canonical = self._names.get(name)
+        if canonical is None:
+            canonical = self._names[name] = sys.intern(str(name))
+        return canonical
+
+    def names(self):
+        return list(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def clear(self):
+        self._names.clear()
+
+
+class Baseline:
+    # What is normal for one agent. Sets are frozen so detectors can read
+    # them without the lock; learning swaps in a new frozenset.
+    __slots__ = ("known", "peers", "cpu", "memory", "samples", "profiled")
+
+    def __init__(self, known=_EMPTY, peers=_EMPTY, cpu=None, memory=None, samples=0, profiled=False):
+        self.known = known
+        self.peers = peers
+        self.cpu = cpu  # (lo, hi) or None until learned
+        self.memory = memory
+        self.samples = samples
+        self.profiled = profiled
+
+    @property
+    def ready(self):
+        # Profiles are authoritative; learned baselines need enough samples
+        return self.profiled or self.samples >= LEARN_SAMPLES
+
+
+def _range(stats):
+    if stats is None or stats.count < 2:
+        return None
+    spread = RANGE_SIGMAS * stats.std
+    return (max(stats.min, stats.mean - spread), min(stats.max, stats.mean + spread))
+
+
+class BaselineStore:
+    # Per-agent baselines built from profiles (database.upsert_profile) and
+    # learned from ingested metrics: during the first LEARN_SAMPLES records of
+    # an agent without a profile, the processes and peers it reports are
+    # added. CPU and memory ranges are refreshed from the rolling stats every
+    # LEARN_SAMPLES records for every agent.
+    def __init__(self, table=None):
+        self.table = table or ProcessTable()
+        self._baselines = {}
+        self._lock = threading.Lock()
+
+    def get(self, agent_id):
+        return self._baselines.get(agent_id)
+
+    def is_known_agent(self, agent_id):
+        baseline = self._baselines.get(agent_id)
+        return baseline is not None and baseline.profiled
+
+    def is_known_process(self, agent_id, name):
+        baseline = self._baselines.get(agent_id)
+        return baseline is not None and name in baseline.known
+
+    def is_known_peer(self, agent_id, peer):
+        baseline = self._baselines.get(agent_id)
+        return baseline is not None and peer in baseline.peers
+
+    def known_processes(self, agent_id):
+        # frozenset for a ready baseline, else None (nothing to compare against)
+        baseline = self._baselines.get(agent_id)
+        return baseline.known if baseline is not None and baseline.ready else None
+
+    def _baseline(self, agent_id):
+        baseline = self._baselines.get(agent_id)
+        if baseline is None:
+            baseline = self._baselines[agent_id] = Baseline()
+        return baseline
+
+    def _merge(self, current, names):
+        new = {self.table.intern(n) for n in names if n not in current}
+        return current | new if new else current
+
+    def set_profile(self, profile):
+        with self._lock:
+            baseline = self._baseline(profile["agent_id"])
+            baseline.profiled = True
+            baseline.known = self._merge(baseline.known, profile.get("known_processes", ()))
+            baseline.peers = self._merge(baseline.peers, profile.get("peers", ()))
+
+    def observe(self, record, stats=None):
+        # stats: the RollingStats the record was just added to
+        with self._lock:
+            self._observe(record, stats)
+
+    def observe_many(self, records, stats=None):
+        with self._lock:
+            for record in records:
+                self._observe(record, stats)
+
+    def _observe(self, record, stats):
+        agent_id = record["agent_id"]
+        baseline = self._baseline(agent_id)
+        baseline.samples += 1
+        if baseline.samples <= LEARN_SAMPLES and not baseline.profiled:
+            procs = record.get("per_process")
+            if procs:
+                names = (p["name"] for p in procs if "name" in p and p.get("cpu", 0) <= LEARN_MAX_CPU)
+                baseline.known = self._merge(baseline.known, names)
+            peers = record.get("peers")
+            if peers:
+                baseline.peers = self._merge(baseline.peers, peers)
+        if stats is not None and baseline.samples % LEARN_SAMPLES == 0:
+            baseline.cpu = _range(stats.get(agent_id, "cpu"))
+            baseline.memory = _range(stats.get(agent_id, "memory"))
+
+    def stats(self):
+        baselines = list(self._baselines.values())
+        return {
+            "agents": len(baselines),
+            "profiled": sum(b.profiled for b in baselines),
+            "ready": sum(b.ready for b in baselines),
+            "process_names": len(self.table),
+        }
+
+    def save_snapshot(self, directory):
+        with self._lock:
+            names = self.table.names()
+            index = {name: i for i, name in enumerate(names)}
+            agents = {
+                agent_id: [sorted(index[n] for n in b.known), sorted(b.peers), b.cpu, b.memory, b.samples]
+                for agent_id, b in self._baselines.items()
+            }
+        if not agents:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, SNAPSHOT_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"names": names, "agents": agents}, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+        return path
+
+    def load_snapshot(self, directory):
+        path = os.path.join(directory, SNAPSHOT_FILE)
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            data = json.load(f)
+        with self._lock:
+            names = [self.table.intern(n) for n in data["names"]]
+            # Profiles themselves come from the store, so `profiled` is not restored
+            for agent_id, (known, peers, cpu, memory, samples) in data["agents"].items():
+                baseline = self._baseline(agent_id)
+                baseline.known = baseline.known | frozenset(names[i] for i in known)
+                baseline.peers = self._merge(baseline.peers, peers)
+                baseline.cpu = baseline.cpu or (tuple(cpu) if cpu else None)
+                baseline.memory = baseline.memory or (tuple(memory) if memory else None)
+                baseline.samples = max(baseline.samples, samples)
+        return len(data["agents"])
+
+    def clear(self):
+        with self._lock:
+            self._baselines.clear()
+            self.table.clear()
+
+
+PROCESS_NAMES = ProcessTable()
+BASELINES = BaselineStore(PROCESS_NAMES)
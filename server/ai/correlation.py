@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from database import log_alert
+
+# Sits between the detectors and log_alert. Alerts are grouped into
+# incidents by (type, agent): an incident stays open while alerts keep
+# arriving within INCIDENT_TTL of each other and is closed once it goes
+# quiet. When COORDINATED_AGENTS or more agents have open incidents of the
+# same type, a fleet incident groups them as one coordinated attack. Only
+# incident events are logged: open, update (at most every UPDATE_INTERVAL
+# per incident) and close, so an attack costs a handful of stored alerts
+# per agent instead of one per record.
+INCIDENT_TTL = float(os.environ.get("AEGIS_INCIDENT_TTL", 60))  # seconds without alerts before closing
+UPDATE_INTERVAL = float(os.environ.get("AEGIS_INCIDENT_UPDATE", 30))  # seconds between update events
+COORDINATED_AGENTS = int(os.environ.get("AEGIS_COORDINATED_AGENTS", 5))
+MAX_LISTED_AGENTS = 100  # agents named in a fleet incident event; agent_count has the total
+
+
+class Incident:
+    __slots__ = ("id", "type", "agent_id", "agents", "count", "first_seen", "last_seen", "emitted_at", "details")
+
+    def __init__(self, incident_id, alert_type, agent_id, now, details, agents=None):
+        self.id = incident_id
+        self.type = alert_type
+        self.agent_id = agent_id
+        self.agents = agents  # fleet incidents only: every agent that took part
+        self.count = 1
+        self.first_seen = now
+        self.last_seen = now
+        self.emitted_at = now
+        self.details = details
+
+    def event(self, kind):
+        # Stored and published like any alert, so indexes, streams and
+        # dashboards keep working; `event` and `incident_id` tell them apart
+        alert = {
+            "type": self.type,
+            "agent_id": self.agent_id,
+            "event": kind,
+            "incident_id": self.id,
+            "count": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "details": self.details,
+        }
+        if self.agents is not None:
+            alert["scope"] = "fleet"
+            alert["agent_count"] = len(self.agents)
+            alert["details"] = {"agents": sorted(self.agents, key=str)[:MAX_LISTED_AGENTS]}
+        return alert
+
+
+class Correlator:
+    def __init__(self, ttl=INCIDENT_TTL, update_interval=UPDATE_INTERVAL, coordinated=COORDINATED_AGENTS, sink=log_alert, clock=time.time):
+        self.ttl = ttl
+        self.update_interval = update_interval
+        self.coordinated = coordinated
+        self.sink = sink
+        self.clock = clock
+        # Open incidents keyed (type, agent_id) per agent and (type,) per fleet
+        self._open = {}
+        self._agents = {}  # type -> agents with an open incident of that type
+        self._expiry = []  # (deadline, seq, key); rechecked against last_seen when popped
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._task = None
+        self.counters = {"alerts": 0, "events": 0, "opened": 0, "updated": 0, "closed": 0, "coordinated": 0}
+
+    def submit(self, alert):
+        self.submit_many((alert,))
+
+    def submit_many(self, alerts):
+        # Thread-safe: called from the event loop, the ingest worker and the
+        # background detector threads. Events are logged outside the lock.
+        now = self.clock()
+        with self._lock:
+            events = self._expire(now)
+            for alert in alerts:
+                self._add(alert, now, events)
+            self.counters["events"] += len(events)
+        for event in events:
+            self.sink(event)
+
+    def expire(self, now=None):
+        with self._lock:
+            events = self._expire(self.clock() if now is None else now)
+            self.counters["events"] += len(events)
+        for event in events:
+            self.sink(event)
+
+    def _add(self, alert, now, events):
+        self.counters["alerts"] += 1
+        alert_type = alert.get("type")
+        agent_id = alert.get("agent_id") or alert.get("details", {}).get("agent_id")
+        self._touch((alert_type, agent_id), alert_type, agent_id, alert.get("details", {}), now, events)
+        agents = self._agents.setdefault(alert_type, set())
+        agents.add(agent_id)
+        fleet = self._open.get((alert_type,))
+        if fleet is not None:
+            fleet.agents.add(agent_id)
+        if fleet is not None or len(agents) >= self.coordinated:
+            self._touch((alert_type,), alert_type, None, None, now, events, agents)
+
+    def _touch(self, key, alert_type, agent_id, details, now, events, agents=None):
+        incident = self._open.get(key)
+        if incident is None:
+            incident = self._open[key] = Incident(next(self._ids), alert_type, agent_id, now, details,
+                                                  None if agents is None else set(agents))
+            heapq.heappush(self._expiry, (now + self.ttl, next(self._seq), key))
+            self.counters["opened"] += 1
+            if agents is not None:
+                self.counters["coordinated"] += 1
+            events.append(incident.event("open"))
+            return
+        incident.count += 1
+        incident.last_seen = now
+        if details is not None:
+            incident.details = details
+        if now - incident.emitted_at >= self.update_interval:
+            incident.emitted_at = now
+            self.counters["updated"] += 1
+            events.append(incident.event("update"))
+
+    def _expire(self, now):
+        events = []
+        while self._expiry and self._expiry[0][0] <= now:
+            _, _, key = heapq.heappop(self._expiry)
+            incident = self._open.get(key)
+            if incident is None:
+                continue
+            deadline = incident.last_seen + self.ttl
+            if deadline > now:
+                heapq.heappush(self._expiry, (deadline, next(self._seq), key))
+                continue
+            del self._open[key]
+            if len(key) == 2:
+                agents = self._agents.get(key[0])
+                if agents is not None:
+                    agents.discard(key[1])
+                    if not agents:
+                        del self._agents[key[0]]
+            self.counters["closed"] += 1
+            events.append(incident.event("close"))
+        return events
+
+    async def _run(self):
+        # Closes incidents that went quiet even when no new alerts arrive
+        while True:
+            await asyncio.sleep(max(self.ttl / 4, 1.0))
+            self.expire()
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        # Open incidents are left open: they are not over just because we stop
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def open_incidents(self, alert_type=None, agent_id=None):
+        with self._lock:
+            incidents = list(self._open.values())
+        return [i.event("open") for i in incidents
+                if (alert_type is None or i.type == alert_type) and (agent_id is None or i.agent_id == agent_id)]
+
+    def stats(self):
+        counters = dict(self.counters)
+        counters["open"] = len(self._open)
+        counters["reduction"] = counters["alerts"] / counters["events"] if counters["events"] else 0.0
+        return counters
+
+    def clear(self):
+        with self._lock:
+            self._open.clear()
+            self._agents.clear()
+            self._expiry.clear()
+
+
+CORRELATOR = Correlator()
@@ -0,0 +1,205 @@
+import asyncio
+import os
+import time
+
+from ai.correlation import CORRELATOR
+from ai.pipeline import LatencyHistogram
+from ai.rolling_stats import SERIES
+from database import HISTORICAL_METRICS, PROFILES
+from startup import STARTUP, lazy_import
+
+np = lazy_import("numpy", globals(), "np")
+
+# Periodic whole-fleet pass: the last WINDOW samples of every agent are
+# gathered into one (agents x window) matrix per series, and trend ratios,
+# z-scores and cohort outlier scores are computed for all agents at once.
+# Only agents that become flagged raise alerts, not every scan they stay so.
+WINDOW = int(os.environ.get("AEGIS_FLEET_WINDOW", 30))
+SCAN_INTERVAL = float(os.environ.get("AEGIS_FLEET_SCAN_INTERVAL", 10))  # seconds, 0 = off
+SCAN_BUDGET = float(os.environ.get("AEGIS_FLEET_SCAN_BUDGET", 0.5))  # seconds of scanning per interval
+MIN_SAMPLES = 10
+MIN_COHORT = 5       # smaller cohorts have no meaningful median
+Z_THRESHOLD = 4.0    # latest sample against the agent's own window
+OUTLIER_THRESHOLD = 3.5  # modified z-score against the cohort (Iglewicz-Hoaglin)
+OUTLIER_MIN_DEVIATION = 0.25  # and this far off the cohort median, so tight cohorts do not flag noise
+
+
+def default_cohort(agent_id):
+    # Agents are compared with their profile's "cohort", or the whole fleet
+    profile = PROFILES.get(agent_id)
+    return profile.get("cohort", "") if profile else ""
+
+
+def _row_sums(m):
+    # NaN-aware per-row count, sum and sum of squares, in one pass
+    valid = ~np.isnan(m)
+    x = np.where(valid, m, 0.0)
+    return valid.sum(axis=1), x.sum(axis=1), np.einsum("ij,ij->i", x, x)
+
+
+def _group_medians(values, codes, counts):
+    # Median per cohort code: sort by value, then stably by code, so each
+    # cohort's values are one sorted run
+    order = np.argsort(values, kind="stable")
+    ordered = values[order[np.argsort(codes[order], kind="stable")]]
+    starts = np.cumsum(counts) - counts
+    medians = np.full(len(counts), np.nan)
+    has = counts > 0
+    lo = starts + (counts - 1) // 2
+    hi = starts + counts // 2
+    medians[has] = (ordered[lo[has]] + ordered[hi[has]]) / 2
+    return medians
+
+
+def _cohort_scores(values, codes, n_cohorts):
+    # Modified z-score of each agent's value against its cohort's median and
+    # MAD. Cohorts with MAD 0 (mostly identical agents) fall back to the mean
+    # absolute deviation so a single deviating agent still stands out.
+    scores = np.zeros(len(values))
+    medians = np.full(len(values), np.nan)
+    ok = ~np.isnan(values)
+    if not ok.any():
+        return scores, medians
+    v, c = values[ok], codes[ok]
+    counts = np.bincount(c, minlength=n_cohorts)
+    median = _group_medians(v, c, counts)
+    dev = np.abs(v - median[c])
+    mad = _group_medians(dev, c, counts)
+    mean_ad = np.bincount(c, weights=dev, minlength=n_cohorts) / np.maximum(counts, 1)
+    scale = np.where(mad > 0, mad / 0.6745, mean_ad * 1.253314)
+    usable = (scale[c] > 0) & (counts[c] >= MIN_COHORT)
+    scores[ok] = np.where(usable, (v - median[c]) / np.where(usable, scale[c], 1.0), 0.0)
+    medians[ok] = median[c]
+    return scores, medians
+
+
+def scan_fleet(history=HISTORICAL_METRICS, window=WINDOW, cohort_of=None, series=SERIES):
+    agents = history.agents()
+    if not agents:
+        return {"agents": [], "cohorts": [], "codes": None, "ready": None, "series": {}}
+    window = min(window, history.maxlen)
+    slots = np.arange(len(agents))
+    ready = history.lengths(slots) >= MIN_SAMPLES
+    if cohort_of is None:
+        cohorts, codes = [""], np.zeros(len(agents), dtype=np.int64)
+    else:
+        cohorts, codes = np.unique([cohort_of(a) for a in agents], return_inverse=True)
+        cohorts = cohorts.tolist()
+    results = {}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for name, fields in series.items():
+            m = history.matrix(None, fields[0], window, slots)
+            for field in fields[1:]:
+                m += history.matrix(None, field, window, slots)
+            # The latest sample against the agent's own window before it
+            n, total, squares = _row_sums(m)
+            latest = m[:, -1]
+            has_latest = ~np.isnan(latest)
+            last_value = np.where(has_latest, latest, 0.0)
+            n_before = n - has_latest
+            mean = (total - last_value) / np.maximum(n_before, 1)
+            var = (squares - last_value * last_value - n_before * mean * mean) / np.maximum(n_before - 1, 1)
+            std = np.sqrt(np.maximum(var, 0.0))
+            usable = ready & has_latest & (std > 1e-9 * np.abs(mean) + 1e-12)
+            zscore = np.where(usable, (latest - mean) / np.where(usable, std, 1.0), 0.0)
+            # Same rule as the per-record predictors: last 5 against the 5 before
+            last = m[:, -5:].mean(axis=1)
+            prev = m[:, -10:-5].mean(axis=1)
+            level = np.where(ready, total / np.maximum(n, 1), np.nan)
+            outlier, cohort_median = _cohort_scores(level, codes, len(cohorts))
+            results[name] = {
+                "zscore": zscore,
+                "trend": np.where(prev > 0, last / prev, np.nan),
+                "trending": ready & (last > 2 * prev),
+                "level": level,
+                "outlier": outlier,
+                "cohort_median": cohort_median,
+            }
+    return {"agents": agents, "cohorts": cohorts, "codes": codes, "ready": ready, "series": results}
+
+
+class FleetScanner:
+    def __init__(self, interval=SCAN_INTERVAL, budget=SCAN_BUDGET, window=WINDOW, cohort_of=default_cohort, on_alert=CORRELATOR.submit):
+        self.interval = interval
+        self.budget = budget
+        self.window = window
+        self.cohort_of = cohort_of
+        self.on_alert = on_alert
+        self.histogram = LatencyHistogram()
+        self.counters = {"scans": 0, "over_budget": 0, "alerts": 0, "errors": 0}
+        self.last = {}
+        self._active = set()
+        self._task = None
+
+    def _flags(self, result):
+        flags = {}
+        agents, cohorts, codes = result["agents"], result["cohorts"], result["codes"]
+        for name, s in result["series"].items():
+            for i in np.flatnonzero(np.abs(s["zscore"]) > Z_THRESHOLD):
+                flags[("ZSCORE_ANOMALY", agents[i], name)] = {"series": name, "zscore": float(s["zscore"][i])}
+            off = np.abs(s["level"] - s["cohort_median"]) > OUTLIER_MIN_DEVIATION * np.abs(s["cohort_median"])
+            for i in np.flatnonzero((np.abs(s["outlier"]) > OUTLIER_THRESHOLD) & off):
+                flags[("FLEET_OUTLIER", agents[i], name)] = {
+                    "series": name, "value": float(s["level"][i]), "cohort": cohorts[codes[i]],
+                    "cohort_median": float(s["cohort_median"][i]), "score": float(s["outlier"][i]),
+                }
+        return flags
+
+    def scan(self):
+        start = time.perf_counter()
+        result = scan_fleet(HISTORICAL_METRICS, self.window, self.cohort_of)
+        flags = self._flags(result)
+        new = [key for key in flags if key not in self._active]
+        self._active = set(flags)
+        duration = time.perf_counter() - start
+        self.histogram.observe(duration)
+        self.counters["scans"] += 1
+        if duration > self.budget:
+            self.counters["over_budget"] += 1
+        self.last = {
+            "at": time.time(),
+            "seconds": duration,
+            "agents": len(result["agents"]),
+            "ready": int(result["ready"].sum()) if result["agents"] else 0,
+            "cohorts": len(result["cohorts"]),
+            "flagged": {t: sum(1 for key in flags if key[0] == t) for t in ("ZSCORE_ANOMALY", "FLEET_OUTLIER")},
+            "trending": {name: int(s["trending"].sum()) for name, s in result["series"].items()},
+        }
+        for key in new:
+            alert_type, agent_id, _ = key
+            self.counters["alerts"] += 1
+            self.on_alert({"type": alert_type, "agent_id": agent_id, "details": {"agent_id": agent_id, **flags[key]}})
+        return result
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            if not STARTUP.pending:
+                try:
+                    await asyncio.to_thread(self.scan)
+                except Exception:
+                    self.counters["errors"] += 1
+            duration = time.perf_counter() - start
+            # Fixed cadence; a scan over budget pushes the next one back, so
+            # scanning never takes more than budget/interval of a core
+            await asyncio.sleep(max(self.interval, duration * self.interval / self.budget) - duration)
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {"interval": self.interval, "budget": self.budget, "window": self.window,
+                "counters": dict(self.counters), "latency": self.histogram.snapshot(), "last": self.last}
+
+
+FLEET_SCANNER = FleetScanner()
@@ -0,0 +1,175 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+
+from executor import CPU_POOL, Saturated
+from startup import lazy_import
+
+np = lazy_import("numpy", globals(), "np")
+
+MODEL_DIR = os.environ.get("AEGIS_MODEL_DIR", "models")
+REFIT_INTERVAL = float(os.environ.get("AEGIS_REFIT_INTERVAL", 60))  # seconds
+MAX_MODELS = int(os.environ.get("AEGIS_MAX_MODELS", 10000))
+GRID_POINTS = 256
+
+
+class CachedModel:
+    # A fitted 1-D IsolationForest reduced to its decision_function sampled on
+    # a grid over the training range. The forest's score is piecewise constant
+    # and flat outside that range, so a table lookup stands in for sklearn on
+    # the ingest path.
+    __slots__ = ("lo", "hi", "scores", "fitted_at", "n_samples")
+
+    def __init__(self, lo, hi, scores, fitted_at, n_samples):
+        self.lo = lo
+        self.hi = hi
+        self.scores = scores
+        self.fitted_at = fitted_at
+        self.n_samples = n_samples
+
+    def score(self, x):
+        if self.hi <= self.lo:
+            return float(self.scores[0])
+        i = int((x - self.lo) / (self.hi - self.lo) * (len(self.scores) - 1) + 0.5)
+        return float(self.scores[min(max(i, 0), len(self.scores) - 1)])
+
+
+def fit_cpu_model(values):
+    from sklearn.ensemble import IsolationForest
+    values = np.asarray(values, dtype=np.float64).reshape(-1, 1)
+    clf = IsolationForest(contamination=0.05, random_state=42)  # 5% contamination
+    clf.fit(values)
+    lo, hi = float(values.min()), float(values.max())
+    grid = np.linspace(lo, hi, GRID_POINTS).reshape(-1, 1)
+    return CachedModel(lo, hi, clf.decision_function(grid).astype(np.float32), time.time(), len(values))
+
+
+class ModelRegistry:
+    def __init__(self, max_models=MAX_MODELS, refit_interval=REFIT_INTERVAL, pool=CPU_POOL, cohort_of=None, fit=fit_cpu_model):
+        self.max_models = max_models
+        self.refit_interval = refit_interval
+        # fit runs in `pool` (a process pool by default), so it must be a
+        # picklable module-level function of the training values
+        self.pool = pool
+        self.cohort_of = cohort_of or (lambda agent_id: agent_id)
+        self.fit = fit
+        self._models = OrderedDict()
+        self._pending = set()
+        self._lock = threading.RLock()  # fit callbacks may run inline under it
+        self.counters = {
+            "fits": 0,
+            "fit_errors": 0,
+            "fits_shed": 0,
+            "fit_seconds": 0.0,
+            "scores": 0,
+            "score_seconds": 0.0,
+            "evictions": 0,
+        }
+
+    def _submit(self, key, values):
+        if self.pool.pending >= self.pool.max_pending:
+            # Best-effort: the next observe() for this agent tries again
+            self.counters["fits_shed"] += 1
+            return
+        try:
+            future = self.pool.submit(self.fit, np.array(values, dtype=np.float64))
+        except Saturated:
+            self.counters["fits_shed"] += 1
+            return
+        self._pending.add(key)
+        start = time.perf_counter()
+        future.add_done_callback(lambda f: self._fitted(key, start, f))
+
+    def _fitted(self, key, start, future):
+        try:
+            model = future.result()
+        except Exception:
+            with self._lock:
+                self.counters["fit_errors"] += 1
+                self._pending.discard(key)
+            return
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._pending.discard(key)
+            self.counters["fits"] += 1
+            self.counters["fit_seconds"] += elapsed
+            self._store(key, model)
+
+    def _store(self, key, model):
+        self._models[key] = model
+        self._models.move_to_end(key)
+        while len(self._models) > self.max_models:
+            self._models.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def observe(self, agent_id, values):
+        # Schedules a background (re)fit when the agent's model is missing or stale
+        key = self.cohort_of(agent_id)
+        with self._lock:
+            if key in self._pending:
+                return
+            model = self._models.get(key)
+            if model is not None and time.time() - model.fitted_at < self.refit_interval:
+                return
+            self._submit(key, values)
+
+    def score(self, agent_id, x):
+        start = time.perf_counter()
+        key = self.cohort_of(agent_id)
+        model = self._models.get(key)
+        if model is None:
+            return None
+        try:
+            self._models.move_to_end(key)
+        except KeyError:  # evicted concurrently
+            pass
+        result = model.score(x)
+        self.counters["scores"] += 1
+        self.counters["score_seconds"] += time.perf_counter() - start
+        return result
+
+    def stats(self):
+        c = dict(self.counters)
+        c["models"] = len(self._models)
+        c["pending_fits"] = len(self._pending)
+        c["avg_fit_ms"] = c["fit_seconds"] / c["fits"] * 1e3 if c["fits"] else 0.0
+        c["avg_score_us"] = c["score_seconds"] / c["scores"] * 1e6 if c["scores"] else 0.0
+        return c
+
+    def save_snapshot(self, directory=MODEL_DIR):
+        with self._lock:
+            items = list(self._models.items())
+        if not items:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "cpu_models.npz")
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            keys=np.array([str(k) for k, _ in items]),
+            lo=np.array([m.lo for _, m in items]),
+            hi=np.array([m.hi for _, m in items]),
+            fitted_at=np.array([m.fitted_at for _, m in items]),
+            n_samples=np.array([m.n_samples for _, m in items]),
+            scores=np.stack([m.scores for _, m in items]),
+        )
+        os.replace(tmp, path)
+        return path
+
+    def load_snapshot(self, directory=MODEL_DIR):
+        path = os.path.join(directory, "cpu_models.npz")
+        if not os.path.exists(path):
+            return 0
+        with np.load(path) as data:
+            rows = zip(data["keys"], data["lo"], data["hi"], data["scores"], data["fitted_at"], data["n_samples"])
+            with self._lock:
+                for key, lo, hi, scores, fitted_at, n in rows:
+                    self._store(str(key), CachedModel(float(lo), float(hi), scores, float(fitted_at), int(n)))
+        return len(self._models)
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+MODEL_REGISTRY = ModelRegistry()
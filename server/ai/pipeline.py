@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left
+import threading
+import time
+
+from history_store import field_value
+
+CHEAP = "cheap"          # stateless or O(1) per record, run inline on ingest
+EXPENSIVE = "expensive"  # model scoring and anything heavier, run in the background
+
+# Upper bounds in seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 1e-1, 5e-1, 1.0)
+
+
+class LatencyHistogram:
+    __slots__ = ("buckets", "counts", "count", "total")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "avg_us": self.total / self.count * 1e6 if self.count else 0.0,
+            "p50_us": self.quantile(0.5) * 1e6,
+            "p99_us": self.quantile(0.99) * 1e6,
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+class Detector:
+    __slots__ = ("name", "fn", "fields", "cost", "window", "histogram", "skipped", "errors", "alerts")
+
+    def __init__(self, name, fn, fields, cost, window):
+        self.name = name
+        self.fn = fn
+        self.fields = tuple(fields)
+        self.cost = cost
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.histogram = LatencyHistogram()
+        self.skipped = 0
+        self.errors = 0
+        self.alerts = 0
+
+    def ready(self, record):
+        for field in self.fields:
+            if field_value(record, field) is None:
+                return False
+        return True
+
+    def __call__(self, record):
+        if not self.ready(record):
+            self.skipped += 1
+            return None
+        start = time.perf_counter()
+        try:
+            alert = self.fn(record)
+        except Exception:
+            self.errors += 1
+            alert = None
+        self.histogram.observe(time.perf_counter() - start)
+        if alert:
+            self.alerts += 1
+            alert.setdefault("agent_id", record.get("agent_id"))
+        return alert
+
+
+class DetectorRegistry:
+    def __init__(self):
+        self.detectors = {}
+
+    def register(self, name, fn, fields=(), cost=CHEAP, window=1):
+        if name in self.detectors:
+            raise ValueError(f"Detector already registered: {name}")
+        self.detectors[name] = Detector(name, fn, fields, cost, window)
+        return fn
+
+    def detector(self, name, fields=(), cost=CHEAP, window=1):
+        # Decorator form of register(); the function takes a metric record
+        # and returns an alert dict or None.
+        def wrap(fn):
+            return self.register(name, fn, fields, cost, window)
+        return wrap
+
+    def by_cost(self, cost):
+        return [d for d in self.detectors.values() if d.cost == cost]
+
+
+class Pipeline:
+    # Runs cheap detectors inline and hands expensive ones to a bounded
+    # background pool. Alerts from the background are passed to `on_alert`.
+
+    def __init__(self, registry, workers=2, max_pending=1000, on_alert=None):
+        self.registry = registry
+        self.workers = workers
+        self.max_pending = max_pending
+        self.on_alert = on_alert
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.shed = 0
+
+    def run(self, record):
+        alerts = [alert for alert in (d(record) for d in self.registry.by_cost(CHEAP)) if alert]
+        self.schedule_expensive(record)
+        return alerts
+
+    def run_each(self, records, skip=()):
+        # Cheap detectors over every record except those named in `skip`,
+        # which the caller computes itself. Returns [(record, alert)].
+        detectors = [d for d in self.registry.by_cost(CHEAP) if d.name not in skip]
+        if not detectors:
+            return []
+        return [(record, alert) for record in records for alert in (d(record) for d in detectors) if alert]
+
+    def run_all(self, record):
+        # Everything inline, e.g. for offline replay
+        return [alert for alert in (d(record) for d in self.registry.detectors.values()) if alert]
+
+    def schedule_expensive(self, record):
+        self.schedule_expensive_batch((record,))
+
+    def schedule_expensive_batch(self, records):
+        # One background job for the whole batch rather than one per record
+        detectors = self.registry.by_cost(EXPENSIVE)
+        jobs = [(record, [d for d in detectors if d.ready(record)]) for record in records]
+        jobs = [(record, ds) for record, ds in jobs if ds]
+        if not jobs:
+            return
+        with self._lock:
+            if self._pending >= self.max_pending:
+                # Background work is best-effort; shed rather than queue without bound
+                self.shed += len(jobs)
+                return
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="detector")
+        self._executor.submit(self._run_background, jobs)
+
+    def _run_background(self, jobs):
+        try:
+            for record, detectors in jobs:
+                for detector in detectors:
+                    alert = detector(record)
+                    if alert and self.on_alert is not None:
+                        self.on_alert(alert)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        detectors = {
+            d.name: {
+                "cost": d.cost,
+                "fields": list(d.fields),
+                "window": d.window,
+                "alerts": d.alerts,
+                "skipped": d.skipped,
+                "errors": d.errors,
+                "latency": d.histogram.snapshot(),
+            }
+            for d in self.registry.detectors.values()
+        }
+        return {"detectors": detectors, "background_pending": self._pending, "background_shed": self.shed}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,11 +1,33 @@
-from datetime import datetime
+from datetime import datetime, timezone
+
+# Alert type -> remediation action, for every alert the detectors and the
+# fleet scan emit. Statistical alerts (ML, z-score, fleet outlier) only open
+# an investigation.
+REMEDIATION_RULES = {
+    "CPU_SPIKE": "offload",
+    "PREDICTED_CPU_BOTTLENECK": "scale_up_resources",
+    "PREDICTED_TRAFFIC_SPIKE": "rate_limit",
+    "DDOS": "reroute_traffic",
+    "MALWARE_FLOW": "isolate_endpoint",
+    "UNRECOGNIZED_AGENT": "quarantine",
+    "ROGUE_AGENT_DETECTED": "kill_process",
+    "ML_ANOMALY": "investigate",
+    "ZSCORE_ANOMALY": "investigate",
+    "FLEET_OUTLIER": "investigate",
+}
 
 def remediate(alert):
-    if alert["type"] == "CPU_SPIKE":
-        return {
-            "action": "offload",
-            "target": alert["details"].get("agent_id"),
-            "timestamp": datetime.utcnow().isoformat()
-        }
-    # Add more remediation logic here
-    return None 
\ No newline at end of file
+    # One action per incident, when it opens; fleet incidents are acted on
+    # through their per-agent incidents
+    if alert.get("event", "open") != "open" or alert.get("scope") == "fleet":
+        return None
+    action = REMEDIATION_RULES.get(alert.get("type"))
+    if action is None:
+        return None
+    target = alert.get("details", {}).get("agent_id") or alert.get("agent_id")
+    return {
+        "action": action,
+        "target": target,
+        "alert_type": alert["type"],
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
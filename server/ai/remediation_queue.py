@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+from ai.pipeline import LatencyHistogram
+from ai.remediation_engine import remediate
+from database import log_action
+
+STOP_TIMEOUT = 5.0  # seconds stop() waits for an in-flight batch
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        # Returns 0 if a token was taken, else seconds until one is available
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class LocalExecutor:
+    # Stand-in executor: records the actions instead of acting on hosts
+    async def execute(self, actions):
+        for action in actions:
+            log_action(action)
+
+
+class RemediationQueue:
+    # Turns alerts into actions off the ingest path. Duplicate actions for the
+    # same target within `coalesce_window` are merged; each target has a token
+    # bucket so an alert storm cannot flood the executor; actions are
+    # dispatched to the executor in batches. Every `prune_interval` a timer
+    # forgets dedup entries past the window and buckets idle long enough to
+    # have refilled, so state follows the active targets, not every target
+    # ever seen.
+
+    def __init__(self, executor, rate=1.0, burst=5, coalesce_window=30.0, batch_size=100, batch_interval=0.05,
+                 max_queue=10000, prune_interval=None, clock=time.monotonic):
+        self.executor = executor
+        self.rate = rate
+        self.burst = burst
+        self.coalesce_window = coalesce_window
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_queue = max_queue
+        self.prune_interval = prune_interval or coalesce_window
+        self.clock = clock
+        self.loop = None
+        self._queue = None
+        self._task = None
+        self._stopping = None
+        self._prune_timer = None
+        self._recent = {}
+        self._buckets = {}
+        self._deferred = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.latency = LatencyHistogram()
+        self.counters = {"submitted": 0, "coalesced": 0, "dropped": 0, "rate_limited": 0, "executed": 0, "failed": 0}
+
+    def bind(self, loop=None):
+        # Ready to accept submissions; start() also runs the dispatch loop
+        self.loop = loop or asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._stopping = asyncio.Event()
+
+    def start(self, loop=None):
+        self.bind(loop)
+        self._task = self.loop.create_task(self._run())
+        self._prune_timer = self.loop.call_later(self.prune_interval, self._prune_tick)
+
+    async def stop(self, timeout=STOP_TIMEOUT):
+        # The run loop checks _stopping between batches; it is only cancelled
+        # if the executor is still busy after `timeout`, and stop() never
+        # waits longer than twice that
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._prune_timer.cancel()
+        self._stopping.set()
+        await asyncio.wait((task,), timeout=timeout)
+        if not task.done():
+            task.cancel()
+            await asyncio.wait((task,), timeout=timeout)
+
+    def submit(self, alert):
+        # Non-blocking; safe to call from the event loop or worker threads
+        action = remediate(alert)
+        if action is None or self.loop is None:
+            return False
+        now = self.clock()
+        key = (action["target"], action["action"])
+        with self._lock:
+            self.counters["submitted"] += 1
+            seen = self._recent.get(key)
+            if seen is not None and now - seen < self.coalesce_window:
+                self.counters["coalesced"] += 1
+                return False
+            self._recent[key] = now
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._enqueue(now, action)
+        else:
+            self.loop.call_soon_threadsafe(self._enqueue, now, action)
+        return True
+
+    def _enqueue(self, enqueued, action):
+        try:
+            self._queue.put_nowait((enqueued, action))
+        except asyncio.QueueFull:
+            self.counters["dropped"] += 1
+
+    async def _get(self, timeout, stopping):
+        # Next queued (enqueued, action), or None on timeout or stop. Not
+        # wait_for: on 3.11 it can swallow a cancel that lands in the same
+        # tick as an item, which left the run loop waiting forever.
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        getter = self.loop.create_task(self._queue.get())
+        await asyncio.wait((getter, stopping), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if getter.done():
+            return getter.result()
+        getter.cancel()  # an item it was woken for stays in the queue
+        return None
+
+    async def _next_batch(self, stopping):
+        batch = []
+        timeout = None
+        if self._deferred:
+            timeout = max(0.0, self._deferred[0][0] - self.clock())
+        item = await self._get(timeout, stopping)
+        if item is not None:
+            batch.append(item)
+        deadline = self.clock() + self.batch_interval
+        while item is not None and len(batch) < self.batch_size:
+            # Whatever is already queued joins the batch; then wait out the interval
+            remaining = deadline - self.clock()
+            if remaining <= 0 and self._queue.empty():
+                break
+            item = await self._get(max(remaining, 0.0), stopping)
+            if item is not None:
+                batch.append(item)
+        now = self.clock()
+        while self._deferred and self._deferred[0][0] <= now and len(batch) < self.batch_size:
+            _, _, enqueued, action = heapq.heappop(self._deferred)
+            batch.append((enqueued, action))
+        return batch
+
+    async def _run(self):
+        stopping = self.loop.create_task(self._stopping.wait())
+        try:
+            while not self._stopping.is_set():
+                await self._dispatch(await self._next_batch(stopping))
+        finally:
+            stopping.cancel()
+
+    async def _dispatch(self, batch):
+        now = self.clock()
+        ready = []
+        for enqueued, action in batch:
+            bucket = self._buckets.get(action["target"])
+            if bucket is None:
+                bucket = self._buckets[action["target"]] = TokenBucket(self.rate, self.burst, now)
+            wait = bucket.take(now)
+            if wait:
+                self.counters["rate_limited"] += 1
+                heapq.heappush(self._deferred, (now + wait, next(self._seq), enqueued, action))
+            else:
+                ready.append((enqueued, action))
+        if ready:
+            try:
+                await self.executor.execute([action for _, action in ready])
+                self.counters["executed"] += len(ready)
+            except Exception:
+                self.counters["failed"] += len(ready)
+            done = self.clock()
+            for enqueued, _ in ready:
+                self.latency.observe(done - enqueued)
+
+    def _prune_tick(self):
+        self._prune(self.clock())
+        self._prune_timer = self.loop.call_later(self.prune_interval, self._prune_tick)
+
+    def _prune(self, now):
+        with self._lock:
+            self._recent = {k: t for k, t in self._recent.items() if now - t < self.coalesce_window}
+        # A bucket idle for burst/rate seconds is full again, same as a new one
+        idle = self.burst / self.rate
+        self._buckets = {target: b for target, b in self._buckets.items() if now - b.updated < idle}
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        stats["deferred"] = len(self._deferred)
+        stats["targets"] = len(self._buckets)
+        stats["latency"] = self.latency.snapshot()
+        return stats
+
+
+REMEDIATION = RemediationQueue(LocalExecutor())
@@ -0,0 +1,138 @@
+import math
+import struct
+
+from history_store import field_value
+
+_FLOAT32 = struct.Struct("f")
+
+# Derived series tracked per agent, mapped to the record fields they sum.
+SERIES = {
+    "cpu": ("cpu",),
+    "memory": ("memory",),
+    "traffic": ("net_io.sent", "net_io.recv"),
+    "packets_per_sec": ("packets_per_sec",),
+}
+
+
+def _float32(value):
+    # Rounded as the history stores it, so what leaves the sums later is what went in
+    try:
+        return _FLOAT32.unpack(_FLOAT32.pack(value))[0]
+    except OverflowError:
+        return math.copysign(math.inf, value)
+
+
+class FieldStats:
+    # Running aggregates for one series, all updated in O(1) per sample:
+    # lifetime count/mean/variance (Welford), min/max, EWMA, plus sums and
+    # sample counts over the trailing windows (in records) given in
+    # `windows`. Samples leaving a window are read back from the history,
+    # so nothing is buffered here.
+    __slots__ = ("count", "mean", "m2", "min", "max", "ewma", "alpha", "last", "sums", "counts")
+
+    def __init__(self, windows, alpha):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.ewma = None
+        self.alpha = alpha
+        self.last = None
+        self.sums = dict.fromkeys(windows, 0.0)
+        self.counts = dict.fromkeys(windows, 0)
+
+    def update(self, x, evicted):
+        # x: the new sample, or None if the record lacks this series (it
+        # still pushes old samples out). evicted: per window, the value
+        # leaving it, NaN if none.
+        sums, counts = self.sums, self.counts
+        if x is None:
+            for window, value in zip(sums, evicted):
+                if value == value:
+                    sums[window] -= value
+                    counts[window] -= 1
+            return
+        for window, value in zip(sums, evicted):
+            if value == value:
+                sums[window] += x - value
+            else:
+                sums[window] += x
+                counts[window] += 1
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        self.ewma = x if self.ewma is None else self.alpha * x + (1 - self.alpha) * self.ewma
+        self.last = x
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def filled(self, window):
+        return self.counts[window]
+
+    def window_sum(self, window):
+        return self.sums[window]
+
+    def window_mean(self, window):
+        n = self.counts[window]
+        return self.sums[window] / n if n else 0.0
+
+
+class RollingStats:
+    # Reads evicted samples from `history`, so update() must run before the
+    # record is appended there; windows can be at most history.maxlen.
+    def __init__(self, history, windows=(5, 10, 100), alpha=0.3, series=SERIES):
+        self.history = history
+        self.windows = tuple(windows)
+        self.alpha = alpha
+        self.series = series
+        self.fields = tuple(dict.fromkeys(f for fields in series.values() for f in fields))
+        self.agents = {}
+
+    def __getstate__(self):
+        # Pickled next to the history it reads from, never with it
+        state = dict(self.__dict__)
+        del state["history"]
+        return state
+
+    def update(self, record, slot):
+        stats = self.agents.get(record["agent_id"])
+        if stats is None:
+            stats = self.agents[record["agent_id"]] = {}
+        values = {}
+        for field in self.fields:
+            value = field_value(record, field)
+            values[field] = None if value is None else _float32(value)
+        evicted = self.history.evicting(slot, self.fields, self.windows)
+        for name, fields in self.series.items():
+            field_stats = stats.get(name)
+            if len(fields) == 1:
+                total = values[fields[0]]
+                leaving = evicted[fields[0]]
+            else:
+                parts = [values[f] for f in fields]
+                total = None if None in parts else sum(parts)
+                leaving = [sum(v) for v in zip(*(evicted[f] for f in fields))]
+            if field_stats is None:
+                if total is None:
+                    continue
+                field_stats = stats[name] = FieldStats(self.windows, self.alpha)
+            field_stats.update(total, leaving)
+
+    def get(self, agent_id, name):
+        stats = self.agents.get(agent_id)
+        return stats.get(name) if stats else None
+
+    def clear(self):
+        self.agents.clear()
@@ -1,14 +1,121 @@
-from fastapi import FastAPI
-from routers import alerts, actions, simulation
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from routers import alerts, actions, history, simulation, stream
+from ai.model_registry import MODEL_REGISTRY, MODEL_DIR
+from ai.baselines import BASELINES
+from ai.anomaly_detector import PIPELINE
+from ai.remediation_queue import REMEDIATION
+from ai.fleet_scan import FLEET_SCANNER
+from ai.correlation import CORRELATOR
+import database
+from streaming import HUB
+from executor import CPU_POOL, INGEST_POOL, Saturated
+from sharding import CLUSTER, shard_path
+from startup import STARTUP
+from instrumentation import REGISTRY, CONTENT_TYPE, LOOP_MONITOR, DetectorHistograms
 
-app = FastAPI()
+REGISTRY.register(DetectorHistograms("aegis_detector_seconds", "Per-detector latency", PIPELINE))
+REGISTRY.gauge("aegis_alerts", "Alerts stored").set_function(database.count_alerts)
+REGISTRY.gauge("aegis_actions", "Remediation actions stored").set_function(database.count_actions)
+REGISTRY.gauge("aegis_agents", "Agents with history").set_function(lambda: len(database.HISTORICAL_METRICS))
+REGISTRY.gauge("aegis_history_bytes", "Memory held by the metric history").set_function(lambda: database.HISTORICAL_METRICS.nbytes)
+REGISTRY.gauge("aegis_rollup_bytes", "Memory held by the history rollup tiers").set_function(lambda: database.ROLLUPS.nbytes)
+REGISTRY.gauge("aegis_stream_subscribers", "Open stream subscribers").set_function(lambda: len(HUB.subscribers))
+REGISTRY.gauge("aegis_detector_pending", "Background detector jobs queued").set_function(lambda: PIPELINE._pending)
+REGISTRY.gauge("aegis_remediation_queue_depth", "Actions waiting for the executor").set_function(lambda: REMEDIATION.stats()["queue_depth"])
+POOL_PENDING = REGISTRY.gauge("aegis_pool_pending", "Jobs queued or running per pool", ("pool",))
+POOL_PENDING.labels("cpu").set_function(lambda: CPU_POOL.pending)
+POOL_PENDING.labels("ingest").set_function(lambda: INGEST_POOL.pending)
+REGISTRY.gauge("aegis_models", "Cached per-agent models").set_function(lambda: MODEL_REGISTRY.stats()["models"])
+REGISTRY.gauge("aegis_open_incidents", "Open alert incidents").set_function(lambda: CORRELATOR.stats()["open"])
+REGISTRY.gauge("aegis_fleet_scan_seconds", "Duration of the last fleet scan").set_function(lambda: FLEET_SCANNER.last.get("seconds", 0.0))
+
+@asynccontextmanager
+async def lifespan(app):
+    HUB.bind(asyncio.get_running_loop())
+    LOOP_MONITOR.start()
+    # Models, baselines and history are restored in the background; ingest
+    # waits for /ready, everything else is served right away
+    STARTUP.start(database.DATA_DIR, shard_path(MODEL_DIR))
+    REMEDIATION.start()
+    database.ALERT_LISTENERS.append(REMEDIATION.submit)
+    CORRELATOR.start()
+    await CLUSTER.start(app)
+    FLEET_SCANNER.start()
+    yield
+    await FLEET_SCANNER.stop()
+    await CLUSTER.stop()
+    await CORRELATOR.stop()
+    database.ALERT_LISTENERS.remove(REMEDIATION.submit)
+    await REMEDIATION.stop()
+    await LOOP_MONITOR.stop()
+    await simulation.close_client()
+    await STARTUP.stop(database.DATA_DIR, shard_path(MODEL_DIR))
+    MODEL_REGISTRY.shutdown()
+    INGEST_POOL.shutdown()
+    PIPELINE.shutdown()
+    database.close()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(Saturated)
+async def saturated_handler(request: Request, exc: Saturated):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
 
 app.include_router(alerts.router, prefix="/alerts")
 app.include_router(actions.router, prefix="/actions")
+app.include_router(history.router, prefix="/history")
 app.include_router(simulation.router, prefix="/simulate")
+app.include_router(stream.router, prefix="/stream")
 
 @app.get("/")
+def root():
+    return {"msg": "Aegis of Alderaan Python Backend is running!"}
+
 @app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
 
-def root():
-    return {"msg": "Aegis of Alderaan Python Backend is running!"} 
\ No newline at end of file
+@app.get("/models")
+def model_stats():
+    return MODEL_REGISTRY.stats()
+
+
+@app.get("/live")
+def live():
+    return {"status": "alive"}
+
+@app.get("/ready")
+def ready():
+    return JSONResponse(status_code=200 if STARTUP.ready else 503, content=STARTUP.status())
+
+@app.get("/baselines")
+def baseline_stats():
+    return BASELINES.stats()
+
+@app.get("/detectors")
+def detector_stats():
+    return PIPELINE.stats()
+
+@app.get("/remediation")
+def remediation_stats():
+    return REMEDIATION.stats()
+
+@app.get("/executor")
+def executor_stats():
+    return {"cpu": CPU_POOL.stats(), "ingest": INGEST_POOL.stats()}
+
+@app.get("/incidents")
+def incidents(type: Optional[str] = None, agent_id: Optional[str] = None):
+    return {"open": CORRELATOR.open_incidents(type, agent_id), "stats": CORRELATOR.stats()}
+
+@app.get("/fleet")
+def fleet_stats():
+    return FLEET_SCANNER.stats()
+
+@app.get("/shards")
+def shard_stats():
+    return CLUSTER.stats()
@@ -0,0 +1,58 @@
+# Compares records/sec of POST /alerts/ (one record per request) with POST /alerts/batch.
+# Run from the server directory: python benchmarks/batch_ingest.py [--agents N] [--records N]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+import database
+from app import app
+
+
+def make_records(n_agents, n_records):
+    records = []
+    for i in range(n_records):
+        agent = f"agent_{i % n_agents}"
+        records.append({
+            "agent_id": agent,
+            "cpu": random.uniform(5, 95),
+            "memory": random.uniform(10, 90),
+            "net_io": {"sent": random.randint(100, 10000), "recv": random.randint(100, 10000), "outbound_connections": random.randint(0, 120)},
+        })
+    return records
+
+
+def bench_single(client, records):
+    database.reset()
+    start = time.perf_counter()
+    for record in records:
+        client.post("/alerts/", json=record)
+    return len(records) / (time.perf_counter() - start)
+
+
+def bench_batch(client, records, batch_size):
+    database.reset()
+    start = time.perf_counter()
+    for i in range(0, len(records), batch_size):
+        client.post("/alerts/batch", json=records[i:i + batch_size])
+    return len(records) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    records = make_records(args.agents, args.records)
+    client = TestClient(app)
+    single = bench_single(client, records[:min(len(records), 5000)])
+    batch = bench_batch(client, records, args.batch_size)
+    print(f"single: {single:,.0f} records/sec")
+    print(f"batch:  {batch:,.0f} records/sec ({batch / single:.1f}x)")
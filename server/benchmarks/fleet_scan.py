@@ -0,0 +1,59 @@
+# Cost of one fleet scan (ai/fleet_scan.py) against fleet size. History is
+# filled straight into the column buffers (full windows of noisy samples) so
+# large fleets do not have to be ingested first; a few agents per cohort are
+# shifted so the outlier pass has something to find.
+#
+# Run from the server directory:
+#   python benchmarks/fleet_scan.py [--agents 1000 10000 50000] [--cohorts 20]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AEGIS_STORAGE", "memory")
+
+
+def filled_history(agents, outliers, seed=0):
+    import numpy as np
+    from history_store import ColumnarHistory
+    history = ColumnarHistory(maxlen=100)
+    for i in range(agents):
+        history.slot(f"fleet_{i}")
+    rng = np.random.default_rng(seed)
+    means = {"cpu": 20, "memory": 40, "net_io.sent": 500, "net_io.recv": 500, "packets_per_sec": 50}
+    for field, mean in means.items():
+        samples = rng.normal(mean, mean * 0.1, size=(agents, history.maxlen))
+        samples[:outliers] *= 5
+        column = history._columns[field]
+        column[:agents, :history.maxlen] = samples
+        column[:agents, history.maxlen:] = samples
+    history._columns["timestamp"][:agents] = 0.0
+    history._count[:agents] = history.maxlen
+    return history
+
+
+def main(args):
+    from ai.fleet_scan import scan_fleet, OUTLIER_THRESHOLD
+    import numpy as np
+    for agents in args.agents:
+        history = filled_history(agents, outliers=args.cohorts)
+        cohort_of = lambda agent_id: f"cohort_{int(agent_id[6:]) % args.cohorts}"
+        scan_fleet(history, args.window, cohort_of)  # warm up
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = scan_fleet(history, args.window, cohort_of)
+            best = min(best, time.perf_counter() - start)
+        flagged = int((np.abs(result["series"]["cpu"]["outlier"]) > OUTLIER_THRESHOLD).sum())
+        print(f"{agents:>7} agents: {best * 1e3:8.1f} ms/scan  ({best / agents * 1e6:.2f} us/agent, "
+              f"{flagged} cpu outliers of {args.cohorts} planted)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--cohorts", type=int, default=20)
+    parser.add_argument("--window", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,220 @@
+# Load generator for the ingest path, built on routers/simulation.py.
+#
+# Simulates many agents with a configurable attack mix at a target request rate,
+# either over pooled keep-alive HTTP connections to a running server or in-process
+# through the ASGI transport (no network). Reports ingest latency, detection
+# latency (attack start -> first matching alert) and throughput, and writes the
+# results as JSON so runs can be compared.
+#
+# Run from the server directory, e.g.:
+#   python benchmarks/loadgen.py --mode asgi --agents 2000 --rps 2000 --duration 20
+#   python benchmarks/loadgen.py --mode http --url http://localhost:8000 --batch-size 500
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from routers.simulation import ATTACK_TYPES, make_metric
+
+DEFAULT_MIX = "normal=0.9,cpu_spike=0.03,ddos=0.03,memory_overload=0.02,rogue_agent=0.02"
+
+# Alert types that count as detecting each attack
+ATTACK_ALERTS = {
+    "cpu_spike": {"PREDICTED_CPU_BOTTLENECK", "ML_ANOMALY"},
+    "memory_overload": {"ML_ANOMALY"},
+    "ddos": {"DDOS", "PREDICTED_TRAFFIC_SPIKE"},
+    "rogue_agent": {"UNRECOGNIZED_AGENT"},
+}
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name != "normal" and name not in ATTACK_TYPES:
+            raise SystemExit(f"Unknown attack type in mix: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class LoadGenerator:
+    def __init__(self, client, n_agents, mix, rps, duration, attack_after, batch_size, concurrency, seed=0):
+        rng = random.Random(seed)
+        names, weights = zip(*mix.items())
+        self.client = client
+        self.agents = [f"load_{i}" for i in range(n_agents)]
+        self.roles = {agent: rng.choices(names, weights)[0] for agent in self.agents}
+        self.rps = rps
+        self.duration = duration
+        self.attack_after = attack_after
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.latencies = []
+        self.errors = 0
+        self.sent = 0
+        self.attack_started_at = None
+        self.detected = {}
+        self.false_positives = 0
+
+    def record_for(self, agent, attacking):
+        role = self.roles[agent]
+        return make_metric(role if attacking and role != "normal" else "normal", agent)
+
+    def _owner(self, alert_agent):
+        if alert_agent and alert_agent.startswith("rogue_"):
+            return alert_agent[len("rogue_"):]
+        return alert_agent
+
+    def _observe_alerts(self, alerts, now):
+        for alert in alerts:
+            agent = self._owner(alert.get("agent_id"))
+            role = self.roles.get(agent)
+            if role is None:
+                continue
+            if role == "normal" or self.attack_started_at is None:
+                if alert.get("type") in set().union(*ATTACK_ALERTS.values()) - {"UNRECOGNIZED_AGENT"}:
+                    self.false_positives += 1
+                continue
+            if agent not in self.detected and alert.get("type") in ATTACK_ALERTS[role]:
+                self.detected[agent] = now - self.attack_started_at
+
+    async def _send(self, records):
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                if self.batch_size:
+                    response = await self.client.post("/alerts/batch", json=records)
+                else:
+                    response = await self.client.post("/alerts/", json=records[0])
+                response.raise_for_status()
+            except httpx.HTTPError:
+                self.errors += 1
+                return
+            now = time.perf_counter()
+            self.latencies.append(now - start)
+            body = response.json()
+            alerts = body.get("alerts", [])
+            if isinstance(alerts, dict):
+                alerts = [a for per_agent in alerts.values() for a in per_agent]
+            self._observe_alerts(alerts, now)
+
+    async def run(self):
+        per_request = max(self.batch_size, 1)
+        interval = per_request / self.rps
+        tasks = set()
+        start = time.perf_counter()
+        next_send = start
+        cursor = 0
+        while True:
+            now = time.perf_counter()
+            if now - start >= self.duration:
+                break
+            attacking = now - start >= self.attack_after
+            if attacking and self.attack_started_at is None:
+                self.attack_started_at = now
+            records = []
+            for _ in range(per_request):
+                records.append(self.record_for(self.agents[cursor % len(self.agents)], attacking))
+                cursor += 1
+            task = asyncio.create_task(self._send(records))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            self.sent += len(records)
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif cursor % 64 == 0:
+                await asyncio.sleep(0)
+        if tasks:
+            await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        attackers = {a: r for a, r in self.roles.items() if r != "normal"}
+        detection = {}
+        for role in ATTACK_TYPES:
+            agents = [a for a, r in attackers.items() if r == role]
+            delays = [self.detected[a] for a in agents if a in self.detected]
+            detection[role] = {
+                "agents": len(agents),
+                "detected": len(delays),
+                "p50_s": percentile(delays, 0.5),
+                "p99_s": percentile(delays, 0.99),
+            }
+        return {
+            "records_sent": self.sent,
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "elapsed_s": elapsed,
+            "throughput_rps": self.sent / elapsed if elapsed else 0.0,
+            "ingest_latency_ms": {
+                "p50": (percentile(self.latencies, 0.5) or 0) * 1e3,
+                "p99": (percentile(self.latencies, 0.99) or 0) * 1e3,
+            },
+            "detection": detection,
+            "false_positives": self.false_positives,
+        }
+
+
+async def main(args):
+    mix = parse_mix(args.mix)
+    if args.mode == "asgi":
+        from app import app
+        import database
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+        for i in range(args.agents):
+            database.upsert_profile({"agent_id": f"load_{i}"})
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadgen")
+    else:
+        lifespan = None
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30)
+    try:
+        generator = LoadGenerator(client, args.agents, mix, args.rps, args.duration, args.attack_after, args.batch_size, args.concurrency)
+        elapsed = await generator.run()
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": generator.report(elapsed),
+    }
+    print(json.dumps(result["results"], indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["asgi", "http"], default="asgi")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--rps", type=float, default=1000, help="target records per second")
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--attack-after", type=float, default=8, help="seconds of baseline traffic before attacks start")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--batch-size", type=int, default=0, help="records per POST /alerts/batch; 0 posts single records")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--out", default="loadgen_results.json")
+    asyncio.run(main(parser.parse_args()))
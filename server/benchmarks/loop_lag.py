@@ -0,0 +1,112 @@
+# Checks that cheap endpoints stay responsive while heavy ingest and model
+# fits run. Serves the app in-process (ASGI transport), probes GET /alerts/ at
+# a fixed interval, first idle and then while a writer floods /alerts/batch
+# with new agents (each needing a model fit), and reports probe latency and
+# event-loop lag percentiles for both phases.
+#
+# Run from the server directory, e.g.:
+#   python benchmarks/loop_lag.py --seconds 10
+#   AEGIS_FIT_PROCESSES=0 python benchmarks/loop_lag.py   # fits in threads, for comparison
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def probe(client, stop, interval, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/alerts/", params={"limit": 10})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+
+async def lag(stop, interval, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+def make_bodies(batch_size, agents, count=50):
+    # Pre-encoded so generating load does not itself block the loop
+    import json
+    from routers.simulation import make_metric
+    bodies = []
+    for b in range(count):
+        records = [make_metric("normal", f"lag_{(b * batch_size + i) % agents}") for i in range(batch_size)]
+        bodies.append(json.dumps(records).encode())
+    return bodies
+
+
+async def flood(client, stop, bodies, counts):
+    n = 0
+    while not stop.is_set():
+        body = bodies[n % len(bodies)]
+        n += 1
+        response = await client.post("/alerts/batch", content=body, headers={"Content-Type": "application/json"})
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+        if response.status_code == 503:
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)) / 10)
+
+
+async def phase(client, seconds, bodies, args):
+    stop = asyncio.Event()
+    latencies, lags, counts = [], [], {}
+    tasks = [asyncio.create_task(probe(client, stop, args.interval, latencies)), asyncio.create_task(lag(stop, args.interval, lags))]
+    if bodies:
+        tasks += [asyncio.create_task(flood(client, stop, bodies, counts)) for _ in range(args.writers)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return {
+        "probe_p50_ms": percentile(latencies, 0.5) * 1e3,
+        "probe_p99_ms": percentile(latencies, 0.99) * 1e3,
+        "loop_lag_p99_ms": percentile(lags, 0.99) * 1e3,
+        "batch_status": counts,
+    }
+
+
+async def main(args):
+    import httpx
+    from app import app
+    from ai.model_registry import MODEL_REGISTRY
+    import database
+    for i in range(args.agents):  # known agents, so the flood is not also an alert storm
+        database.upsert_profile({"agent_id": f"lag_{i}"})
+    lifespan = app.router.lifespan_context(app)
+    await lifespan.__aenter__()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lag") as client:
+            bodies = make_bodies(args.batch_size, args.agents)
+            idle = await phase(client, args.seconds / 2, None, args)
+            loaded = await phase(client, args.seconds, bodies, args)
+    finally:
+        await lifespan.__aexit__(None, None, None)
+    for name, result in (("idle", idle), ("under load", loaded)):
+        print(f"{name:>10}: probe p50 {result['probe_p50_ms']:7.2f} ms  p99 {result['probe_p99_ms']:7.2f} ms  "
+              f"loop lag p99 {result['loop_lag_p99_ms']:7.2f} ms  {result['batch_status'] or ''}")
+    stats = MODEL_REGISTRY.stats()
+    print(f"model fits: {stats['fits']} done, {stats['fits_shed']} shed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--agents", type=int, default=2000)
+    args = parser.parse_args()
+    os.environ.setdefault("AEGIS_MODEL_DIR", tempfile.mkdtemp())  # start without cached models
+    asyncio.run(main(args))
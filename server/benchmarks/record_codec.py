@@ -0,0 +1,80 @@
+# Per-record cost of decode + detect on the batch ingest path, for the wire
+# formats the API accepts. "dict" is what FastAPI did for a List[dict] body
+# (json.loads, then pydantic validation) feeding dict records to the
+# detectors; "json" and "msgpack" decode straight into schemas.MetricRecord.
+# History is prefilled so the detectors see full windows. Background
+# detectors are shed so their thread does not compete for the GIL.
+#
+# Run from the server directory:
+#   python benchmarks/record_codec.py [--agents N] [--batch-size N] [--batches N]
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AEGIS_STORAGE", "memory")
+
+
+def make_batches(args):
+    from routers.simulation import make_metric
+    return [[dict(make_metric("normal", f"codec_{(b * args.batch_size + i) % args.agents}"),
+                  per_process=[{"name": "nginx", "cpu": 3.0}, {"name": "python", "cpu": 5.0}])
+             for i in range(args.batch_size)] for b in range(args.batches)]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args):
+    from typing import List
+    from pydantic import TypeAdapter
+    import database
+    import schemas
+    from ai.anomaly_detector import PIPELINE, detect_batch
+    PIPELINE.max_pending = 0
+    for i in range(args.agents):
+        database.upsert_profile({"agent_id": f"codec_{i}"})
+    batches = make_batches(args)
+    for _ in range(database.HISTORY_LEN // len(batches) + 1):
+        for batch in batches:
+            database.add_historical_metrics(batch)
+
+    adapter = TypeAdapter(List[dict])
+    bodies = {
+        "dict": [json.dumps(b).encode() for b in batches],
+        "json": [schemas.encode_json(b) for b in batches],
+        "msgpack": [schemas.encode_msgpack(b) for b in batches],
+    }
+    decoders = {
+        "dict": lambda body: adapter.validate_python(json.loads(body)),
+        "json": lambda body: schemas.decode(body, list[schemas.MetricRecord]),
+        "msgpack": lambda body: schemas.decode(body, list[schemas.MetricRecord], schemas.MSGPACK_TYPES[0]),
+    }
+    n = args.batch_size * args.batches
+    results = {}
+    for name, decode in decoders.items():
+        decoded = [decode(body) for body in bodies[name]]
+        decode_s = best_of(lambda: [decode(body) for body in bodies[name]], args.repeat)
+        # detect_batch appends to the history too, as ingest does
+        detect_s = best_of(lambda: [detect_batch(records) for records in decoded], args.repeat)
+        results[name] = (decode_s + detect_s) / n * 1e6
+        print(f"{name:>8}: decode {decode_s / n * 1e6:6.2f} us  detect {detect_s / n * 1e6:6.2f} us  "
+              f"total {results[name]:6.2f} us/record  ({results['dict'] / results[name]:.1f}x)")
+    PIPELINE.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--batches", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,99 @@
+# Ingest throughput against the number of agent shards. For each shard count
+# it starts `python sharding.py --shards N` on a free port, floods
+# /alerts/batch from several client processes, and reports records/sec.
+# Throughput should grow close to linearly until shards reach the core count.
+#
+# Run from the server directory, e.g.:
+#   python benchmarks/shard_scaling.py --shards 1 2 4 --seconds 10
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, timeout=120):
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url + "/shards").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("server did not start")
+
+
+def writer(url, bodies, seconds, results):
+    import httpx
+    accepted = 0
+    deadline = time.monotonic() + seconds
+    with httpx.Client(base_url=url, timeout=60) as client:
+        n = 0
+        while time.monotonic() < deadline:
+            response = client.post("/alerts/batch", content=bodies[n % len(bodies)], headers={"Content-Type": "application/json"})
+            n += 1
+            if response.status_code == 200:
+                accepted += response.json()["accepted"]
+            else:
+                time.sleep(0.05)
+    results.put(accepted)
+
+
+def make_bodies(batch_size, agents, count=20):
+    from routers.simulation import make_metric
+    return [json.dumps([make_metric("normal", f"shard_{(b * batch_size + i) % agents}") for i in range(batch_size)]).encode()
+            for b in range(count)]
+
+
+def run(shards, bodies, args):
+    port = free_port()
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, AEGIS_STORAGE="memory", AEGIS_MODEL_DIR=os.path.join(tmp, "models"),
+               AEGIS_SHARD_DIR=os.path.join(tmp, "s"), AEGIS_CPU_WORKERS="1")
+    server = subprocess.Popen([sys.executable, "sharding.py", "--shards", str(shards), "--host", "127.0.0.1", "--port", str(port)],
+                              cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(url)
+        results = multiprocessing.Queue()
+        writers = [multiprocessing.Process(target=writer, args=(url, bodies, args.seconds, results)) for _ in range(args.writers)]
+        for w in writers:
+            w.start()
+        total = sum(results.get() for _ in writers)
+        for w in writers:
+            w.join()
+    finally:
+        server.terminate()
+        server.wait()
+    return total / args.seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--agents", type=int, default=2000)
+    args = parser.parse_args()
+    bodies = make_bodies(args.batch_size, args.agents)
+    base = None
+    for shards in args.shards:
+        rate = run(shards, bodies, args)
+        base = base or rate / shards
+        print(f"{shards:>3} shards: {rate:10.0f} rec/s  ({rate / base / shards * 100:5.1f}% of linear)  cores: {os.cpu_count()}")
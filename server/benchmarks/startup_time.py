@@ -0,0 +1,99 @@
+# Tracks how fast the server comes back. Reports:
+#   import  - `import app` in a fresh interpreter (best of --repeat)
+#   live    - process spawn until GET /live answers
+#   ready   - process spawn until GET /ready answers 200 (heavy imports done
+#             and the state snapshot restored)
+# once with no snapshot and once with a snapshot of --agents agents with full
+# history, which is written first by a helper process.
+#
+# Run from the server directory, e.g.:
+#   python benchmarks/startup_time.py --agents 10000
+#   python -X importtime -c "import app" 2>&1 | sort -t'|' -k2 -n | tail   # where import time goes
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_time(env, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app"], cwd=SERVER_DIR, env=env, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def write_snapshot(env, agents):
+    # Fills history for `agents` agents and saves it the way shutdown does
+    code = (
+        "import database, startup\n"
+        "from routers.simulation import make_metric\n"
+        f"for i in range(database.HISTORY_LEN):\n"
+        f"    database.add_historical_metrics([make_metric('normal', f'boot_{{a}}') for a in range({agents})])\n"
+        f"for a in range({agents}):\n"
+        f"    database.upsert_profile({{'agent_id': f'boot_{{a}}'}})\n"
+        "startup.save_state(database.DATA_DIR, startup.os.environ['AEGIS_MODEL_DIR'])\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=SERVER_DIR, env=env, check=True)
+
+
+def boot(env):
+    import httpx  # imported before the clock starts
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=SERVER_DIR, env=env)
+    url = f"http://127.0.0.1:{port}"
+    live = ready = None
+    try:
+        while ready is None:
+            try:
+                if live is None and httpx.get(url + "/live").status_code == 200:
+                    live = time.perf_counter() - start
+                if live is not None:
+                    response = httpx.get(url + "/ready")
+                    if response.status_code == 200:
+                        ready = time.perf_counter() - start
+                        restored = response.json()["restored"]
+            except httpx.TransportError:
+                pass
+            time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+    return live, ready, restored
+
+
+def main(args):
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, AEGIS_STORAGE="memory", AEGIS_DATA_DIR=os.path.join(tmp, "data"),
+               AEGIS_MODEL_DIR=os.path.join(tmp, "models"), AEGIS_SNAPSHOT_INTERVAL="0")
+    print(f"import app: {import_time(env, args.repeat) * 1e3:7.1f} ms")
+    for label in ("empty", f"{args.agents} agents"):
+        if label != "empty":
+            write_snapshot(env, args.agents)
+        # Shutdown writes a snapshot too, so each boot starts from the same file
+        results = [boot(env) for _ in range(args.repeat)]
+        live = min(r[0] for r in results)
+        ready = min(r[1] for r in results)
+        print(f"{label:>14}: live {live * 1e3:7.1f} ms  ready {ready * 1e3:7.1f} ms  restored {results[0][2]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,55 @@
+# Fan-out throughput of the broadcast hub with many concurrent subscribers on one event loop.
+# Run from the server directory: python benchmarks/stream_fanout.py [--subscribers N] [--messages N] [--filtered]
+# --filtered gives every subscriber a one-agent filter, so each message matches only a few of them.
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming import BroadcastHub
+
+
+async def consume(subscriber, expected, received):
+    while received[0] < expected:
+        if await subscriber.get() is None:
+            return
+        received[0] += 1
+
+
+async def main(n_subscribers, n_messages, n_agents, filtered):
+    hub = BroadcastHub()
+    hub.bind(asyncio.get_running_loop())
+    received = [0]
+    if filtered:
+        subscribers = [hub.subscribe(topics=["alerts"], agents=[f"agent_{i % n_agents}"]) for i in range(n_subscribers)]
+        expected = [n_messages // n_agents + (i % n_agents < n_messages % n_agents) for i in range(n_subscribers)]
+    else:
+        subscribers = [hub.subscribe(topics=["alerts"]) for _ in range(n_subscribers)]
+        expected = [n_messages] * n_subscribers
+    consumers = [asyncio.create_task(consume(s, e, [0])) for s, e in zip(subscribers, expected)]
+    counter = asyncio.create_task(consume(hub.subscribe(topics=["alerts"]), n_messages, received))
+
+    start = time.perf_counter()
+    for i in range(n_messages):
+        hub.publish("alerts", {"type": "DDOS", "agent_id": f"agent_{i % n_agents}", "details": {"packets_per_sec": i}})
+        if i % 64 == 0:
+            await asyncio.sleep(0)  # let consumers drain, as the server would between requests
+    await asyncio.gather(counter, *consumers)
+    elapsed = time.perf_counter() - start
+    deliveries = sum(expected) + n_messages
+    print(f"{n_subscribers} {'filtered ' if filtered else ''}subscribers, {n_messages} messages: "
+          f"{deliveries / elapsed:,.0f} deliveries/sec, {n_messages / elapsed:,.0f} messages/sec, "
+          f"{hub.dropped} dropped subscribers")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--agents", type=int, default=100)
+    parser.add_argument("--filtered", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.subscribers, args.messages, args.agents, args.filtered))
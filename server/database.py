@@ -1,38 +1,356 @@
-from collections import defaultdict, deque
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+import heapq
+import os
+import threading
+import time
+from history_store import ColumnarHistory, Rollups, parse_timestamp
+from streaming import HUB
+from schemas import to_builtins
+from ai.rolling_stats import RollingStats
+from ai.baselines import BASELINES
+from sharding import shard_path
 
-METRICS = {}
-ALERTS = []
-ACTIONS = []
-PROFILES = {}
+STORAGE_BACKEND = os.environ.get("AEGIS_STORAGE", "memory")  # memory | sqlite | log
+DATA_DIR = shard_path(os.environ.get("AEGIS_DATA_DIR", "data"))
+# Age after which persistent backends drop stored alerts and actions (and the
+# indexes forget them); 0 keeps everything
+RETENTION_SECONDS = float(os.environ.get("AEGIS_RETENTION_SECONDS", 7 * 24 * 3600))
 
-HISTORICAL_METRICS = defaultdict(lambda: deque(maxlen=100))  # last 100 records per agent
+def open_backend(kind=STORAGE_BACKEND, data_dir=DATA_DIR, retention_seconds=RETENTION_SECONDS):
+    if kind == "memory":
+        from storage.memory import MemoryBackend
+        return MemoryBackend()
+    if kind == "sqlite":
+        from storage.sqlite import SQLiteBackend
+        return SQLiteBackend(os.path.join(data_dir, "aegis.db"), retention_seconds=retention_seconds or None)
+    if kind == "log":
+        from storage.segment_log import SegmentLogBackend
+        return SegmentLogBackend(os.path.join(data_dir, "log"), retention_seconds=retention_seconds or None)
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+STORE = open_backend()
+
+# Latest metrics and profiles are small (one entry per agent) and read on
+# every detection, so they stay cached in memory and are written through.
+METRICS = STORE.load("metrics")
+PROFILES = STORE.load("profiles")
+for _profile in PROFILES.values():
+    BASELINES.set_profile(_profile)
+
+HISTORY_LEN = 100
+HISTORICAL_METRICS = ColumnarHistory(maxlen=HISTORY_LEN)  # last 100 records per agent
+ROLLUPS = Rollups(HISTORICAL_METRICS)  # 1 min and 1 h buckets beyond that
+ROLLING_STATS = RollingStats(HISTORICAL_METRICS, windows=(5, 10, HISTORY_LEN))
+# Single records are written from the event loop and batches from the ingest
+# worker (executor.INGEST_POOL); writers take this lock, readers do not.
+HISTORY_LOCK = threading.Lock()
+
+PRUNE_BATCH = 4096  # index entries dropped at a time after storage retention
 
 def upsert_metrics(record):
     METRICS[record["agent_id"]] = record
+    STORE.put("metrics", record["agent_id"], to_builtins(record))
+    HUB.publish("metrics", record)
 
 def list_metrics():
     return list(METRICS.values())
 
+class LogIndex:
+    # Secondary indexes over an append-only log (alerts, actions). Records get
+    # increasing ids; per-type, per-agent and per-time-bucket id lists plus
+    # compact per-id columns let filtered, cursor-paginated queries touch only
+    # candidate ids instead of the whole history. Storage retention reports
+    # the oldest id it kept through prune(); older entries are skipped at
+    # once and dropped from the indexes in batches.
+
+    def __init__(self, type_of, agent_of, bucket_seconds=60):
+        self.type_of = type_of
+        self.agent_of = agent_of
+        self.bucket_seconds = bucket_seconds
+        self.next_id = 1
+        self.floor = 1  # ids below this were deleted from storage
+        self.by_type = defaultdict(list)
+        self.by_agent = defaultdict(list)
+        self.by_bucket = {}
+        self.bucket_keys = []  # sorted
+        self._codes = {}
+        self.ids = array("q")
+        self.type_codes = array("l")
+        self.agent_codes = array("l")
+        self.times = array("d")
+        self._lock = threading.Lock()
+
+    def _code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._codes)
+        return code
+
+    def add(self, record, store=None):
+        # Ids are always ours: a client-supplied "id" is overwritten. `store`
+        # (id, record) runs under the same lock so the log is written in id order.
+        with self._lock:
+            record["id"] = self.next_id
+            record_id = self._add(record)
+            if store is not None:
+                store(record_id, record)
+            self._compact()
+            return record_id
+
+    def load(self, record):
+        # Records read back from the store keep the ids they were stored under.
+        # Ones stored before timestamps were validated are placed after the previous record.
+        with self._lock:
+            try:
+                return self._add(record)
+            except ValueError:
+                return self._add(record, self.times[-1] if self.times else 0.0)
+
+    def _add(self, record, ts=None):
+        record.setdefault("timestamp", time.time())
+        record_id = record["id"]
+        if ts is None:
+            ts = parse_timestamp(record["timestamp"])
+        self.next_id = max(self.next_id, record_id + 1)
+        kind, agent = self.type_of(record), self.agent_of(record)
+        self.ids.append(record_id)
+        self.type_codes.append(self._code(("type", kind)))
+        self.agent_codes.append(self._code(("agent", agent)))
+        self.times.append(ts)
+        self.by_type[kind].append(record_id)
+        self.by_agent[agent].append(record_id)
+        bucket = int(ts // self.bucket_seconds)
+        ids = self.by_bucket.get(bucket)
+        if ids is None:
+            ids = self.by_bucket[bucket] = []
+            insort(self.bucket_keys, bucket)
+        ids.append(record_id)
+        return record_id
+
+    def prune(self, first_kept):
+        # Called by storage retention, usually from inside log_alert/log_action
+        # (which hold our lock), so it only moves the floor; add() compacts.
+        if first_kept > self.floor:
+            self.floor = first_kept
+
+    def _compact(self):
+        cut = bisect_left(self.ids, self.floor)
+        if cut < max(PRUNE_BATCH, len(self.ids) // 8):
+            return
+        del self.ids[:cut], self.type_codes[:cut], self.agent_codes[:cut], self.times[:cut]
+        for index in (self.by_type, self.by_agent, self.by_bucket):
+            for key, ids in list(index.items()):
+                n = bisect_left(ids, self.floor)
+                if n == len(ids):
+                    del index[key]
+                elif n:
+                    del ids[:n]
+        self.bucket_keys = sorted(self.by_bucket)
+
+    @staticmethod
+    def _below(ids, cursor, start=0, stop=None):
+        # ids[start:stop] under `cursor`, newest first
+        end = len(ids) if stop is None else stop
+        if cursor is not None:
+            end = min(end, bisect_left(ids, cursor))
+        return (ids[i] for i in range(end - 1, start - 1, -1))
+
+    def _time_range(self, since, until, cursor):
+        # (size, ids newest first) over the buckets overlapping [since, until]
+        keys = self.bucket_keys
+        lo = 0 if since is None else bisect_left(keys, since // self.bucket_seconds)
+        hi = len(keys) if until is None else bisect_right(keys, until // self.bucket_seconds)
+        lists = [self.by_bucket[key] for key in keys[lo:hi]]
+        size = sum(len(ids) for ids in lists)
+        if not lists:
+            return 0, lambda: iter(())
+        # Ids mostly follow time, so the matches usually fill an id interval:
+        # scan it in id order when it is at least half matches, else merge
+        start = bisect_left(self.ids, min(ids[0] for ids in lists))
+        stop = bisect_right(self.ids, max(ids[-1] for ids in lists))
+        if 2 * size >= stop - start:
+            return size, lambda: self._below(self.ids, cursor, start, stop)
+        return size, lambda: heapq.merge(*(self._below(ids, cursor) for ids in lists), reverse=True)
+
+    def query(self, type=None, agent_id=None, since=None, until=None, cursor=None, limit=100):
+        # Newest first. Returns (ids, next_cursor); pass next_cursor back to continue.
+        type_code = self._codes.get(("type", type))
+        agent_code = self._codes.get(("agent", agent_id))
+        if (type is not None and type_code is None) or (agent_id is not None and agent_code is None):
+            return [], None
+
+        with self._lock:
+            # The smallest candidate set drives the scan; it is read lazily,
+            # so a page costs about `limit` candidates past the cursor
+            candidates = []
+            if type is not None:
+                ids = self.by_type.get(type, [])
+                candidates.append((len(ids), lambda ids=ids: self._below(ids, cursor)))
+            if agent_id is not None:
+                ids = self.by_agent.get(agent_id, [])
+                candidates.append((len(ids), lambda ids=ids: self._below(ids, cursor)))
+            if since is not None or until is not None:
+                candidates.append(self._time_range(since, until, cursor))
+            if candidates:
+                driver = min(candidates, key=lambda c: c[0])[1]()
+            else:
+                driver = self._below(self.ids, cursor)
+            out = []
+            for record_id in driver:
+                if record_id < self.floor:
+                    break
+                if len(out) == limit:
+                    return out, out[-1]
+                pos = bisect_left(self.ids, record_id)
+                if type is not None and self.type_codes[pos] != type_code:
+                    continue
+                if agent_id is not None and self.agent_codes[pos] != agent_code:
+                    continue
+                if since is not None and self.times[pos] < since:
+                    continue
+                if until is not None and self.times[pos] > until:
+                    continue
+                out.append(record_id)
+            return out, None
+
+    def clear(self):
+        self.__init__(self.type_of, self.agent_of, self.bucket_seconds)
+
+
+def _alert_type(alert):
+    return alert.get("type")
+
+def _alert_agent(alert):
+    return alert.get("agent_id") or alert.get("details", {}).get("agent_id")
+
+def _action_type(action):
+    return action.get("action") or action.get("type")
+
+def _action_agent(action):
+    return action.get("target") or action.get("agent_id")
+
+ALERT_INDEX = LogIndex(_alert_type, _alert_agent)
+ACTION_INDEX = LogIndex(_action_type, _action_agent)
+
+LOG_INDEXES = {"alerts": ALERT_INDEX, "actions": ACTION_INDEX}
+
+for _table, _index in LOG_INDEXES.items():
+    for _record in STORE.scan(_table):
+        _index.load(_record)
+
+def _pruned(table, first_kept):
+    index = LOG_INDEXES.get(table)
+    if index is not None:
+        index.prune(first_kept)
+
+STORE.on_prune = _pruned  # retention deleted every record below first_kept
+
+# Called with every logged alert, e.g. to queue remediation
+ALERT_LISTENERS = []
+
+def _store(table):
+    return lambda record_id, record: STORE.append(table, record_id, record)
+
+_store_alert = _store("alerts")
+_store_action = _store("actions")
+
 def log_alert(alert):
-    ALERTS.append(alert)
+    ALERT_INDEX.add(alert, _store_alert)
+    HUB.publish("alerts", alert)
+    for listener in ALERT_LISTENERS:
+        listener(alert)
 
 def list_alerts():
-    return ALERTS
+    return list(STORE.scan("alerts"))
+
+def query_alerts(type=None, agent_id=None, since=None, until=None, cursor=None, limit=100):
+    ids, next_cursor = ALERT_INDEX.query(type, agent_id, since, until, cursor, limit)
+    return STORE.get("alerts", ids), next_cursor
+
+def count_alerts():
+    return STORE.count("alerts")
 
 def log_action(action):
-    ACTIONS.append(action)
+    ACTION_INDEX.add(action, _store_action)
 
 def list_actions():
-    return ACTIONS
+    return list(STORE.scan("actions"))
+
+def query_actions(type=None, agent_id=None, since=None, until=None, cursor=None, limit=100):
+    ids, next_cursor = ACTION_INDEX.query(type, agent_id, since, until, cursor, limit)
+    return STORE.get("actions", ids), next_cursor
+
+def count_actions():
+    return STORE.count("actions")
 
 def upsert_profile(profile):
     PROFILES[profile["agent_id"]] = profile
+    STORE.put("profiles", profile["agent_id"], profile)
+    BASELINES.set_profile(profile)
 
 def list_profiles():
     return list(PROFILES.values())
 
 def add_historical_metric(record):
-    HISTORICAL_METRICS[record["agent_id"]].append(record)
+    with HISTORY_LOCK:
+        # Rolling stats first: they read the samples this append overwrites
+        ROLLING_STATS.update(record, HISTORICAL_METRICS.slot(record["agent_id"]))
+        ROLLUPS.observe(HISTORICAL_METRICS.append(record))
+        BASELINES.observe(record, ROLLING_STATS)
 
 def get_historical_metrics(agent_id):
-    return list(HISTORICAL_METRICS[agent_id]) 
\ No newline at end of file
+    # Oldest first, rebuilt from the columns: see ColumnarHistory.records
+    # for which keys survive. Detectors should use get_history_window.
+    return HISTORICAL_METRICS.records(agent_id)
+
+def get_history_window(agent_id, field, n=None):
+    return HISTORICAL_METRICS.window(agent_id, field, n)
+
+def query_history(agent_id, field, since, until, resolution=None):
+    # Folding pending samples writes to the open buckets, so this takes the lock
+    with HISTORY_LOCK:
+        return ROLLUPS.query(agent_id, field, since, until, resolution)
+
+def get_rolling_stats(agent_id, series):
+    return ROLLING_STATS.get(agent_id, series)
+
+def add_historical_metrics(records, each=None):
+    # each(record), if given, runs right after that record is appended, while
+    # history and rolling stats look as they would after add_historical_metric
+    by_agent = defaultdict(list)
+    for record in records:
+        by_agent[record["agent_id"]].append(record)
+    with HISTORY_LOCK:
+        for agent_records in by_agent.values():
+            slot = HISTORICAL_METRICS.slot(agent_records[0]["agent_id"])
+            for record in agent_records:
+                ROLLING_STATS.update(record, slot)
+                ROLLUPS.observe(HISTORICAL_METRICS.append(record))
+                if each is not None:
+                    each(record)
+            BASELINES.observe_many(agent_records, ROLLING_STATS)
+    return by_agent
+
+def upsert_metrics_bulk(records):
+    latest = {record["agent_id"]: record for record in records}
+    METRICS.update(latest)
+    for agent_id, record in latest.items():
+        STORE.put("metrics", agent_id, to_builtins(record))
+    HUB.publish_many("metrics", records)
+
+def reset():
+    STORE.clear()
+    ALERT_INDEX.clear()
+    ACTION_INDEX.clear()
+    METRICS.clear()
+    PROFILES.clear()
+    with HISTORY_LOCK:
+        HISTORICAL_METRICS.clear()
+        ROLLUPS.clear()
+        ROLLING_STATS.clear()
+    BASELINES.clear()
+
+def close():
+    STORE.close()
@@ -0,0 +1,103 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+# Where work runs:
+#   light  - index lookups, single-record detection: inline on the event loop
+#   ingest - batch ingest + vectorized detection: one worker thread, so writes
+#            to the in-memory stores stay serialized but the loop stays free
+#   cpu    - model fits and other pure functions of their arguments: a
+#            process pool, so they do not hold the GIL against the loop
+# Both pools are bounded; when full, submit() raises Saturated and the API
+# answers 503 with Retry-After instead of queueing without limit.
+CPU_WORKERS = int(os.environ.get("AEGIS_CPU_WORKERS", min(4, os.cpu_count() or 1)))
+CPU_MAX_PENDING = int(os.environ.get("AEGIS_CPU_MAX_PENDING", 64))
+INGEST_MAX_PENDING = int(os.environ.get("AEGIS_INGEST_MAX_PENDING", 32))
+USE_PROCESSES = os.environ.get("AEGIS_FIT_PROCESSES", "1") != "0"
+RETRY_AFTER = 1  # seconds
+# Imported once in the fork server, so new pool workers start warm
+FORKSERVER_PRELOAD = ["ai.model_registry", "sklearn.ensemble"]
+
+
+class Saturated(Exception):
+    def __init__(self, pool, retry_after=RETRY_AFTER):
+        super().__init__(f"{pool} pool is saturated")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    def __init__(self, name, make_executor, max_pending):
+        self.name = name
+        self.make_executor = make_executor
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.counters = {"submitted": 0, "completed": 0, "rejected": 0, "failed": 0}
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.counters["rejected"] += 1
+                raise Saturated(self.name)
+            if self._executor is None:
+                self._executor = self.make_executor()
+            self._pending += 1
+            self.counters["submitted"] += 1
+        try:
+            try:
+                future = self._executor.submit(fn, *args)
+            except BrokenExecutor:
+                # A worker died (OOM, crash): replace the pool once and retry
+                with self._lock:
+                    self._executor = self.make_executor()
+                future = self._executor.submit(fn, *args)
+        except Exception:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future is not None and not future.cancelled() and future.exception() is None:
+                self.counters["completed"] += 1
+            else:
+                self.counters["failed"] += 1
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["pending"] = self._pending
+        stats["max_pending"] = self.max_pending
+        return stats
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _process_pool():
+    # forkserver: children never inherit the server's threads or locks
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=context)
+
+
+def _thread_pool(name, workers):
+    return lambda: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+
+
+CPU_POOL = BoundedExecutor("cpu", _process_pool if USE_PROCESSES else _thread_pool("cpu", CPU_WORKERS), CPU_MAX_PENDING)
+INGEST_POOL = BoundedExecutor("ingest", _thread_pool("ingest", 1), INGEST_MAX_PENDING)
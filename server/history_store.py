@@ -0,0 +1,516 @@
+import os
+import time
+from datetime import datetime, timezone
+from startup import lazy_import
+
+np = lazy_import("numpy", globals(), "np")
+
+# Columns kept per agent; nested record keys are addressed with dots.
+FIELDS = ("cpu", "memory", "net_io.sent", "net_io.recv", "packets_per_sec", "timestamp")
+_DTYPES = {"timestamp": "float64"}
+
+
+_PATHS = {}
+
+
+def field_value(record, path):
+    # Works on dict records and on schemas.MetricRecord structs
+    keys = _PATHS.get(path)
+    if keys is None:
+        keys = _PATHS[path] = tuple(path.split("."))
+    value = record
+    for key in keys:
+        if isinstance(value, dict):
+            value = value.get(key)
+        else:
+            value = getattr(value, key, None)
+        if value is None:
+            return None
+    return value
+
+
+def parse_timestamp(value):
+    # Epoch seconds or ISO 8601; naive ISO strings are UTC. Raises ValueError
+    # for anything else (schemas.read_body turns that into a 422).
+    if value is None:
+        return time.time()
+    if isinstance(value, str):
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return float(value)
+
+
+class ColumnarHistory:
+    # One preallocated ring per field and agent. Every value is written twice
+    # (at pos and pos + maxlen) so the last n samples are always one contiguous
+    # slice and windows can be returned as views without copying.
+    # Views are only valid until the next write to the store.
+
+    def __init__(self, maxlen=100, initial_slots=64, fields=FIELDS):
+        self.maxlen = maxlen
+        self.fields = tuple(fields)
+        self.slots = {}
+        self._agent_ids = []
+        self._capacity = 0
+        self._initial_slots = initial_slots
+        self._columns = {}
+        self._pos = self._count = None  # allocated with the first agent
+
+    def _grow(self, capacity):
+        width = 2 * self.maxlen
+        for field in self.fields:
+            column = np.full((capacity, width), np.nan, dtype=_DTYPES.get(field, "float32"))
+            if field in self._columns:
+                column[:self._capacity] = self._columns[field]
+            self._columns[field] = column
+        extra = np.zeros(capacity - self._capacity, dtype=np.int64)
+        self._pos = extra if self._pos is None else np.concatenate([self._pos, extra])
+        self._count = extra.copy() if self._count is None else np.concatenate([self._count, extra])
+        self._capacity = capacity
+
+    def slot(self, agent_id):
+        slot = self.slots.get(agent_id)
+        if slot is None:
+            slot = len(self._agent_ids)
+            if slot == self._capacity:
+                self._grow(max(self._capacity * 2, self._initial_slots))
+            self.slots[agent_id] = slot
+            self._agent_ids.append(agent_id)
+        return slot
+
+    def append(self, record):
+        slot = self.slot(record["agent_id"])
+        pos = self._pos[slot]
+        for field in self.fields:
+            if field == "timestamp":
+                value = parse_timestamp(record.get("timestamp"))
+            else:
+                value = field_value(record, field)
+                value = np.nan if value is None else value
+            column = self._columns[field]
+            column[slot, pos] = value
+            column[slot, pos + self.maxlen] = value
+        self._pos[slot] = (pos + 1) % self.maxlen
+        self._count[slot] += 1
+        return slot
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __contains__(self, agent_id):
+        return agent_id in self.slots
+
+    def __len__(self):
+        return len(self._agent_ids)
+
+    def agents(self):
+        return list(self._agent_ids)
+
+    def length(self, agent_id):
+        slot = self.slots.get(agent_id)
+        if slot is None:
+            return 0
+        return int(min(self._count[slot], self.maxlen))
+
+    def window(self, agent_id, field, n=None):
+        # Zero-copy view of the last n samples (oldest first).
+        length = self.length(agent_id)
+        n = length if n is None else min(n, length)
+        if n == 0:
+            return np.empty(0, dtype=_DTYPES.get(field, "float32"))
+        slot = self.slots[agent_id]
+        end = self._pos[slot] + self.maxlen
+        return self._columns[field][slot, end - n:end]
+
+    def latest(self, slot, field):
+        return self._columns[field][slot, self._pos[slot] + self.maxlen - 1]
+
+    def tail(self, slot, field, n, skip=0):
+        # View of n samples ending `skip` samples before the newest
+        end = self._pos[slot] + self.maxlen - skip
+        return self._columns[field][slot, end - n:end]
+
+    def evicting(self, slot, fields, windows):
+        # {field: per window size, the sample the next append pushes out of
+        # that trailing window (NaN if the window is not full yet)}
+        end = int(self._pos[slot]) + self.maxlen
+        offsets = [end - window for window in windows]
+        out = {}
+        for field in fields:
+            item = self._columns[field].item
+            out[field] = [item(slot, i) for i in offsets]
+        return out
+
+    def slots_of(self, agent_ids):
+        return np.array([self.slots[a] for a in agent_ids], dtype=np.int64)
+
+    def lengths(self, slots):
+        return np.minimum(self._count[slots], self.maxlen)
+
+    def matrix(self, agent_ids, field, n, slots=None):
+        # (len(agent_ids) x n) copy of the last n samples of each agent, gathered
+        # in one fancy-indexing pass. Agents with fewer than n samples get NaN.
+        if slots is None:
+            slots = self.slots_of(agent_ids)
+        ends = self._pos[slots] + self.maxlen
+        cols = ends[:, None] - n + np.arange(n)
+        out = self._columns[field][slots[:, None], cols].astype(np.float64)
+        short = np.minimum(self._count[slots], self.maxlen) < n
+        if short.any():
+            missing = np.arange(n)[None, :] < (n - np.minimum(self._count[slots], self.maxlen))[:, None]
+            out[missing] = np.nan
+        return out
+
+    def records(self, agent_id):
+        # Rebuilds dict records for callers of the old deque-based API. Only
+        # the stored fields come back: agent_id, the FIELDS that were present
+        # (net_io as a nested dict) and timestamp as epoch seconds. Other keys
+        # (per_process, peers, ...) are not kept. float32 columns are read
+        # back at their shortest decimal, so 23.1 is not 23.100000381.
+        length = self.length(agent_id)
+        if length == 0:
+            return []
+        columns = {}
+        for field in self.fields:
+            window = self.window(agent_id, field)
+            if window.dtype == np.float32:
+                window = window.astype(str).astype(np.float64)
+            columns[field] = window.tolist()
+        out = []
+        for i in range(length):
+            record = {"agent_id": agent_id}
+            for field in self.fields:
+                value = columns[field][i]
+                if value != value:  # NaN: field missing in the original record
+                    continue
+                head, _, tail = field.partition(".")
+                if tail:
+                    record.setdefault(head, {})[tail] = value
+                else:
+                    record[field] = value
+            out.append(record)
+        return out
+
+    def clear(self):
+        self.slots.clear()
+        self._agent_ids.clear()
+        for column in self._columns.values():
+            column.fill(np.nan)
+        if self._pos is not None:
+            self._pos.fill(0)
+            self._count.fill(0)
+
+    @property
+    def nbytes(self):
+        if self._pos is None:
+            return 0
+        return sum(c.nbytes for c in self._columns.values()) + self._pos.nbytes + self._count.nbytes
+
+
+# Rollup tiers above the raw history: (seconds per bucket, buckets kept),
+# finest first, each a multiple of the one before. The default keeps 6 hours
+# of 1-minute and 7 days of 1-hour buckets.
+TIERS = tuple(tuple(int(x) for x in tier.split(":"))
+              for tier in os.environ.get("AEGIS_ROLLUP_TIERS", "60:360,3600:168").split(","))
+STATS = ("min", "max", "mean", "count", "p95")
+MAX_POINTS = 500  # default resolution: the range in at most this many points
+# p95 sketch for the open buckets of coarser tiers: a mergeable log-spaced
+# histogram, bin i holding values in (LOW * GAMMA**(i-1), LOW * GAMMA**i],
+# read back by interpolating within the bin. The estimate is off by at most
+# GAMMA - 1 (2%) relative, for values from LOW up to ~1e9; measured worst
+# cases on 60-sample minutes were 2.0% (uniform, normal, lognormal). Counts
+# are uint16, halved together when one would overflow. The finest tier
+# takes p95 exactly from the raw samples instead (see Rollups).
+SKETCH_BINS = 1280
+SKETCH_GAMMA = 1.02
+SKETCH_LOW = 0.01
+SKETCH_MAX = 65535  # uint16
+
+
+def _sketch_bins(values):
+    scaled = np.log(np.maximum(values, SKETCH_LOW) * (1 / SKETCH_LOW)) * (1 / np.log(SKETCH_GAMMA))
+    return np.minimum(np.ceil(scaled), SKETCH_BINS - 1).astype(np.int64)
+
+
+def _sketch(m):
+    # (fields x n) samples, NaN where missing -> (fields x bins) counts
+    valid = ~np.isnan(m)
+    bins = (np.arange(len(m))[:, None] * SKETCH_BINS + _sketch_bins(np.where(valid, m, 0.0)))[valid]
+    return np.bincount(bins, minlength=len(m) * SKETCH_BINS).reshape(len(m), SKETCH_BINS)
+
+
+def _sketch_quantile(hist, q):
+    # hist: (fields x bins) counts
+    cumulative = np.cumsum(hist, axis=1)
+    rank = np.maximum(q * cumulative[:, -1], 1)
+    i = np.minimum((cumulative < rank[:, None]).sum(axis=1), SKETCH_BINS - 1)
+    rows = np.arange(len(hist))
+    in_bin = np.maximum(hist[rows, i], 1)
+    fraction = np.clip((rank - (cumulative[rows, i] - hist[rows, i])) / in_bin, 0, 1)
+    return np.where(i > 0, SKETCH_LOW * SKETCH_GAMMA ** (i - 1 + fraction), 0.0)
+
+
+def _exact_quantile(m, q):
+    # (fields x n) samples, NaN where missing: the inverted-CDF quantile of each row
+    counts = (~np.isnan(m)).sum(axis=1)
+    if m.shape[1] == 0:
+        return np.full(len(m), np.nan)
+    i = np.clip(np.ceil(q * counts).astype(np.int64) - 1, 0, m.shape[1] - 1)
+    return np.where(counts > 0, np.sort(m, axis=1)[np.arange(len(m)), i], np.nan)
+
+
+class RollupTier:
+    # Per agent slot: a ring of closed buckets (buckets x fields x STATS) and
+    # the open bucket's running min/max/sum/count, plus its p95 sketch if
+    # `sketch` is set.
+    def __init__(self, seconds, buckets, n_fields, sketch=True):
+        self.seconds = seconds
+        self.buckets = buckets
+        self.n_fields = n_fields
+        self.sketch = sketch
+        self.capacity = 0
+        self.stats = self.starts = self.pos = None
+        self.open_start = self.open_min = self.open_max = self.open_sum = self.open_count = self.hist = None
+
+    def _extend(self, old, capacity, shape, fill, dtype):
+        new = np.full((capacity,) + shape, fill, dtype=dtype)
+        if old is not None:
+            new[:self.capacity] = old
+        return new
+
+    def grow(self, capacity):
+        f = self.n_fields
+        self.stats = self._extend(self.stats, capacity, (self.buckets, f, len(STATS)), np.nan, "float32")
+        self.starts = self._extend(self.starts, capacity, (self.buckets,), np.nan, "float64")
+        self.pos = self._extend(self.pos, capacity, (), 0, "int64")
+        self.open_start = self._extend(self.open_start, capacity, (), np.nan, "float64")
+        self.open_min = self._extend(self.open_min, capacity, (f,), np.inf, "float64")
+        self.open_max = self._extend(self.open_max, capacity, (f,), -np.inf, "float64")
+        self.open_sum = self._extend(self.open_sum, capacity, (f,), 0.0, "float64")
+        self.open_count = self._extend(self.open_count, capacity, (f,), 0, "int64")
+        if self.sketch:
+            self.hist = self._extend(self.hist, capacity, (f, SKETCH_BINS), 0, "uint16")
+        self.capacity = capacity
+
+    def add(self, slot, mins, maxs, sums, counts):
+        np.fmin(self.open_min[slot], mins, out=self.open_min[slot])
+        np.fmax(self.open_max[slot], maxs, out=self.open_max[slot])
+        self.open_sum[slot] += sums
+        self.open_count[slot] += counts
+
+    def add_sketch(self, slot, hist):
+        merged = self.hist[slot] + hist
+        while merged.max() > SKETCH_MAX:
+            merged >>= 1  # the quantile only reads the shape
+        self.hist[slot] = merged
+
+    def open_state(self, slot):
+        return self.open_min[slot], self.open_max[slot], self.open_sum[slot], self.open_count[slot]
+
+    def summary(self, slot, finer=(), p95=None):
+        # (fields x STATS) for the open bucket, plus the open buckets of
+        # `finer` tiers, which have not been rolled into this one yet. p95
+        # comes from the sketch unless given.
+        mins, maxs, sums, counts = (a.copy() for a in self.open_state(slot))
+        for tier in finer:
+            f_min, f_max, f_sum, f_count = tier.open_state(slot)
+            np.fmin(mins, f_min, out=mins)
+            np.fmax(maxs, f_max, out=maxs)
+            sums += f_sum
+            counts += f_count
+        if p95 is None:
+            p95 = _sketch_quantile(self.hist[slot], 0.95)
+        has = counts > 0
+        out = np.full((self.n_fields, len(STATS)), np.nan)
+        out[:, 3] = counts
+        out[has, 0] = mins[has]
+        out[has, 1] = maxs[has]
+        out[has, 2] = sums[has] / counts[has]
+        out[has, 4] = np.clip(p95, mins, maxs)[has]
+        return out
+
+    def roll(self, slot, timestamp, coarser=None, p95=None):
+        # Opens the bucket holding `timestamp`, closing the current one first
+        # (and adding it to the `coarser` tier) if the timestamp is past it.
+        # Late samples stay in the open bucket. Returns True if it closed one.
+        start = timestamp - timestamp % self.seconds
+        current = self.open_start[slot]
+        if current == current and start <= current:
+            return False
+        closed = current == current
+        if closed:
+            pos = self.pos[slot]
+            self.stats[slot, pos] = self.summary(slot, p95=p95() if p95 is not None else None)
+            self.starts[slot, pos] = current
+            self.pos[slot] = (pos + 1) % self.buckets
+            if coarser is not None:
+                coarser.add(slot, *self.open_state(slot))
+            self.open_min[slot] = np.inf
+            self.open_max[slot] = -np.inf
+            self.open_sum[slot] = 0.0
+            self.open_count[slot] = 0
+            if self.sketch:
+                self.hist[slot] = 0
+        self.open_start[slot] = start
+        return closed
+
+    def series(self, slot, field_index, finer=(), p95=None):
+        # Closed buckets oldest first, then the open one
+        order = (self.pos[slot] + np.arange(self.buckets)) % self.buckets
+        starts = self.starts[slot, order]
+        stats = self.stats[slot, order, field_index].astype(np.float64)
+        if self.open_start[slot] == self.open_start[slot]:
+            starts = np.append(starts, self.open_start[slot])
+            stats = np.vstack([stats, self.summary(slot, finer, p95)[field_index]])
+        keep = ~np.isnan(starts)
+        return starts[keep], stats[keep]
+
+    @property
+    def nbytes(self):
+        if self.stats is None:
+            return 0
+        arrays = (self.stats, self.starts, self.pos, self.open_start, self.open_min, self.open_max,
+                  self.open_sum, self.open_count, self.hist)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+
+class Rollups:
+    # Multi-resolution history on top of a ColumnarHistory (the 1 s tier),
+    # with constant memory per agent. Samples are not aggregated one by one:
+    # observe() only counts them, and the raw samples are folded into the
+    # finest tier in one vectorized step when its bucket ends or before the
+    # raw ring would overwrite them. Closed buckets cascade into the next tier.
+    # The finest tier's p95 is read from the raw samples of its bucket; only
+    # a bucket longer than the ring spills them into a sketch first.
+    def __init__(self, history, tiers=TIERS):
+        self.history = history
+        self.fields = tuple(f for f in history.fields if f != "timestamp")
+        self.tiers = [RollupTier(seconds, buckets, len(self.fields), sketch=i > 0)
+                      for i, (seconds, buckets) in enumerate(tiers)]
+        # Snapshots only restore into the same one
+        self.layout = (tuple(map(tuple, tiers)), self.fields, SKETCH_BINS, SKETCH_GAMMA, "uint16")
+        self._pending = []   # per slot: newest raw samples not folded in yet
+        self._boundary = []  # per slot: when the open finest bucket ends
+        self._unspilled = [] # per slot: samples of the open finest bucket still only in the ring
+        self._spill = {}     # slot: sketch of the open finest bucket's older samples
+
+    def __getstate__(self):
+        # Pickled next to the history it reads from, never with it
+        state = dict(self.__dict__)
+        state.pop("history", None)
+        return state
+
+    def _grow(self):
+        capacity = self.history._capacity
+        for tier in self.tiers:
+            tier.grow(capacity)
+        extra = capacity - len(self._pending)
+        self._pending.extend([0] * extra)
+        self._boundary.extend([-np.inf] * extra)
+        self._unspilled.extend([0] * extra)
+
+    def observe(self, slot):
+        # Call after history.append() for the same agent
+        if slot >= len(self._pending):
+            self._grow()
+        pending = self._pending[slot]
+        timestamp = float(self.history.latest(slot, "timestamp"))
+        if timestamp >= self._boundary[slot]:
+            self._fold(slot, pending, skip=1)
+            for i, tier in enumerate(self.tiers):
+                coarser = self.tiers[i + 1] if i + 1 < len(self.tiers) else None
+                p95 = (lambda: self._open_p95(slot, skip=1)) if i == 0 else None
+                if not tier.roll(slot, timestamp, coarser, p95) and i > 0:
+                    break  # coarser buckets end on finer bucket boundaries
+            self._boundary[slot] = self.tiers[0].open_start[slot] + self.tiers[0].seconds
+            self._pending[slot] = 1
+            self._unspilled[slot] = 1
+            self._spill.pop(slot, None)
+        elif self._unspilled[slot] + 1 == self.history.maxlen:
+            self._fold(slot, pending + 1)
+            spill = self._spill.get(slot, 0) + _sketch(self._raw(slot, self.history.maxlen))
+            self._spill[slot] = spill.astype(np.uint32)
+            self._pending[slot] = 0
+            self._unspilled[slot] = 0
+        else:
+            self._pending[slot] = pending + 1
+            self._unspilled[slot] += 1
+
+    def _raw(self, slot, n, skip=0):
+        return np.stack([self.history.tail(slot, field, n, skip) for field in self.fields]).astype(np.float64)
+
+    def _fold(self, slot, n, skip=0):
+        if n <= 0:
+            return
+        m = self._raw(slot, n, skip)
+        valid = ~np.isnan(m)
+        self.tiers[0].add(slot, np.fmin.reduce(m, axis=1), np.fmax.reduce(m, axis=1),
+                          np.where(valid, m, 0.0).sum(axis=1), valid.sum(axis=1))
+        if len(self.tiers) > 1:
+            hist = _sketch(m)
+            for tier in self.tiers[1:]:
+                tier.add_sketch(slot, hist)
+
+    def _open_p95(self, slot, skip=0):
+        # p95 of the open finest bucket, whose samples are the last
+        # `_unspilled` in the ring (`skip` newer ones aside) plus the spill
+        m = self._raw(slot, self._unspilled[slot], skip)
+        spill = self._spill.get(slot)
+        if spill is None:
+            return _exact_quantile(m, 0.95)
+        return _sketch_quantile(spill + _sketch(m), 0.95)
+
+    def flush(self, slot):
+        if slot >= len(self._pending):
+            self._grow()  # agent known to the history but not rolled up since a clear
+        if self._pending[slot]:
+            self._fold(slot, self._pending[slot])
+            self._pending[slot] = 0
+
+    def pick_tier(self, since, until, resolution=None):
+        # Coarsest tier at or under `resolution` seconds per point that still
+        # reaches back to `since`; index 0 is the raw history
+        resolution = resolution or max(1.0, (until - since) / MAX_POINTS)
+        tiers = [(1, self.history.maxlen)] + [(t.seconds, t.buckets) for t in self.tiers]
+        covering = [i for i, (seconds, buckets) in enumerate(tiers) if until - seconds * buckets <= since]
+        fitting = [i for i in covering if tiers[i][0] <= resolution]
+        if fitting:
+            return fitting[-1]
+        return covering[0] if covering else len(tiers) - 1
+
+    def query(self, agent_id, field, since, until, resolution=None):
+        index = self.pick_tier(since, until, resolution)
+        seconds = 1 if index == 0 else self.tiers[index - 1].seconds
+        out = {"agent_id": agent_id, "field": field, "resolution": seconds, "timestamps": []}
+        out.update((stat, []) for stat in STATS)
+        slot = self.history.slots.get(agent_id)
+        if slot is None:
+            return out
+        if index == 0:
+            starts = self.history.window(agent_id, "timestamp").astype(np.float64)
+            values = self.history.window(agent_id, field).astype(np.float64)
+            stats = np.stack([values, values, values, np.where(np.isnan(values), 0.0, 1.0), values], axis=1)
+        else:
+            self.flush(slot)
+            p95 = self._open_p95(slot) if index == 1 else None
+            starts, stats = self.tiers[index - 1].series(slot, self.fields.index(field), self.tiers[:index - 1], p95)
+        keep = (starts > since - seconds) & (starts <= until)
+        out["timestamps"] = starts[keep].tolist()
+        for i, stat in enumerate(STATS):
+            out[stat] = [None if v != v else v for v in stats[keep, i].tolist()]
+        return out
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.__init__(tier.seconds, tier.buckets, tier.n_fields, tier.sketch)
+        self._pending.clear()
+        self._boundary.clear()
+        self._unspilled.clear()
+        self._spill.clear()
+
+    @property
+    def nbytes(self):
+        return sum(t.nbytes for t in self.tiers) + sum(h.nbytes for h in self._spill.values())
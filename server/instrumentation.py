@@ -0,0 +1,333 @@
+import asyncio
+import functools
+import inspect
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from ai.pipeline import LATENCY_BUCKETS
+
+# Counters, gauges and histograms for the hot paths, served at /metrics in the
+# Prometheus text format. Each thread writes to its own shard, so updates take
+# no lock; shards are summed when the endpoint is scraped.
+# AEGIS_INSTRUMENTATION=0 turns timing and counting into no-ops.
+ENABLED = os.environ.get("AEGIS_INSTRUMENTATION", "1") != "0"
+
+
+class _Shards:
+    # Base for metric children: one list of numbers per writing thread
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._all = []
+        self._shard_lock = threading.Lock()
+
+    def _new_shard(self):
+        shard = self._local.shard = [0] * self.size
+        with self._shard_lock:
+            self._all.append(shard)
+        return shard
+
+    def sum(self):
+        with self._shard_lock:
+            shards = list(self._all)
+        totals = [0] * self.size
+        for shard in shards:
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        # Unlabelled metrics are reported from the start and skip the label lookup
+        self._default = self.labels() if not self.labelnames else None
+
+    def labels(self, *values):
+        if not ENABLED and self.kind != "gauge":
+            return _NOOP
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _label_str(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _NoopChild:
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+_NOOP = _NoopChild()
+
+
+class _CounterChild(_Shards):
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        try:
+            self._local.shard[0] += amount
+        except AttributeError:
+            self._new_shard()[0] += amount
+
+    def value(self):
+        return self.sum()[0]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}_total{self._label_str(values)} {_fmt(child.value())}"]
+
+
+class _GaugeChild:
+    __slots__ = ("value_", "fn")
+
+    def __init__(self):
+        self.value_ = 0.0
+        self.fn = None
+
+    def set(self, value):
+        self.value_ = value
+
+    def set_function(self, fn):
+        # Evaluated at scrape time, e.g. lambda: len(queue)
+        self.fn = fn
+
+    def value(self):
+        return self.fn() if self.fn is not None else self.value_
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, fn):
+        self._default.set_function(fn)
+
+    def _render_child(self, values, child):
+        try:
+            value = child.value()
+        except Exception:
+            return []
+        return [f"{self.name}{self._label_str(values)} {_fmt(value)}"]
+
+
+class _HistogramChild(_Shards):
+    def __init__(self, buckets):
+        # bucket counts (the last one is +Inf), then count and sum
+        super().__init__(len(buckets) + 3)
+        self.buckets = buckets
+
+    def observe(self, value):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-2] += 1
+        shard[-1] += value
+
+    def snapshot(self):
+        totals = self.sum()
+        return totals[:len(self.buckets) + 1], totals[-2], totals[-1]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _render_child(self, values, child):
+        counts, count, total = child.snapshot()
+        return _histogram_lines(self, values, self.buckets, counts, count, total)
+
+
+def _histogram_lines(metric, values, buckets, counts, count, total):
+    lines = []
+    cumulative = 0
+    for bound, n in zip(buckets + (math.inf,), counts):
+        cumulative += n
+        le = "+Inf" if bound == math.inf else repr(bound)
+        lines.append(f"{metric.name}_bucket{metric._label_str(values, [('le', le)])} {cumulative}")
+    lines.append(f"{metric.name}_count{metric._label_str(values)} {count}")
+    lines.append(f"{metric.name}_sum{metric._label_str(values)} {_fmt(total)}")
+    return lines
+
+
+class DetectorHistograms(_Metric):
+    # Exposes the per-detector LatencyHistograms the pipeline already keeps,
+    # instead of timing every detector a second time.
+    kind = "histogram"
+
+    def __init__(self, name, help, pipeline):
+        super().__init__(name, help, ("detector",))
+        self.pipeline = pipeline
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for detector in list(self.pipeline.registry.detectors.values()):
+            h = detector.histogram
+            lines.extend(_histogram_lines(self, (detector.name,), h.buckets, list(h.counts), h.count, h.total))
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+RECORDS_INGESTED = REGISTRY.counter("aegis_records_ingested", "Metric records accepted for ingest")
+ALERTS_RAISED = REGISTRY.counter("aegis_alerts_raised", "Alerts returned by ingest requests")
+REQUEST_LATENCY = REGISTRY.histogram("aegis_request_seconds", "Handler latency by route", ("route",))
+FUNCTION_LATENCY = REGISTRY.histogram("aegis_function_seconds", "Latency of instrumented functions", ("function",))
+LOOP_LAG = REGISTRY.histogram("aegis_event_loop_lag_seconds", "Event loop scheduling delay")
+
+
+def timed(histogram, label=None):
+    # Records the wall time of each call in `histogram` (a labelled child is
+    # picked once, at decoration time). Works for plain and async functions and
+    # keeps the signature, so it can sit under FastAPI route decorators.
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+        observe = (histogram.labels(label or fn.__name__) if histogram.labelnames else histogram.labels()).observe
+        clock = time.perf_counter
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = clock()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    observe(clock() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(clock() - start)
+        return wrapper
+    return wrap
+
+
+def instrument_route(route):
+    return timed(REQUEST_LATENCY, route)
+
+
+def instrument(fn):
+    return timed(FUNCTION_LATENCY)(fn)
+
+
+class LoopLagMonitor:
+    # Sleeps for `interval` and records how late the loop woke it up
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.observe(max(0.0, time.perf_counter() - start - self.interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+LOOP_MONITOR = LoopLagMonitor()
@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+# Offline replay: streams recorded or synthetic metric series through the
+# detectors in-process (no HTTP, no sleeps) and scores the alerts against the
+# labels that come with the series. Time is virtual: it comes from the record
+# timestamps, so detection delay is measured in the series' own seconds.
+# Replay uses this process's in-memory state; run it as its own process:
+#
+#   python replay.py --logs "../client 2/logs"
+#   python replay.py --synthetic ddos --agents 100 --ddos-factor 2 2.5 3
+WINDOW_RE = re.compile(r"^window_(\d+)\.json$")
+# Alert types that count as detecting each synthetic attack
+SCORED_TYPES = {"ddos": ("DDOS",), "cpu_spike": ("PREDICTED_CPU_BOTTLENECK",), "rogue_agent": ("UNRECOGNIZED_AGENT",)}
+
+
+class VirtualClock:
+    # Set from record timestamps; records without one advance it by `step`
+    def __init__(self, start=0.0, step=1.0):
+        self.now = start
+        self.step = step
+
+    def stamp(self, record):
+        from history_store import parse_timestamp
+        timestamp = record.get("timestamp")
+        self.now = self.now + self.step if timestamp is None else parse_timestamp(timestamp)
+        record["timestamp"] = self.now
+        return self.now
+
+
+def window_log_series(directory, agent_id="replay_agent"):
+    # The client's DDoS window logs: one file per window of per-second
+    # samples, labelled per window by attack_detected
+    windows = sorted((int(m.group(1)), name) for name in os.listdir(directory) if (m := WINDOW_RE.match(name)))
+    for _, name in windows:
+        with open(os.path.join(directory, name)) as f:
+            window = json.load(f)
+        label = bool(window.get("attack_detected"))
+        for sample in window.get("metrics", []):
+            yield {"agent_id": agent_id, "timestamp": sample.get("timestamp"),
+                   "packets_per_sec": sample.get("packets", 0),
+                   "net_io": {"sent": 0, "recv": sample.get("bytes", 0)}}, label
+
+
+def synthetic_series(attack, agents=10, normal=60, attack_len=10, cycles=5):
+    # routers.simulation patterns: `normal` seconds of baseline traffic, then
+    # `attack_len` seconds of the attack, for every agent, `cycles` times
+    from routers.simulation import make_metric
+    second = 0.0
+    for _ in range(cycles):
+        for pattern, seconds, label in (("normal", normal, False), (attack, attack_len, True)):
+            for _ in range(seconds):
+                for a in range(agents):
+                    yield dict(make_metric(pattern, f"replay_{a}"), timestamp=second), label
+                second += 1
+
+
+class Score:
+    # Record-level confusion counts, plus per-episode detection delay: an
+    # episode is a run of consecutive attack-labelled records of one agent
+    def __init__(self):
+        self.counts = Counter()
+        self.delays = []
+        self.missed = 0
+        self._open = {}  # agent_id -> [start, detected]
+
+    def add(self, agent_id, now, label, alerted):
+        self.counts[("t" if label == alerted else "f") + ("p" if alerted else "n")] += 1
+        episode = self._open.get(agent_id)
+        if label and episode is None:
+            episode = self._open[agent_id] = [now, False]
+        elif not label and episode is not None:
+            self._close(agent_id)
+            episode = None
+        if episode is not None and alerted and not episode[1]:
+            episode[1] = True
+            self.delays.append(now - episode[0])
+
+    def _close(self, agent_id):
+        if not self._open.pop(agent_id)[1]:
+            self.missed += 1
+
+    def summary(self):
+        for agent_id in list(self._open):
+            self._close(agent_id)
+        tp, fp, fn = self.counts["tp"], self.counts["fp"], self.counts["fn"]
+        return {
+            "tp": tp, "fp": fp, "fn": fn, "tn": self.counts["tn"],
+            "precision": tp / (tp + fp) if tp + fp else 0.0,
+            "recall": tp / (tp + fn) if tp + fn else 0.0,
+            "episodes": len(self.delays) + self.missed,
+            "detected": len(self.delays),
+            "mean_delay_s": sum(self.delays) / len(self.delays) if self.delays else None,
+            "max_delay_s": max(self.delays) if self.delays else None,
+        }
+
+
+class Replay:
+    # detectors: registry names to run (default: the cheap, inline ones, since
+    # background model fits run on wall-clock time and would make replays
+    # non-deterministic). alert_types: alerts that count as a detection.
+    def __init__(self, detectors=None, alert_types=("DDOS",), enroll=True):
+        from ai.anomaly_detector import REGISTRY
+        from ai.pipeline import CHEAP
+        self.detectors = [d for d in REGISTRY.detectors.values()
+                          if (d.cost == CHEAP if detectors is None else d.name in detectors)]
+        self.alert_types = set(alert_types)
+        self.enroll = enroll
+
+    def run(self, series, clock=None):
+        import database
+        from ai.correlation import Correlator
+        clock = clock or VirtualClock()
+        # What would be stored: incident events on the replay's own clock
+        events = Counter()
+        correlator = Correlator(sink=lambda event: events.update((event["event"],)), clock=lambda: clock.now)
+        database.reset()
+        for detector in self.detectors:
+            detector.reset()
+        score = Score()
+        alerts_by_type = Counter()
+        seen = set()
+        records = 0
+        first = None
+        start = time.perf_counter()
+        for record, label in series:
+            now = clock.stamp(record)
+            first = now if first is None else first
+            agent_id = record["agent_id"]
+            if agent_id not in seen:
+                seen.add(agent_id)
+                if self.enroll and not label:
+                    # Agents first seen behaving normally are the enrolled fleet
+                    database.upsert_profile({"agent_id": agent_id})
+            database.add_historical_metric(record)
+            alerted = False
+            for detector in self.detectors:
+                alert = detector(record)
+                if alert:
+                    alerts_by_type[alert["type"]] += 1
+                    alerted = alerted or alert["type"] in self.alert_types
+                    correlator.submit(alert)
+            score.add(agent_id, now, label, alerted)
+            records += 1
+        seconds = time.perf_counter() - start
+        correlator.expire(float("inf"))
+        return {
+            "records": records,
+            "agents": len(seen),
+            "seconds": seconds,
+            "records_per_sec": records / seconds if seconds else 0.0,
+            "virtual_seconds": clock.now - first if first is not None else 0.0,
+            "score": score.summary(),
+            "alerts": dict(alerts_by_type),
+            "incident_events": dict(events),
+            "detectors": {d.name: {**d.histogram.snapshot(), "skipped": d.skipped, "alerts": d.alerts}
+                          for d in self.detectors},
+        }
+
+
+def _print(factor, report):
+    score = report["score"]
+    delay = score["mean_delay_s"]
+    print(f"ddos_factor {factor:g}: {report['records']} records, {report['agents']} agents, "
+          f"{report['records_per_sec']:,.0f} rec/s ({report['virtual_seconds']:,.0f} virtual s "
+          f"in {report['seconds']:.2f} s)")
+    print(f"  precision {score['precision']:.3f}  recall {score['recall']:.3f}  "
+          f"episodes {score['detected']}/{score['episodes']}  "
+          f"mean delay {'-' if delay is None else f'{delay:.1f} s'}  alerts {report['alerts']}")
+    print(f"  stored as incident events: {report['incident_events']}")
+    for name, stats in report["detectors"].items():
+        print(f"  {name:>18}: avg {stats['avg_us']:7.2f} us  p99 <= {stats['p99_us']:7.1f} us  "
+              f"skipped {stats['skipped']}  alerts {stats['alerts']}")
+
+
+def main(args):
+    import ai.anomaly_detector as anomaly_detector
+    replay = Replay(args.detectors, args.alert_types or SCORED_TYPES.get(args.synthetic, ("DDOS",)))
+    reports = {}
+    for factor in args.ddos_factor or [anomaly_detector.DDOS_FACTOR]:
+        anomaly_detector.DDOS_FACTOR = factor
+        if args.logs:
+            series = window_log_series(args.logs)
+        else:
+            series = synthetic_series(args.synthetic, args.agents, args.normal, args.attack_len, args.cycles)
+        reports[factor] = replay.run(series)
+        if not args.json:
+            _print(factor, reports[factor])
+    anomaly_detector.PIPELINE.shutdown()
+    anomaly_detector.MODEL_REGISTRY.shutdown()
+    if args.json:
+        print(json.dumps({str(k): v for k, v in reports.items()}, indent=2))
+    # A throughput floor, so a CI job can fail on regressions
+    slowest = min(r["records_per_sec"] for r in reports.values())
+    return 1 if args.min_rate and slowest < args.min_rate else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay metric series through the detectors and score them")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--logs", help="directory of window_*.json DDoS logs")
+    source.add_argument("--synthetic", choices=sorted(SCORED_TYPES), default="ddos")
+    parser.add_argument("--agents", type=int, default=10)
+    parser.add_argument("--normal", type=int, default=60, help="seconds of normal traffic per cycle")
+    parser.add_argument("--attack-len", type=int, default=10, help="seconds of attack per cycle")
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--detectors", nargs="+", help="registry names (default: cheap detectors)")
+    parser.add_argument("--alert-types", nargs="+", help="alert types that count as a detection")
+    parser.add_argument("--ddos-factor", type=float, nargs="+", help="one replay per value")
+    parser.add_argument("--min-rate", type=float, help="exit 1 below this many records/sec")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    os.environ["AEGIS_STORAGE"] = "memory"  # replay resets state; never touch persistent stores
+    sys.exit(main(args))
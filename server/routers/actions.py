@@ -1,13 +1,38 @@
-from fastapi import APIRouter
-from database import log_action, list_actions
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from sharding import CLUSTER, split_cursor
+from schemas import Action, read_body, respond, to_builtins
+from database import log_action, query_actions
 
 router = APIRouter()
 
 @router.post("/")
-async def post_action(action: dict):
-    log_action(action)
-    return {"msg": "Action logged"}
+async def post_action(request: Request):
+    log_action(to_builtins(await read_body(request, Action)))
+    return respond(request, {"msg": "Action logged"})
 
 @router.get("/")
-def get_actions():
-    return list_actions() 
\ No newline at end of file
+async def get_actions(
+    request: Request,
+    type: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    def local(position):
+        return query_actions(type, agent_id, since, until, position, limit)
+
+    sharded = CLUSTER.routes(request)
+    try:
+        # Sharded: the cursor holds one position per shard
+        position = split_cursor(cursor, CLUSTER.n) if sharded else (int(cursor) if cursor else None)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if sharded:
+        params = {"type": type, "agent_id": agent_id, "since": since, "until": until}
+        items, next_cursor = await CLUSTER.scatter_query("/actions/", params, local, position, limit)
+    else:
+        items, next_cursor = local(position)
+    return respond(request, {"items": items, "next_cursor": next_cursor}) 
\ No newline at end of file
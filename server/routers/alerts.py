@@ -1,18 +1,105 @@
-from fastapi import APIRouter
-from ai.anomaly_detector import detect
-from database import log_alert, list_alerts
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from schemas import MetricRecord, MSGPACK_TYPES, encode_msgpack, read_body, respond
+from ai.anomaly_detector import detect, detect_batch
+from ai.correlation import CORRELATOR
+from executor import INGEST_POOL
+from instrumentation import instrument_route, RECORDS_INGESTED, ALERTS_RAISED
+from sharding import CLUSTER, split_cursor
+from startup import STARTUP
+from database import query_alerts, upsert_metrics, add_historical_metric, upsert_metrics_bulk
 
 router = APIRouter()
 
+# Bodies are decoded by schemas (JSON or MessagePack) rather than FastAPI's
+# body parameters, and responses are encoded by schemas.respond. Responses
+# carry every raised alert; storage only sees incident events (ai.correlation).
+
 @router.post("/")
-async def post_alerts(metric_record: dict):
+@instrument_route("POST /alerts/")
+async def post_alerts(request: Request):
+    metric_record = await read_body(request, MetricRecord)
+    if metric_record.agent_id is None:
+        raise HTTPException(status_code=422, detail="agent_id is required")
+    if STARTUP.pending:
+        await STARTUP.wait_ready()
+    if CLUSTER.routes(request):
+        shard = CLUSTER.owner(metric_record.agent_id)
+        if shard != CLUSTER.shard_id:
+            headers = {"content-type": request.headers.get("content-type", "application/json")}
+            return respond(request, await CLUSTER.forward(shard, "POST", "/alerts/", content=await request.body(), headers=headers))
+    upsert_metrics(metric_record)
+    add_historical_metric(metric_record)
+    RECORDS_INGESTED.inc()
     alerts = detect(metric_record)
     if alerts:
-        for alert in alerts:
-            log_alert(alert)
-        return {"alerts": alerts}
-    return {"msg": "OK"}
+        ALERTS_RAISED.inc(len(alerts))
+        CORRELATOR.submit_many(alerts)
+        return respond(request, {"alerts": alerts})
+    return respond(request, {"msg": "OK"})
+
+def _ingest_batch(records):
+    upsert_metrics_bulk(records)
+    RECORDS_INGESTED.inc(len(records))
+    alerts_by_agent = detect_batch(records)
+    raised = [alert for alerts in alerts_by_agent.values() for alert in alerts]
+    CORRELATOR.submit_many(raised)
+    ALERTS_RAISED.inc(len(raised))
+    return alerts_by_agent
+
+async def _route_batch(records):
+    # Each shard ingests its own agents' records; the parts run concurrently
+    async def part(shard, shard_records):
+        if shard == CLUSTER.shard_id:
+            return await INGEST_POOL.run(_ingest_batch, shard_records)
+        response = await CLUSTER.forward(shard, "POST", "/alerts/batch", content=encode_msgpack(shard_records),
+                                         headers={"content-type": MSGPACK_TYPES[0]})
+        return response["alerts"]
+
+    alerts_by_agent = {}
+    for alerts in await asyncio.gather(*(part(s, r) for s, r in CLUSTER.partition(records).items())):
+        alerts_by_agent.update(alerts)
+    return alerts_by_agent
+
+@router.post("/batch")
+@instrument_route("POST /alerts/batch")
+async def post_alerts_batch(request: Request):
+    # Vectorized detection over a large batch is the heavy path: it runs on
+    # the ingest worker so the loop keeps serving, and answers 503 when full
+    metric_records = await read_body(request, list[MetricRecord])
+    records = [r for r in metric_records if r.agent_id is not None]
+    if STARTUP.pending:
+        await STARTUP.wait_ready()
+    if CLUSTER.routes(request):
+        alerts_by_agent = await _route_batch(records)
+    else:
+        alerts_by_agent = await INGEST_POOL.run(_ingest_batch, records)
+    return respond(request, {"accepted": len(records), "rejected": len(metric_records) - len(records), "alerts": alerts_by_agent})
 
 @router.get("/")
-def get_alerts():
-    return list_alerts() 
\ No newline at end of file
+@instrument_route("GET /alerts/")
+async def get_alerts(
+    request: Request,
+    type: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    def local(position):
+        return query_alerts(type, agent_id, since, until, position, limit)
+
+    sharded = CLUSTER.routes(request)
+    try:
+        # Sharded: the cursor holds one position per shard
+        position = split_cursor(cursor, CLUSTER.n) if sharded else (int(cursor) if cursor else None)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if sharded:
+        params = {"type": type, "agent_id": agent_id, "since": since, "until": until}
+        items, next_cursor = await CLUSTER.scatter_query("/alerts/", params, local, position, limit)
+    else:
+        items, next_cursor = local(position)
+    return respond(request, {"items": items, "next_cursor": next_cursor})
@@ -0,0 +1,33 @@
+import time
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from schemas import respond
+from instrumentation import instrument_route
+from sharding import CLUSTER
+from database import ROLLUPS, query_history
+
+router = APIRouter()
+
+# Long-range history for one agent from the rollup tiers. The tier is picked
+# from the range and the wanted resolution (seconds per point): raw samples
+# for the last ~100 s, 1 min buckets for hours, 1 h buckets for days.
+
+@router.get("/{agent_id}")
+@instrument_route("GET /history/")
+async def get_history(
+    request: Request,
+    agent_id: str,
+    field: str = "cpu",
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    resolution: Optional[float] = Query(None, gt=0),
+):
+    if field not in ROLLUPS.fields:
+        raise HTTPException(status_code=422, detail=f"field must be one of {', '.join(ROLLUPS.fields)}")
+    if CLUSTER.routes(request):
+        shard = CLUSTER.owner(agent_id)
+        if shard != CLUSTER.shard_id:
+            return respond(request, await CLUSTER.forward(shard, "GET", f"/history/{agent_id}", params=request.query_params))
+    until = time.time() if until is None else until
+    since = until - 3600 if since is None else since
+    return respond(request, query_history(agent_id, field, since, until, resolution))
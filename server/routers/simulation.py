@@ -1,27 +1,46 @@
 from fastapi import APIRouter, Query
 import asyncio
-import httpx
+import os
 
 router = APIRouter()
 
-async def simulate_attack(attack_type, agent_id, duration=10):
-    url = "http://localhost:8000/alerts/"
-    async with httpx.AsyncClient() as client:
-        for i in range(duration):
-            if attack_type == "cpu_spike":
-                metric = {"agent_id": agent_id, "cpu": 95, "memory": 40, "net_io": {"sent": 100, "recv": 100}}
-            elif attack_type == "memory_overload":
-                metric = {"agent_id": agent_id, "cpu": 30, "memory": 95, "net_io": {"sent": 100, "recv": 100}}
-            elif attack_type == "ddos":
-                metric = {"agent_id": agent_id, "cpu": 80, "memory": 60, "net_io": {"sent": 100000, "recv": 100000}}
-            elif attack_type == "rogue_agent":
-                metric = {"agent_id": "rogue_" + agent_id, "cpu": 50, "memory": 50, "net_io": {"sent": 100, "recv": 100}}
-            else:
-                metric = {"agent_id": agent_id, "cpu": 10, "memory": 10, "net_io": {"sent": 10, "recv": 10}}
-            await client.post(url, json=metric)
-            await asyncio.sleep(1)  # 1 second between metrics
+ALERTS_URL = os.environ.get("AEGIS_ALERTS_URL", "http://localhost:8000/alerts/")
+ATTACK_TYPES = ["cpu_spike", "memory_overload", "ddos", "rogue_agent"]
+
+_client = None
+
+def get_client():
+    # One pooled keep-alive client shared by all simulations
+    global _client
+    if _client is None:
+        import httpx
+        _client = httpx.AsyncClient(limits=httpx.Limits(max_connections=100, max_keepalive_connections=100))
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def make_metric(attack_type, agent_id):
+    if attack_type == "cpu_spike":
+        return {"agent_id": agent_id, "cpu": 95, "memory": 40, "packets_per_sec": 50, "net_io": {"sent": 100, "recv": 100}}
+    elif attack_type == "memory_overload":
+        return {"agent_id": agent_id, "cpu": 30, "memory": 95, "packets_per_sec": 50, "net_io": {"sent": 100, "recv": 100}}
+    elif attack_type == "ddos":
+        return {"agent_id": agent_id, "cpu": 80, "memory": 60, "packets_per_sec": 5000, "net_io": {"sent": 100000, "recv": 100000}}
+    elif attack_type == "rogue_agent":
+        return {"agent_id": "rogue_" + agent_id, "cpu": 50, "memory": 50, "packets_per_sec": 50, "net_io": {"sent": 100, "recv": 100}}
+    return {"agent_id": agent_id, "cpu": 10, "memory": 10, "packets_per_sec": 50, "net_io": {"sent": 10, "recv": 10}}
+
+async def simulate_attack(attack_type, agent_id, duration=10, url=ALERTS_URL):
+    client = get_client()
+    for i in range(duration):
+        await client.post(url, json=make_metric(attack_type, agent_id))
+        await asyncio.sleep(1)  # 1 second between metrics
 
 @router.post("/")
-async def simulate(type: str = Query(..., enum=["cpu_spike", "memory_overload", "ddos", "rogue_agent"]), agent_id: str = "sim_agent"):
+async def simulate(type: str = Query(..., enum=ATTACK_TYPES), agent_id: str = "sim_agent"):
     asyncio.create_task(simulate_attack(type, agent_id))
-    return {"msg": f"Simulating {type} attack on {agent_id}"} 
\ No newline at end of file
+    return {"msg": f"Simulating {type} attack on {agent_id}"}
@@ -0,0 +1,80 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from streaming import HUB, TOPICS
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15
+
+
+def _split(value):
+    return [v for v in value.split(",") if v] if value else None
+
+
+async def _send(websocket, subscriber):
+    try:
+        while True:
+            item = await subscriber.get()
+            if item is None:
+                await websocket.close(code=1013, reason="Subscriber too slow")
+                return
+            topic, payload = item
+            await websocket.send_text(f'{{"topic":"{topic}","data":{payload}}}')
+    except WebSocketDisconnect:
+        pass
+
+
+async def _receive(websocket):
+    # Clients send nothing; reading is how a disconnect is noticed even when
+    # no message ever matches the subscriber's filters
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@router.websocket("/ws")
+async def stream_ws(websocket: WebSocket, topics: Optional[str] = None, agent_id: Optional[str] = None, type: Optional[str] = None):
+    await websocket.accept()
+    subscriber = HUB.subscribe(_split(topics), _split(agent_id), _split(type))
+    tasks = (asyncio.create_task(_send(websocket, subscriber)), asyncio.create_task(_receive(websocket)))
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        HUB.unsubscribe(subscriber)
+
+
+@router.get("/sse")
+async def stream_sse(
+    topics: Optional[str] = Query(None, description=f"Comma-separated subset of {','.join(TOPICS)}"),
+    agent_id: Optional[str] = None,
+    type: Optional[str] = None,
+):
+    subscriber = HUB.subscribe(_split(topics), _split(agent_id), _split(type))
+
+    async def events():
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscriber.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+                topic, payload = item
+                yield f"event: {topic}\ndata: {payload}\n\n"
+        finally:
+            HUB.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/stats")
+async def stream_stats():
+    return HUB.stats()
@@ -0,0 +1,145 @@
+from typing import Optional, Union
+
+import msgspec
+from fastapi import HTTPException, Request, Response
+
+from history_store import parse_timestamp
+
+# Typed records for the wire. Bodies are decoded and validated once at the
+# edge straight from bytes into slotted structs (no intermediate dicts, no
+# per-field Python validation). JSON is the default; MessagePack is used when
+# the client sends or accepts MSGPACK_TYPES.
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+JSON_TYPE = "application/json"
+
+
+class Record(msgspec.Struct, kw_only=True, omit_defaults=True):
+    # Read-only mapping view, so code written against dict records accepts
+    # structs unchanged. None means "not sent", as a missing dict key did.
+    def get(self, key, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = getattr(self, key, None)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return getattr(self, key, None) is not None
+
+
+class NetIO(Record, gc=False):
+    sent: Optional[float] = None
+    recv: Optional[float] = None
+    outbound_connections: Optional[int] = None
+
+
+class Process(Record, gc=False):
+    name: str
+    cpu: float = 0.0
+    memory: Optional[float] = None
+    pid: Optional[int] = None
+
+
+# gc=False: records hold no reference cycles, so the collector can skip them
+class MetricRecord(Record, gc=False):
+    # agent_id is optional so a batch can reject single records without it
+    agent_id: Optional[str] = None
+    # Epoch seconds or ISO 8601. ISO strings without a UTC offset are read
+    # as UTC, not as server-local time; anything else is rejected with a 422.
+    # Clients that stamp local time must include the offset.
+    timestamp: Union[float, str, None] = None
+    cpu: Optional[float] = None
+    memory: Optional[float] = None
+    packets_per_sec: Optional[float] = None
+    net_io: Optional[NetIO] = None
+    per_process: Optional[list[Process]] = None
+    peers: Optional[list[str]] = None
+
+
+class Alert(Record):
+    type: str
+    details: dict = {}
+    agent_id: Optional[str] = None
+    # Epoch seconds or ISO 8601. ISO strings without a UTC offset are read
+    # as UTC, not as server-local time; anything else is rejected with a 422.
+    # Clients that stamp local time must include the offset.
+    timestamp: Union[float, str, None] = None
+
+
+class Action(Record):
+    action: Optional[str] = None
+    type: Optional[str] = None
+    target: Optional[str] = None
+    agent_id: Optional[str] = None
+    alert_type: Optional[str] = None
+    details: Optional[dict] = None
+    timestamp: Union[float, str, None] = None
+
+
+def _codecs(kind):
+    return msgspec.json.Decoder(kind), msgspec.msgpack.Decoder(kind)
+
+
+_DECODERS = {
+    MetricRecord: _codecs(MetricRecord),
+    list[MetricRecord]: _codecs(list[MetricRecord]),
+    Action: _codecs(Action),
+}
+_JSON = msgspec.json.Encoder(enc_hook=str)
+_MSGPACK = msgspec.msgpack.Encoder(enc_hook=str)
+
+
+def _is_msgpack(content_type):
+    return content_type is not None and content_type.split(";", 1)[0].strip() in MSGPACK_TYPES
+
+
+def decode(body, kind, content_type=None):
+    json_decoder, msgpack_decoder = _DECODERS[kind]
+    return (msgpack_decoder if _is_msgpack(content_type) else json_decoder).decode(body)
+
+
+def _check_timestamps(value):
+    # String timestamps must parse here; past the edge they are trusted
+    for record in value if isinstance(value, list) else (value,):
+        timestamp = record.timestamp
+        if isinstance(timestamp, str):
+            try:
+                parse_timestamp(timestamp)
+            except ValueError:
+                raise msgspec.ValidationError(f"Invalid timestamp {timestamp!r}: expected epoch seconds or ISO 8601")
+
+
+async def read_body(request: Request, kind):
+    try:
+        value = decode(await request.body(), kind, request.headers.get("content-type"))
+        _check_timestamps(value)
+        return value
+    except msgspec.ValidationError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    except msgspec.DecodeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def encode_json(obj):
+    return _JSON.encode(obj)
+
+
+def encode_msgpack(obj):
+    return _MSGPACK.encode(obj)
+
+
+def respond(request: Request, content):
+    # Encodes dicts, lists and structs directly, skipping jsonable_encoder
+    accept = request.headers.get("accept", "")
+    if any(kind in accept for kind in MSGPACK_TYPES):
+        return Response(_MSGPACK.encode(content), media_type=MSGPACK_TYPES[0])
+    return Response(_JSON.encode(content), media_type=JSON_TYPE)
+
+
+def to_builtins(record):
+    # Plain dicts for storage backends and anything else that json.dumps
+    return msgspec.to_builtins(record, enc_hook=str) if isinstance(record, msgspec.Struct) else record
+
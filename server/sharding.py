@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import contextlib
+import fcntl
+import hashlib
+import os
+import time
+from bisect import bisect_right
+
+from history_store import parse_timestamp
+
+# Agent-sharded deployment. With AEGIS_SHARDS=N the server runs as N processes
+# (e.g. `uvicorn app:app --workers N`, or `python sharding.py --shards N`).
+# Each process claims one shard id through a lock file, keeps the state of the
+# agents that hash to it, and also listens on a Unix socket. Whichever process
+# accepts a request forwards ingest to the owning shard and scatters reads to
+# all shards. Requests from another shard carry FORWARD_HEADER and are always
+# served locally. Without AEGIS_SHARDS nothing here is active.
+SHARDS = int(os.environ.get("AEGIS_SHARDS", 0))
+SHARD_DIR = os.environ.get("AEGIS_SHARD_DIR", "/tmp/aegis-shards")  # short: socket paths are length-limited
+VNODES = 128
+FORWARD_HEADER = "x-aegis-shard"
+CLAIM_WAIT = 30  # seconds
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    # Consistent hashing with virtual nodes: adding a shard moves ~1/N of agents
+    def __init__(self, nodes, vnodes=VNODES):
+        points = sorted((_hash(f"{node}#{v}"), node) for node in nodes for v in range(vnodes))
+        self._keys = [p for p, _ in points]
+        self._nodes = [n for _, n in points]
+
+    def owner(self, key):
+        i = bisect_right(self._keys, _hash(key))
+        return self._nodes[i % len(self._nodes)]
+
+
+def socket_path(shard_id, directory=SHARD_DIR):
+    return os.path.join(directory, f"shard-{shard_id}.sock")
+
+
+_lock_file = None
+
+
+def claim_shard(n, directory=SHARD_DIR, wait=CLAIM_WAIT):
+    # First free shard id; the flock is held for the life of the process, so
+    # a restarted worker takes over the id its predecessor left. Waits a
+    # little, since the supervisor may start the replacement before the old
+    # worker has exited.
+    global _lock_file
+    os.makedirs(directory, exist_ok=True)
+    deadline = time.monotonic() + wait
+    while True:
+        for shard_id in range(n):
+            f = open(os.path.join(directory, f"shard-{shard_id}.lock"), "w")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                continue
+            _lock_file = f
+            return shard_id
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"All {n} shards are already claimed in {directory}")
+        time.sleep(0.2)
+
+
+# Only the copy imported by the app claims; the launcher below (and its
+# re-import as __mp_main__ in spawned workers) must not hold a shard
+SHARD_ID = claim_shard(SHARDS) if SHARDS and __name__ == "sharding" else None
+
+
+def shard_path(base):
+    # Per-shard subdirectory for on-disk state (storage, model snapshots)
+    return base if SHARD_ID is None else os.path.join(base, f"shard-{SHARD_ID}")
+
+
+class ShardCluster:
+    def __init__(self, n=SHARDS, shard_id=SHARD_ID, directory=SHARD_DIR):
+        self.n = n
+        self.shard_id = shard_id
+        self.directory = directory
+        self.ring = HashRing(range(n)) if n else None
+        self._clients = {}
+        self._server = None
+        self._task = None
+        self.counters = {"forwarded": 0, "scattered": 0, "errors": 0}
+
+    @property
+    def enabled(self):
+        return self.n > 1
+
+    def owner(self, agent_id):
+        return self.ring.owner(agent_id) if self.enabled else self.shard_id
+
+    def routes(self, request):
+        # True when this process should route the request rather than serve it
+        return self.enabled and FORWARD_HEADER not in request.headers
+
+    def partition(self, records):
+        parts = {}
+        for record in records:
+            parts.setdefault(self.owner(record.get("agent_id")), []).append(record)
+        return parts
+
+    def _client(self, shard_id):
+        import httpx
+        client = self._clients.get(shard_id)
+        if client is None:
+            transport = httpx.AsyncHTTPTransport(uds=socket_path(shard_id, self.directory))
+            client = self._clients[shard_id] = httpx.AsyncClient(
+                transport=transport, base_url="http://shard", timeout=30,
+                headers={FORWARD_HEADER: str(self.shard_id)},
+            )
+        return client
+
+    async def forward(self, shard_id, method, path, **kwargs):
+        import httpx
+        from executor import Saturated
+        self.counters["forwarded"] += 1
+        try:
+            response = await self._client(shard_id).request(method, path, **kwargs)
+        except httpx.TransportError:
+            self.counters["errors"] += 1
+            raise Saturated(f"shard {shard_id}")
+        if response.status_code == 503:
+            raise Saturated(f"shard {shard_id}", int(response.headers.get("Retry-After", 1)))
+        response.raise_for_status()
+        return response.json()
+
+    async def scatter_query(self, path, params, local_query, positions, limit):
+        # Paginated query on every shard, merged newest first. local_query(cursor)
+        # answers for this shard; `positions` is split_cursor() of the composite
+        # cursor from the last page.
+        self.counters["scattered"] += 1
+        params = {k: v for k, v in params.items() if v is not None}
+
+        async def one(shard_id, position):
+            if position is False:
+                return [], None
+            if shard_id == self.shard_id:
+                return local_query(position)
+            page_params = dict(params, limit=limit)
+            if position is not None:
+                page_params["cursor"] = position
+            body = await self.forward(shard_id, "GET", path, params=page_params)
+            return body["items"], body["next_cursor"]
+
+        pages = await asyncio.gather(*(one(i, p) for i, p in enumerate(positions)))
+        items, next_positions = merge_pages(pages, positions, limit)
+        return items, join_cursor(next_positions)
+
+    async def start(self, app):
+        if not self.enabled:
+            return
+        import uvicorn
+
+        class _ShardServer(uvicorn.Server):
+            @contextlib.contextmanager
+            def capture_signals(self):
+                yield  # the public server owns signal handling
+
+        path = socket_path(self.shard_id, self.directory)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)  # left over from a crashed owner; we hold the lock now
+        config = uvicorn.Config(app, uds=path, lifespan="off", log_level="warning", access_log=False)
+        self._server = _ShardServer(config)
+        self._task = asyncio.get_running_loop().create_task(self._server.serve())
+
+    async def stop(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+        if self._server is not None:
+            self._server.should_exit = True
+            await self._task
+            self._server = self._task = None
+
+    def stats(self):
+        return dict(self.counters, shards=self.n, shard_id=self.shard_id)
+
+
+def split_cursor(cursor, n):
+    # Composite cursor -> per-shard positions: None = from the top,
+    # False = exhausted, int = continue below that id
+    if not cursor:
+        return [None] * n
+    parts = cursor.split(".")
+    if len(parts) != n:
+        raise ValueError("cursor does not match the shard count")
+    return [False if p == "-" else (None if p == "" else int(p)) for p in parts]
+
+
+def join_cursor(positions):
+    if all(p is False for p in positions):
+        return None
+    return ".".join("-" if p is False else ("" if p is None else str(p)) for p in positions)
+
+
+def merge_pages(pages, positions, limit):
+    # pages: per-shard (items, next_cursor), each newest first, fetched from
+    # `positions`. Returns the newest `limit` items overall and each shard's
+    # position for the next page.
+    merged = sorted(
+        ((item, shard_id) for shard_id, (items, _) in enumerate(pages) for item in items),
+        key=lambda pair: (parse_timestamp(pair[0].get("timestamp", 0)), pair[0].get("id", 0)),
+        reverse=True,
+    )[:limit]
+    taken = [0] * len(pages)
+    for _, shard_id in merged:
+        taken[shard_id] += 1
+    next_positions = []
+    for (items, next_cursor), position, k in zip(pages, positions, taken):
+        if not items:
+            next_positions.append(False)
+        elif k == len(items):
+            next_positions.append(False if next_cursor is None else next_cursor)
+        elif k:
+            next_positions.append(items[k - 1]["id"])
+        else:
+            next_positions.append(position)
+    return [item for item, _ in merged], next_positions
+
+
+CLUSTER = ShardCluster()
+
+
+if __name__ == "__main__":
+    # python sharding.py --shards 4 --port 8000
+    parser = argparse.ArgumentParser(description="Run the API as N agent-sharded worker processes")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    os.environ["AEGIS_SHARDS"] = str(args.shards)
+    import uvicorn
+    uvicorn.run("app:app", host=args.host, port=args.port, workers=args.shards)
@@ -0,0 +1,174 @@
+import asyncio
+import copy
+import importlib
+import os
+import pickle
+import sys
+import time
+import types
+
+# Startup in two steps: the app starts accepting traffic as soon as FastAPI
+# is up (liveness), while heavy modules are imported and the last state
+# snapshot is restored in a worker thread (readiness). Ingest waits for
+# readiness, so detectors see the restored history from the first record.
+STATE_FILE = "state.pickle"
+SNAPSHOT_INTERVAL = float(os.environ.get("AEGIS_SNAPSHOT_INTERVAL", 300))  # seconds, 0 = only on shutdown
+WARM_MODULES = ("numpy",)
+READY_TIMEOUT = 30  # seconds an early request waits before getting a 503
+
+
+class _Deferred(types.ModuleType):
+    # Placeholder bound to a module-level name; the first attribute access
+    # imports the real module and rebinds the name, so later lookups are
+    # plain global reads. importlib's per-module locks make this thread-safe.
+    def __init__(self, name, namespace, alias):
+        super().__init__(name)
+        self._namespace = namespace
+        self._alias = alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self._namespace[self._alias] = module
+        return getattr(module, attr)
+
+
+def lazy_import(name, namespace, alias=None):
+    # np = lazy_import("numpy", globals(), "np")
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return _Deferred(name, namespace, alias or name)
+
+
+def save_state(data_dir, model_dir):
+    # History, rollups, rolling stats and profiles in one pickle (NumPy columns are
+    # written as raw buffers), models and baselines in their own snapshots.
+    # Ingest only waits for the copies; pickling them runs outside the lock.
+    import database
+    from ai.baselines import BASELINES
+    from ai.model_registry import MODEL_REGISTRY
+    with database.HISTORY_LOCK:
+        history = copy.deepcopy(database.HISTORICAL_METRICS)
+        rollups = copy.deepcopy(database.ROLLUPS)
+        # Thousands of small objects: pickle copies them faster than deepcopy
+        rolling = pickle.dumps(database.ROLLING_STATS, protocol=pickle.HIGHEST_PROTOCOL)
+    payload = pickle.dumps({
+        "history": history,
+        "rollups": rollups,
+        "rolling": rolling,
+        "profiles": dict(database.PROFILES),
+        "metrics": dict(database.METRICS),
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, STATE_FILE)
+    with open(path + ".tmp", "wb") as f:
+        f.write(payload)
+    os.replace(path + ".tmp", path)
+    MODEL_REGISTRY.save_snapshot(model_dir)
+    BASELINES.save_snapshot(model_dir)
+    return path
+
+
+def restore_state(data_dir, model_dir):
+    import database
+    from ai.baselines import BASELINES
+    from ai.model_registry import MODEL_REGISTRY
+    restored = {"models": MODEL_REGISTRY.load_snapshot(model_dir), "baselines": BASELINES.load_snapshot(model_dir)}
+    path = os.path.join(data_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return restored
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    history = state["history"]
+    if history.maxlen != database.HISTORICAL_METRICS.maxlen or history.fields != database.HISTORICAL_METRICS.fields:
+        return restored  # written by a build with a different history layout
+    rollups = state.get("rollups")
+    with database.HISTORY_LOCK:
+        # In place: detectors hold references to these objects
+        database.HISTORICAL_METRICS.__dict__.update(history.__dict__)
+        database.ROLLING_STATS.__dict__.update(pickle.loads(state["rolling"]).__dict__)
+        if getattr(rollups, "layout", None) == database.ROLLUPS.layout:
+            database.ROLLUPS.__dict__.update(rollups.__dict__)
+        else:
+            database.ROLLUPS.clear()
+    # Persistent backends already loaded these; the snapshot fills in the rest
+    for agent_id, record in state["metrics"].items():
+        database.METRICS.setdefault(agent_id, record)
+    for agent_id, profile in state["profiles"].items():
+        if agent_id not in database.PROFILES:
+            database.upsert_profile(profile)
+    restored["agents"] = len(history)
+    return restored
+
+
+class Startup:
+    def __init__(self, warm_modules=WARM_MODULES, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.warm_modules = warm_modules
+        self.snapshot_interval = snapshot_interval
+        self.started = time.monotonic()
+        self.checks = {"modules": False, "state": False}
+        self.timings = {}
+        self.restored = {}
+        self.error = None
+        self._ready = None
+        self._tasks = []
+
+    @property
+    def ready(self):
+        return self._ready is not None and self._ready.is_set()
+
+    @property
+    def pending(self):
+        # Started but not ready yet; False outside a running app (scripts, benchmarks)
+        return self._ready is not None and not self._ready.is_set()
+
+    def _warm(self):
+        for name in self.warm_modules:
+            importlib.import_module(name)
+        self.checks["modules"] = True
+
+    async def _prepare(self, data_dir, model_dir):
+        try:
+            await asyncio.to_thread(self._warm)
+            self.timings["modules_ms"] = (time.monotonic() - self.started) * 1e3
+            self.restored = await asyncio.to_thread(restore_state, data_dir, model_dir)
+            self.checks["state"] = True
+        except Exception as exc:  # start empty rather than never becoming ready
+            self.error = repr(exc)
+            self.checks["state"] = True
+        self.timings["ready_ms"] = (time.monotonic() - self.started) * 1e3
+        self._ready.set()
+
+    async def _snapshot_loop(self, data_dir, model_dir):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            await asyncio.to_thread(save_state, data_dir, model_dir)
+
+    def start(self, data_dir, model_dir):
+        self._ready = asyncio.Event()
+        self.timings["live_ms"] = (time.monotonic() - self.started) * 1e3
+        self._tasks.append(asyncio.create_task(self._prepare(data_dir, model_dir)))
+        if self.snapshot_interval > 0:
+            self._tasks.append(asyncio.create_task(self._snapshot_loop(data_dir, model_dir)))
+
+    async def wait_ready(self, timeout=READY_TIMEOUT):
+        from executor import Saturated
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise Saturated("startup")
+
+    async def stop(self, data_dir, model_dir):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        ready, self._ready = self.ready, None
+        if ready:  # never overwrite a snapshot we have not restored yet
+            await asyncio.to_thread(save_state, data_dir, model_dir)
+
+    def status(self):
+        return {"ready": self.ready, "checks": dict(self.checks), "timings": dict(self.timings),
+                "restored": self.restored, "error": self.error}
+
+
+STARTUP = Startup()
@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+
+class MemoryBackend:
+    # Default backend: nothing survives a restart. Used by tests and benchmarks.
+
+    def __init__(self):
+        self.kv = defaultdict(dict)
+        self.logs = defaultdict(dict)
+
+    def load(self, table):
+        return dict(self.kv[table])
+
+    def put(self, table, key, record):
+        self.kv[table][key] = record
+
+    def append(self, table, seq, record):
+        self.logs[table][seq] = record
+
+    def extend(self, table, items):
+        self.logs[table].update(items)
+
+    def get(self, table, seqs):
+        log = self.logs[table]
+        return [log[seq] for seq in seqs if seq in log]
+
+    def scan(self, table):
+        return iter(self.logs[table].values())
+
+    def count(self, table):
+        return len(self.logs[table])
+
+    def clear(self):
+        self.kv.clear()
+        self.logs.clear()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
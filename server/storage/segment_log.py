@@ -0,0 +1,261 @@
+from array import array
+from bisect import bisect_left, bisect_right
+import json
+import os
+import threading
+import time
+
+SEGMENT_SUFFIX = ".log"
+
+
+class _Table:
+    # One directory of numbered segments, each a file of lines. Only the
+    # newest segment is ever written to. Indexed tables prefix every line with
+    # its sequence number ("seq\tts\tjson") and keep seq -> (segment, offset)
+    # in compact arrays so single records can be read back with one seek.
+
+    def __init__(self, directory, segment_bytes, indexed=False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.indexed = indexed
+        self.seqs = array("q")
+        self.locs = array("q")  # segment number per indexed record
+        self.offsets = array("q")
+        os.makedirs(directory, exist_ok=True)
+        self.segments = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+        if indexed:
+            for seq in self.segments:
+                self._index_segment(seq)
+            self.count = len(self.seqs)
+        else:
+            self.count = sum(self._line_count(seq) for seq in self.segments)
+        self._file = None
+        self._open(self.segments[-1] if self.segments else 1)
+
+    def path(self, seq):
+        return os.path.join(self.directory, f"{seq:012d}{SEGMENT_SUFFIX}")
+
+    def _line_count(self, seq):
+        count = 0
+        with open(self.path(seq), "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                count += chunk.count(b"\n")
+        return count
+
+    def _index_segment(self, segment):
+        offset = 0
+        with open(self.path(segment), "rb") as f:
+            for line in f:
+                if line.endswith(b"\n"):
+                    self.seqs.append(int(line[:line.index(b"\t")]))
+                    self.locs.append(segment)
+                    self.offsets.append(offset)
+                offset += len(line)
+
+    def _open(self, seq):
+        if self._file is not None:
+            self._file.close()
+        if seq not in self.segments:
+            self.segments.append(seq)
+        self._file = open(self.path(seq), "ab", buffering=1 << 16)
+        self.size = self._file.tell()
+
+    def write(self, lines, seqs=None):
+        if seqs is not None:
+            segment, offset = self.segments[-1], self.size
+            for seq, line in zip(seqs, lines):
+                self.seqs.append(seq)
+                self.locs.append(segment)
+                self.offsets.append(offset)
+                offset += len(line)
+        data = b"".join(lines)
+        self._file.write(data)
+        self.size += len(data)
+        self.count += len(lines)
+        if self.size >= self.segment_bytes:
+            self._open(self.segments[-1] + 1)
+            return True
+        return False
+
+    def read(self):
+        for seq in list(self.segments):
+            try:
+                with open(self.path(seq), "rb") as f:
+                    for line in f:
+                        if line.endswith(b"\n"):  # skip a torn last write
+                            yield json.loads(line.split(b"\t", 2)[2] if self.indexed else line)
+            except FileNotFoundError:  # removed by retention while iterating
+                continue
+
+    def get(self, seqs):
+        files = {}
+        out = []
+        try:
+            for seq in seqs:
+                i = bisect_left(self.seqs, seq)
+                if i == len(self.seqs) or self.seqs[i] != seq:
+                    continue
+                segment = self.locs[i]
+                f = files.get(segment)
+                if f is None:
+                    f = files[segment] = open(self.path(segment), "rb")
+                f.seek(self.offsets[i])
+                out.append(json.loads(f.readline().split(b"\t", 2)[2]))
+        finally:
+            for f in files.values():
+                f.close()
+        return out
+
+    def drop(self, seq):
+        if self.indexed:
+            # Segments are dropped oldest first, so their entries are a prefix
+            cut = bisect_right(self.locs, seq)
+            del self.seqs[:cut], self.locs[:cut], self.offsets[:cut]
+            self.count = len(self.seqs)
+        else:
+            self.count -= self._line_count(seq)
+        os.remove(self.path(seq))
+        self.segments.remove(seq)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SegmentLogBackend:
+    # Append-only segmented log per table. Log tables (alerts, actions) are
+    # trimmed by age and total size when a segment rolls over; key-value
+    # tables (metrics, profiles) are compacted down to their latest values.
+
+    def __init__(self, directory, segment_bytes=16 << 20, retention_seconds=7 * 24 * 3600, retention_bytes=1 << 30,
+                 compact_segments=4, flush_interval=0.5):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.retention_seconds = retention_seconds
+        self.retention_bytes = retention_bytes
+        self.compact_segments = compact_segments
+        self.flush_interval = flush_interval
+        self._tables = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.on_prune = None  # (table, first_kept_seq) after retention drops log records
+
+    def _table(self, kind, table):
+        name = f"{kind}-{table}"
+        t = self._tables.get(name)
+        if t is None:
+            t = self._tables[name] = _Table(os.path.join(self.directory, name), self.segment_bytes, indexed=kind == "log")
+            if kind == "log":
+                self._apply_retention(table, t)  # segments that aged out while the server was down
+        return t
+
+    def load(self, table):
+        with self._lock:
+            t = self._table("kv", table)
+            t.flush()
+            values = {}
+            for entry in t.read():
+                values[entry["k"]] = entry["v"]
+            return values
+
+    def put(self, table, key, record):
+        line = json.dumps({"k": key, "v": record}, default=str).encode() + b"\n"
+        with self._lock:
+            t = self._table("kv", table)
+            if t.write([line]) and len(t.segments) > self.compact_segments:
+                self._compact(t)
+            self._maybe_flush()
+
+    def append(self, table, seq, record):
+        self.extend(table, [(seq, record)])
+
+    def extend(self, table, items):
+        now = time.time()
+        seqs = [seq for seq, _ in items]
+        lines = [f"{seq}\t{now}\t".encode() + json.dumps(r, default=str).encode() + b"\n" for seq, r in items]
+        with self._lock:
+            t = self._table("log", table)
+            if t.write(lines, seqs):
+                self._apply_retention(table, t)
+            self._maybe_flush()
+
+    def get(self, table, seqs):
+        with self._lock:
+            t = self._table("log", table)
+            t.flush()
+            return t.get(seqs)
+
+    def scan(self, table):
+        with self._lock:
+            t = self._table("log", table)
+            t.flush()
+        return t.read()
+
+    def count(self, table):
+        with self._lock:
+            return self._table("log", table).count
+
+    def _apply_retention(self, table, t):
+        closed = t.segments[:-1]
+        cutoff = time.time() - self.retention_seconds if self.retention_seconds else None
+        total = sum(os.path.getsize(t.path(seq)) for seq in t.segments)
+        last = t.seqs[-1] if t.seqs else None
+        dropped = False
+        for seq in closed:
+            size = os.path.getsize(t.path(seq))
+            expired = cutoff is not None and os.path.getmtime(t.path(seq)) < cutoff
+            oversized = self.retention_bytes is not None and total > self.retention_bytes
+            if not (expired or oversized):
+                break
+            t.drop(seq)
+            total -= size
+            dropped = True
+        if dropped and last is not None and self.on_prune is not None:
+            self.on_prune(table, t.seqs[0] if t.seqs else last + 1)
+
+    def _compact(self, t):
+        # Rewrite the latest value of every key into one segment ahead of the
+        # active one, then drop the segments it supersedes.
+        closed = t.segments[:-1]
+        latest = {}
+        for seq in closed:
+            with open(t.path(seq), "rb") as f:
+                for line in f:
+                    if line.endswith(b"\n"):
+                        latest[json.loads(line)["k"]] = line
+        target = closed[-1]
+        tmp = t.path(target) + ".compact"
+        with open(tmp, "wb") as f:
+            f.writelines(latest.values())
+        for seq in closed[:-1]:
+            t.drop(seq)
+        t.count -= t._line_count(target)
+        os.replace(tmp, t.path(target))
+        t.count += len(latest)
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            for t in self._tables.values():
+                t.flush()
+            self._last_flush = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            for t in self._tables.values():
+                t.close()
+                for seq in list(t.segments):
+                    os.remove(t.path(seq))
+            self._tables.clear()
+
+    def flush(self):
+        with self._lock:
+            for t in self._tables.values():
+                t.flush()
+
+    def close(self):
+        with self._lock:
+            for t in self._tables.values():
+                t.close()
+            self._tables.clear()
@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteBackend:
+    # Embedded SQLite in WAL mode. Writes are buffered and committed together
+    # once `batch_size` operations are pending or `flush_interval` seconds
+    # have passed, so a crash loses at most one batch.
+
+    def __init__(self, path, batch_size=500, flush_interval=0.5, retention_seconds=None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._pending_kv = []
+        self._pending_log = []
+        self._last_flush = time.monotonic()
+        self.on_prune = None  # (table, first_kept_seq) after retention deletes log records
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (tbl TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (tbl, key)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS log (tbl TEXT NOT NULL, seq INTEGER NOT NULL, ts REAL NOT NULL, value TEXT NOT NULL, PRIMARY KEY (tbl, seq)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS log_ts ON log (ts)")
+        if retention_seconds is not None:
+            # Rows that aged out while the server was down go before anything is loaded
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._expire()
+
+    def load(self, table):
+        self.flush()
+        rows = self._conn.execute("SELECT key, value FROM kv WHERE tbl = ?", (table,))
+        return {key: json.loads(value) for key, value in rows}
+
+    def put(self, table, key, record):
+        with self._lock:
+            self._pending_kv.append((table, str(key), json.dumps(record, default=str)))
+            self._maybe_flush()
+
+    def append(self, table, seq, record):
+        with self._lock:
+            self._pending_log.append((table, seq, time.time(), json.dumps(record, default=str)))
+            self._maybe_flush()
+
+    def extend(self, table, items):
+        now = time.time()
+        with self._lock:
+            self._pending_log.extend((table, seq, now, json.dumps(r, default=str)) for seq, r in items)
+            self._maybe_flush()
+
+    def get(self, table, seqs):
+        self.flush()
+        found = {}
+        seqs = list(seqs)
+        for i in range(0, len(seqs), 500):
+            chunk = seqs[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = self._conn.execute(f"SELECT seq, value FROM log WHERE tbl = ? AND seq IN ({marks})", (table, *chunk))
+            found.update((seq, json.loads(value)) for seq, value in rows)
+        return [found[seq] for seq in seqs if seq in found]
+
+    def scan(self, table):
+        self.flush()
+        rows = self._conn.execute("SELECT value FROM log WHERE tbl = ? ORDER BY seq", (table,))
+        return (json.loads(value) for (value,) in rows)
+
+    def count(self, table):
+        self.flush()
+        return self._conn.execute("SELECT COUNT(*) FROM log WHERE tbl = ?", (table,)).fetchone()[0]
+
+    def _maybe_flush(self):
+        pending = len(self._pending_kv) + len(self._pending_log)
+        if pending >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._commit()
+
+    def _commit(self):
+        pruned = []
+        if self._pending_kv or self._pending_log:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                if self._pending_kv:
+                    self._conn.executemany("INSERT OR REPLACE INTO kv (tbl, key, value) VALUES (?, ?, ?)", self._pending_kv)
+                if self._pending_log:
+                    self._conn.executemany("INSERT OR REPLACE INTO log (tbl, seq, ts, value) VALUES (?, ?, ?, ?)", self._pending_log)
+                if self.retention_seconds is not None:
+                    pruned = self._expire()
+            self._pending_kv.clear()
+            self._pending_log.clear()
+        self._last_flush = time.monotonic()
+        if self.on_prune is not None:
+            for table, seq in pruned:
+                self.on_prune(table, seq + 1)
+
+    def _expire(self):
+        # Trimmed as a prefix of seqs, so the indexes can be trimmed the same way
+        cutoff = time.time() - self.retention_seconds
+        pruned = self._conn.execute("SELECT tbl, MAX(seq) FROM log WHERE ts < ? GROUP BY tbl", (cutoff,)).fetchall()
+        self._conn.executemany("DELETE FROM log WHERE tbl = ? AND seq <= ?", pruned)
+        return pruned
+
+    def clear(self):
+        with self._lock:
+            self._pending_kv.clear()
+            self._pending_log.clear()
+            self._conn.execute("DELETE FROM kv")
+            self._conn.execute("DELETE FROM log")
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
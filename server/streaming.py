@@ -0,0 +1,139 @@
+import asyncio
+
+from schemas import encode_json
+
+TOPICS = ("alerts", "metrics")
+QUEUE_SIZE = 256
+
+
+class Subscriber:
+    __slots__ = ("queue", "topics", "agents", "types", "closed")
+
+    def __init__(self, topics=None, agents=None, types=None, queue_size=QUEUE_SIZE):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.topics = frozenset(topics or TOPICS)
+        self.agents = frozenset(agents) if agents else None
+        self.types = frozenset(types) if types else None  # alerts only
+        self.closed = False
+
+    async def get(self):
+        # Returns (topic, payload) or None once the hub has dropped this subscriber
+        return await self.queue.get()
+
+
+class BroadcastHub:
+    # Fans out new alerts and metrics to WebSocket/SSE subscribers. Each
+    # subscriber has a bounded queue; one that falls behind is disconnected
+    # instead of holding memory or slowing the publisher. Payloads are
+    # encoded once per message, not once per subscriber. Subscribers are
+    # indexed per topic by their agent filter, else by their alert type
+    # filter, so a message only visits subscribers that can want it.
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        # topic -> (unfiltered set, {agent_id: set}, {alert type: set})
+        self._index = {topic: (set(), {}, {}) for topic in TOPICS}
+        self.loop = None
+        self.published = 0
+        self.dropped = 0
+
+    def bind(self, loop):
+        self.loop = loop
+
+    def _groups(self, subscriber):
+        for topic in subscriber.topics:
+            unfiltered, by_agent, by_type = self._index[topic]
+            if subscriber.agents is not None:
+                for agent_id in subscriber.agents:
+                    yield by_agent, agent_id
+            elif subscriber.types is not None and topic == "alerts":
+                for kind in subscriber.types:
+                    yield by_type, kind
+            else:
+                yield None, unfiltered
+
+    def subscribe(self, topics=None, agents=None, types=None):
+        subscriber = Subscriber(topics, agents, types, self.queue_size)
+        self.subscribers.add(subscriber)
+        for index, key in self._groups(subscriber):
+            (key if index is None else index.setdefault(key, set())).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber not in self.subscribers:
+            return
+        self.subscribers.discard(subscriber)
+        for index, key in self._groups(subscriber):
+            if index is None:
+                key.discard(subscriber)
+                continue
+            group = index.get(key)
+            if group is not None:
+                group.discard(subscriber)
+                if not group:
+                    del index[key]
+
+    def publish(self, topic, message):
+        self.publish_many(topic, (message,))
+
+    def publish_many(self, topic, messages):
+        # Safe to call from the event loop or from threadpool workers
+        if not self.subscribers or self.loop is None:
+            return
+        messages = list(messages)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._deliver(topic, messages)
+        else:
+            self.loop.call_soon_threadsafe(self._deliver, topic, messages)
+
+    def _deliver(self, topic, messages):
+        unfiltered, by_agent, by_type = self._index[topic]
+        slow = []
+        for message in messages:
+            self.published += 1
+            agent_id = message.get("agent_id") or message.get("details", {}).get("agent_id")
+            kind = message.get("type")
+            agent_group = by_agent.get(agent_id) if by_agent else None
+            type_group = by_type.get(kind) if by_type else None
+            if not (unfiltered or agent_group or type_group):
+                continue
+            payload = encode_json(message).decode()
+            item = (topic, payload)
+            for group in (unfiltered, agent_group, type_group):
+                if not group:
+                    continue
+                for subscriber in group:
+                    # Agent-indexed subscribers may also filter alert types
+                    if group is agent_group and subscriber.types is not None and topic == "alerts" \
+                            and kind not in subscriber.types:
+                        continue
+                    try:
+                        subscriber.queue.put_nowait(item)
+                    except asyncio.QueueFull:
+                        slow.append(subscriber)
+            if slow:
+                for subscriber in slow:
+                    self._drop(subscriber)
+                slow.clear()
+
+    def _drop(self, subscriber):
+        if subscriber.closed:
+            return
+        subscriber.closed = True
+        self.unsubscribe(subscriber)
+        self.dropped += 1
+        # Make room for a wake-up so the consumer sees it was dropped
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    def stats(self):
+        return {"subscribers": len(self.subscribers), "published": self.published, "dropped_subscribers": self.dropped}
+
+
+HUB = BroadcastHub()
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# Tests import server modules the way the app does, from the server directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["AEGIS_STORAGE"] = "memory"
+
+
+@pytest.fixture
+def clean_state():
+    # Module-level stores (history, rolling stats, indexes, metrics, baselines)
+    # are shared by every test in the process; database.reset() clears them all
+    import database
+    database.reset()
+    yield
+    database.reset()
@@ -0,0 +1,76 @@
+from ai.correlation import Correlator
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_correlator(**kwargs):
+    clock, events = Clock(), []
+    kwargs.setdefault("ttl", 60)
+    kwargs.setdefault("update_interval", 30)
+    kwargs.setdefault("coordinated", 3)
+    return Correlator(sink=events.append, clock=clock, **kwargs), clock, events
+
+
+def kinds(events):
+    return [(e["event"], e.get("scope", "agent"), e["agent_id"]) for e in events]
+
+
+def test_incident_closes_ttl_after_the_last_alert():
+    correlator, clock, events = make_correlator()
+    correlator.submit({"type": "DDOS", "agent_id": "a1"})
+    clock.now = 20
+    correlator.submit({"type": "DDOS", "agent_id": "a1"})
+    correlator.expire(now=79)
+    assert kinds(events) == [("open", "agent", "a1")]
+    correlator.expire(now=80)
+    assert kinds(events) == [("open", "agent", "a1"), ("close", "agent", "a1")]
+    assert events[-1]["count"] == 2 and events[-1]["last_seen"] == 20
+    assert correlator.open_incidents() == []
+
+    # A later alert opens a new incident
+    clock.now = 200
+    correlator.submit({"type": "DDOS", "agent_id": "a1"})
+    assert events[-1]["event"] == "open" and events[-1]["incident_id"] != events[0]["incident_id"]
+
+
+def test_updates_are_throttled():
+    correlator, clock, events = make_correlator()
+    for t in range(101):
+        clock.now = t
+        correlator.submit({"type": "DDOS", "agent_id": "a1", "details": {"pps": t}})
+    assert [e["event"] for e in events] == ["open", "update", "update", "update"]
+    assert [e["last_seen"] for e in events] == [0, 30, 60, 90]
+    assert events[-1]["count"] == 91 and events[-1]["details"] == {"pps": 90}
+    stats = correlator.stats()
+    assert stats["alerts"] == 101 and stats["events"] == 4 and stats["reduction"] == 101 / 4
+
+
+def test_coordinated_incident_across_agents():
+    correlator, clock, events = make_correlator()
+    for i, agent in enumerate(("a1", "a2", "a3", "a4")):
+        clock.now = i
+        correlator.submit({"type": "DDOS", "agent_id": agent})
+    assert kinds(events) == [("open", "agent", "a1"), ("open", "agent", "a2"), ("open", "agent", "a3"),
+                             ("open", "fleet", None), ("open", "agent", "a4")]
+    fleet = events[3]
+    assert fleet["agent_count"] == 3 and fleet["details"] == {"agents": ["a1", "a2", "a3"]}
+    # Other alert types do not join it
+    correlator.submit({"type": "MALWARE_FLOW", "agent_id": "a5"})
+    assert correlator.stats()["coordinated"] == 1
+
+    correlator.expire(now=3 + 60)
+    closed = [e for e in events if e["event"] == "close"]
+    assert [(e.get("scope", "agent"), e["agent_id"]) for e in closed] == \
+        [("agent", "a1"), ("agent", "a2"), ("agent", "a3"), ("fleet", None), ("agent", "a4"), ("agent", "a5")]
+    assert closed[3]["agent_count"] == 4
+
+    # Once every agent incident has closed, one agent alone does not reopen the fleet incident
+    clock.now = 500
+    correlator.submit({"type": "DDOS", "agent_id": "a1"})
+    assert kinds(events[-1:]) == [("open", "agent", "a1")]
@@ -0,0 +1,75 @@
+import pytest
+
+import database
+
+from ai.anomaly_detector import PIPELINE, detect, detect_batch, predict_cpu_bottleneck
+from ai.baselines import BASELINES
+from database import add_historical_metric
+
+pytestmark = pytest.mark.usefixtures("clean_state")
+
+
+def record(agent_id, i, procs):
+    return {"agent_id": agent_id, "timestamp": 1700000000.0 + i, "cpu": 10.0, "memory": 20.0, "packets_per_sec": 100,
+            "net_io": {"sent": 1000, "recv": 1000, "outbound_connections": 1}, "per_process": procs}
+
+
+def test_batch_runs_inline_detectors_it_does_not_vectorize():
+    BASELINES.set_profile({"agent_id": "batch-rogue", "known_processes": ["sshd"]})
+    rogue = PIPELINE.registry.detectors["rogue_cpu_spike"]
+    before = rogue.histogram.count
+    records = [record("batch-rogue", i, [{"name": "sshd", "cpu": 1.0}]) for i in range(3)]
+    records.append(record("batch-rogue", 3, [{"name": "miner", "cpu": 95.0}]))
+    alerts = detect_batch(records)["batch-rogue"]
+    assert [a["details"]["offending_proc"]["name"] for a in alerts if a["type"] == "ROGUE_AGENT_DETECTED"] == ["miner"]
+    assert rogue.histogram.count == before + 4
+    # Same verdict as the single-record path
+    assert any(a["type"] == "ROGUE_AGENT_DETECTED" for a in detect(records[-1]))
+
+
+def test_batch_raises_what_single_ingest_raises(monkeypatch):
+    # A packet and CPU burst in the middle of the batch, over by its end
+    monkeypatch.setattr(PIPELINE, "max_pending", 0)
+    records = []
+    for agent_id in ("steady", "bursty"):
+        for i in range(40):
+            r = record(agent_id, i, [])
+            del r["per_process"]
+            if agent_id == "bursty" and 20 <= i < 25:
+                r["cpu"], r["packets_per_sec"] = 90.0, 1000
+            records.append(r)
+    records.sort(key=lambda r: r["timestamp"])
+
+    def known():
+        for agent_id in ("steady", "bursty"):
+            BASELINES.set_profile({"agent_id": agent_id, "known_processes": []})
+
+    known()
+    single = {}
+    for r in records:
+        add_historical_metric(r)
+        alerts = detect(r)
+        if alerts:
+            single.setdefault(r["agent_id"], []).extend(alerts)
+    database.reset()
+    known()
+    batch = detect_batch(records)
+
+    assert {a["type"] for a in single["bursty"]} == {"DDOS", "PREDICTED_CPU_BOTTLENECK"}
+    assert dict(batch) == single
+
+
+def test_trend_skips_records_without_the_series():
+    # Every third record lacks cpu; the trend reads the last 10 that have it
+    cpu = []
+    for i in range(30):
+        r = record("gappy", i, [])
+        if i % 3 == 2:
+            del r["cpu"]
+        else:
+            r["cpu"] = 10.0 if i < 21 else 40.0
+            cpu.append(r["cpu"])
+        add_historical_metric(r)
+    alert = predict_cpu_bottleneck("gappy")
+    assert cpu[-10:-5] == [10.0, 10.0, 10.0, 10.0, 40.0] and cpu[-5:] == [40.0] * 5
+    assert alert == {"type": "PREDICTED_CPU_BOTTLENECK", "details": {"predicted_cpu": 40.0}}
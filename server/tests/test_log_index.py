@@ -0,0 +1,115 @@
+import os
+
+from database import LogIndex, PRUNE_BATCH, RETENTION_SECONDS, open_backend
+from storage.sqlite import SQLiteBackend
+
+
+def make_index(records=()):
+    index = LogIndex(lambda r: r.get("type"), lambda r: r.get("agent_id"))
+    for record in records:
+        index.add(record)
+    return index
+
+
+def pages(index, **filters):
+    out, cursor = [], None
+    while True:
+        ids, cursor = index.query(cursor=cursor, **filters)
+        out.append(ids)
+        if cursor is None:
+            return out
+
+
+def test_pages_cover_every_match_newest_first():
+    index = make_index({"type": "A" if i % 3 else "B", "agent_id": f"a{i % 4}", "timestamp": 1000.0 + i}
+                       for i in range(250))
+    got = pages(index, limit=40)
+    assert [len(p) for p in got] == [40] * 6 + [10]
+    assert sum(got, []) == list(range(250, 0, -1))
+
+    ids = sum(pages(index, type="B", agent_id="a1", limit=7), [])
+    assert ids == [i + 1 for i in range(249, -1, -1) if i % 3 == 0 and i % 4 == 1]
+
+
+def test_time_range_uses_buckets_and_bounds():
+    # Timestamps out of id order must still come back in id order
+    times = [5000.0 - 37 * i for i in range(100)]
+    index = make_index({"type": "A", "agent_id": "x", "timestamp": t} for t in times)
+    ids = sum(pages(index, since=2000.0, until=4000.0, limit=9), [])
+    assert ids == [i + 1 for i in range(99, -1, -1) if 2000.0 <= times[i] <= 4000.0]
+
+
+def test_client_ids_are_ignored():
+    index = make_index([{"type": "A"}, {"type": "A", "id": 1}, {"type": "A", "id": 10 ** 19}])
+    assert index.query()[0] == [3, 2, 1]
+
+
+def test_unknown_filter_values_match_nothing():
+    index = make_index([{"type": "A", "agent_id": "x"}])
+    assert index.query(type="nope") == ([], None)
+    assert index.query(agent_id="nope") == ([], None)
+
+
+def test_prune_hides_then_drops_old_entries():
+    index = make_index({"type": "A", "agent_id": f"a{i % 3}", "timestamp": float(i)} for i in range(PRUNE_BATCH * 2))
+    index.prune(PRUNE_BATCH + 11)
+    assert min(sum(pages(index, limit=1000), [])) == PRUNE_BATCH + 11
+    assert min(sum(pages(index, agent_id="a1", limit=1000), [])) >= PRUNE_BATCH + 11
+    index.add({"type": "A", "agent_id": "a0", "timestamp": 0.0})  # compacts
+    assert len(index.ids) == PRUNE_BATCH - 10 + 1
+    assert min(index.by_bucket) == 0 and index.bucket_keys == sorted(index.by_bucket)
+    assert all(ids[0] >= PRUNE_BATCH + 11 or key == 0 for key, ids in index.by_bucket.items())
+
+
+def test_sqlite_retention_reports_pruned_prefix(tmp_path):
+    store = SQLiteBackend(str(tmp_path / "aegis.db"), batch_size=1, retention_seconds=3600)
+    pruned = []
+    store.on_prune = lambda table, first_kept: pruned.append((table, first_kept))
+    store.append("alerts", 1, {"id": 1})
+    store._conn.execute("UPDATE log SET ts = 0")  # make it old
+    store.append("alerts", 2, {"id": 2})
+    assert pruned == [("alerts", 2)]
+    assert [r["id"] for r in store.scan("alerts")] == [2]
+    store.close()
+
+
+def test_segment_log_retention_reports_pruned_prefix(tmp_path):
+    from storage.segment_log import SegmentLogBackend
+    store = SegmentLogBackend(str(tmp_path / "log"), segment_bytes=200, retention_bytes=300)
+    pruned = []
+    store.on_prune = lambda table, first_kept: pruned.append((table, first_kept))
+    for seq in range(1, 41):
+        store.append("alerts", seq, {"id": seq, "pad": "x" * 20})
+    kept = [r["id"] for r in store.scan("alerts")]
+    assert pruned and pruned[-1] == ("alerts", kept[0])
+    assert kept == list(range(kept[0], 41))
+    store.close()
+
+
+def test_default_retention_drops_old_rows_on_reopen(tmp_path):
+    assert RETENTION_SECONDS > 0
+    store = open_backend("sqlite", str(tmp_path), retention_seconds=0)  # keep everything
+    for seq in range(1, 4):
+        store.append("alerts", seq, {"id": seq})
+    store.flush()
+    store._conn.execute("UPDATE log SET ts = ts - ? WHERE seq <= 2", (RETENTION_SECONDS + 60,))
+    store.close()
+    store = open_backend("sqlite", str(tmp_path))
+    assert [r["id"] for r in store.scan("alerts")] == [3]
+    store.close()
+
+
+def test_segment_log_drops_aged_segments_on_reopen(tmp_path):
+    from storage.segment_log import SegmentLogBackend
+    store = SegmentLogBackend(str(tmp_path / "log"), segment_bytes=200, retention_seconds=None)
+    for seq in range(1, 41):
+        store.append("alerts", seq, {"id": seq, "pad": "x" * 20})
+    store.close()
+    directory = tmp_path / "log" / "log-alerts"
+    segments = sorted(p for p in directory.iterdir() if p.suffix == ".log")
+    for path in segments[:len(segments) // 2]:
+        os.utime(path, (0, 0))
+    store = SegmentLogBackend(str(tmp_path / "log"), segment_bytes=200, retention_seconds=3600)
+    kept = [r["id"] for r in store.scan("alerts")]
+    assert kept and kept == list(range(kept[0], 41)) and kept[0] > 1
+    store.close()
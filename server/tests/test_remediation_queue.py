@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+from ai.remediation_queue import RemediationQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubExecutor:
+    def __init__(self, hang=False):
+        self.batches = []
+        self.hang = hang
+
+    async def execute(self, actions):
+        self.batches.append([(a["target"], a["action"]) for a in actions])
+        if self.hang:
+            await asyncio.Event().wait()
+
+
+def alert(kind, agent_id="a1"):
+    return {"type": kind, "agent_id": agent_id}
+
+
+def make_queue(**kwargs):
+    # Bound to the loop but without the dispatch task: tests step it with run_batch
+    clock, executor = Clock(), StubExecutor()
+    queue = RemediationQueue(executor, clock=clock, batch_interval=0, **kwargs)
+    queue.bind()
+    return queue, clock, executor
+
+
+async def run_batch(queue):
+    await queue._dispatch(await queue._next_batch(queue.loop.create_future()))
+
+
+def test_duplicate_actions_coalesce_within_the_window():
+    async def run():
+        queue, clock, executor = make_queue(coalesce_window=30)
+        accepted = [queue.submit(alert("DDOS")) for _ in range(3)] + [queue.submit(alert("DDOS", "a2"))]
+        await run_batch(queue)
+        clock.now += 30
+        accepted.append(queue.submit(alert("DDOS")))
+        await run_batch(queue)
+        return accepted, executor.batches, queue.counters
+
+    accepted, batches, counters = asyncio.run(run())
+    assert accepted == [True, False, False, True, True]
+    assert batches == [[("a1", "reroute_traffic"), ("a2", "reroute_traffic")], [("a1", "reroute_traffic")]]
+    assert counters["coalesced"] == 2 and counters["executed"] == 3
+
+
+def test_token_bucket_defers_instead_of_dropping():
+    async def run():
+        queue, clock, executor = make_queue(rate=20.0, burst=1)
+        for kind in ("DDOS", "MALWARE_FLOW", "UNRECOGNIZED_AGENT"):
+            queue.submit(alert(kind))
+        await run_batch(queue)
+        deferred = queue.stats()["deferred"]
+        for _ in range(2):
+            clock.now += 0.1  # refills the single token (20/s, burst 1)
+            await run_batch(queue)
+        return deferred, executor.batches, queue.counters
+
+    deferred, batches, counters = asyncio.run(run())
+    assert deferred == 2
+    assert batches == [[("a1", "reroute_traffic")], [("a1", "isolate_endpoint")], [("a1", "quarantine")]]
+    assert counters["rate_limited"] == 3 and counters["executed"] == 3
+
+
+def test_prune_forgets_idle_targets():
+    async def run():
+        queue, clock, _ = make_queue(rate=1.0, burst=5, coalesce_window=30, batch_size=2000)
+        for i in range(1000):
+            queue.submit(alert("DDOS", f"a{i}"))
+        await run_batch(queue)
+        sizes = [(len(queue._recent), len(queue._buckets))]
+        clock.now += 10
+        queue.submit(alert("DDOS", "busy"))
+        await run_batch(queue)
+        queue._prune(clock())  # buckets idle 10 s (> burst/rate) go, dedup entries stay
+        sizes.append((len(queue._recent), len(queue._buckets)))
+        clock.now += 25
+        queue._prune(clock())  # past the coalesce window for the first 1000, "busy" idle too
+        sizes.append((len(queue._recent), len(queue._buckets)))
+        clock.now += 10
+        queue._prune(clock())
+        sizes.append((len(queue._recent), len(queue._buckets)))
+        return sizes
+
+    assert asyncio.run(run()) == [(1000, 1000), (1001, 1), (1, 0), (0, 0)]
+
+
+def test_stop_with_an_item_in_flight():
+    # An item queued in the same tick as stop() used to leave the run loop
+    # waiting on the queue forever
+    async def run():
+        executor = StubExecutor()
+        queue = RemediationQueue(executor, batch_interval=0.2)
+        queue.start()
+        queue.submit(alert("DDOS"))
+        for _ in range(3):
+            await asyncio.sleep(0)  # the run loop is now gathering a batch
+        queue.submit(alert("MALWARE_FLOW"))
+        task, start = queue._task, time.monotonic()
+        await asyncio.wait((asyncio.ensure_future(queue.stop()),), timeout=1)
+        return task, time.monotonic() - start, executor.batches
+
+    task, elapsed, batches = asyncio.run(run())
+    assert task.done() and elapsed < 0.5
+    assert batches == [[("a1", "reroute_traffic"), ("a1", "isolate_endpoint")]]
+
+
+def test_stop_is_bounded_when_the_executor_hangs():
+    async def run():
+        executor = StubExecutor(hang=True)
+        queue = RemediationQueue(executor, batch_interval=0)
+        queue.start()
+        queue.submit(alert("DDOS"))
+        for _ in range(3):
+            await asyncio.sleep(0)
+        start = time.monotonic()
+        await queue.stop(timeout=0.05)
+        return executor.batches, time.monotonic() - start
+
+    batches, elapsed = asyncio.run(run())
+    assert batches == [[("a1", "reroute_traffic")]] and elapsed < 0.5
@@ -0,0 +1,87 @@
+import pickle
+
+import numpy as np
+
+from history_store import ColumnarHistory, Rollups, SKETCH_GAMMA, TIERS
+
+T0 = 1_700_000_000 - 1_700_000_000 % 3600  # on an hour boundary
+
+
+def feed(samples, cpu, agent_id="a1", step=1.0):
+    history = ColumnarHistory(maxlen=100)
+    rollups = Rollups(history, tiers=((60, 30), (3600, 4)))
+    for t in range(samples):
+        record = {"agent_id": agent_id, "timestamp": T0 + t * step, "cpu": cpu(t), "memory": 50.0,
+                  "packets_per_sec": 10, "net_io": {"sent": 1, "recv": 2}}
+        rollups.observe(history.append(record))
+    return history, rollups
+
+
+def test_minute_buckets_are_exact():
+    values = np.random.default_rng(3).uniform(1, 100, 180)
+    _, rollups = feed(180, lambda t: float(values[t]))
+    out = rollups.query("a1", "cpu", T0, T0 + 179, resolution=60)
+    assert out["resolution"] == 60 and out["timestamps"] == [T0, T0 + 60, T0 + 120]
+    for i in range(3):
+        minute = values[i * 60:(i + 1) * 60].astype(np.float32)
+        assert out["count"][i] == 60
+        assert out["min"][i] == minute.min() and out["max"][i] == minute.max()
+        assert abs(out["mean"][i] - minute.mean()) < 1e-3
+        assert out["p95"][i] == np.percentile(minute, 95, method="inverted_cdf")
+
+
+def test_minutes_longer_than_the_ring_spill_into_the_sketch():
+    # 4 samples a second: each minute outgrows the 100-sample ring
+    values = np.random.default_rng(5).lognormal(3, 1, 480)
+    _, rollups = feed(480, lambda t: float(values[t]), step=0.25)
+    out = rollups.query("a1", "cpu", T0, T0 + 119, resolution=60)
+    for i in range(2):
+        minute = values[i * 240:(i + 1) * 240].astype(np.float32)
+        assert out["count"][i] == 240 and out["max"][i] == minute.max()
+        true = np.percentile(minute, 95, method="inverted_cdf")
+        assert abs(out["p95"][i] - true) <= (SKETCH_GAMMA - 1) * true * 1.0001
+
+
+def test_hour_p95_within_the_sketch_bound():
+    values = np.random.default_rng(7).uniform(1, 100, 3700)
+    _, rollups = feed(3700, lambda t: float(values[t]))
+    out = rollups.query("a1", "cpu", T0, T0 + 3699, resolution=3600)
+    hour = values[:3600].astype(np.float32)
+    true = np.percentile(hour, 95, method="inverted_cdf")
+    assert out["count"] == [3600, 100]
+    assert abs(out["p95"][0] - true) <= (SKETCH_GAMMA - 1) * true * 1.0001
+
+
+def test_minutes_cascade_into_hours():
+    _, rollups = feed(2 * 3600 + 600, lambda t: float(t // 3600 + 1))
+    out = rollups.query("a1", "cpu", T0, T0 + 2 * 3600 + 599, resolution=3600)
+    assert out["resolution"] == 3600 and out["timestamps"] == [T0, T0 + 3600, T0 + 7200]
+    assert out["count"] == [3600, 3600, 600]
+    assert out["mean"] == [1.0, 2.0, 3.0] and out["min"] == [1.0, 2.0, 3.0] and out["max"] == [1.0, 2.0, 3.0]
+
+
+def test_pick_tier_prefers_the_coarsest_tier_that_fits():
+    _, rollups = feed(10, lambda t: 1.0)
+    now = T0 + 4 * 3600
+    assert rollups.pick_tier(now - 60, now) == 0          # raw samples cover it
+    assert rollups.pick_tier(now - 1200, now) == 1        # past the raw ring, 30 minutes of minutes
+    assert rollups.pick_tier(now - 1200, now, resolution=1) == 1
+    assert rollups.pick_tier(now - 3 * 3600, now) == 2    # past the minute tier
+    assert rollups.pick_tier(now - 30 * 3600, now) == 2   # nothing covers it: coarsest
+
+
+def test_snapshot_keeps_history_out_and_layout_in():
+    _, rollups = feed(120, lambda t: 5.0)
+    restored = pickle.loads(pickle.dumps(rollups))
+    assert "history" not in restored.__dict__ and restored.layout == rollups.layout
+    assert Rollups(ColumnarHistory(), tiers=((60, 30),)).layout != rollups.layout
+
+
+def test_memory_per_agent():
+    # Default tiers: 6 hours of minutes and 7 days of hours. Closed buckets
+    # are float32 stats rows; only the hour tier keeps a (uint16) sketch.
+    assert TIERS == ((60, 360), (3600, 168))
+    history = ColumnarHistory(maxlen=100, initial_slots=1)
+    rollups = Rollups(history)
+    rollups.observe(history.append({"agent_id": "a1", "timestamp": float(T0), "cpu": 1.0}))
+    assert rollups.nbytes / history._capacity < 72_000
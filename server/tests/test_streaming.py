@@ -0,0 +1,46 @@
+import asyncio
+
+from streaming import BroadcastHub
+
+
+def drain(subscriber):
+    out = []
+    while not subscriber.queue.empty():
+        out.append(subscriber.queue.get_nowait())
+    return out
+
+
+def test_messages_reach_only_matching_subscribers():
+    async def run():
+        hub = BroadcastHub()
+        hub.bind(asyncio.get_running_loop())
+        everything = hub.subscribe()
+        agent = hub.subscribe(topics=["alerts"], agents=["a1"])
+        agent_ddos = hub.subscribe(topics=["alerts"], agents=["a1"], types=["DDOS"])
+        ddos = hub.subscribe(topics=["alerts"], types=["DDOS"])
+        metrics = hub.subscribe(topics=["metrics"], agents=["a2"])
+        hub.publish_many("alerts", [
+            {"type": "DDOS", "agent_id": "a1"},
+            {"type": "MALWARE_FLOW", "details": {"agent_id": "a1"}},
+            {"type": "DDOS", "agent_id": "a2"},
+        ])
+        hub.publish("metrics", {"agent_id": "a2", "cpu": 1.0})
+        return [len(drain(s)) for s in (everything, agent, agent_ddos, ddos, metrics)]
+
+    assert asyncio.run(run()) == [4, 2, 1, 2, 1]
+
+
+def test_unsubscribe_and_slow_subscribers_leave_the_index():
+    async def run():
+        hub = BroadcastHub(queue_size=2)
+        hub.bind(asyncio.get_running_loop())
+        gone = hub.subscribe(agents=["a1"])
+        slow = hub.subscribe(types=["DDOS"])
+        hub.unsubscribe(gone)
+        hub.publish_many("alerts", [{"type": "DDOS", "agent_id": "a1"}] * 3)
+        return hub, gone, slow
+
+    hub, gone, slow = asyncio.run(run())
+    assert drain(gone) == [] and drain(slow) == [None]
+    assert hub.subscribers == set() and hub.dropped == 1
+    assert all(not unfiltered and not by_agent and not by_type for unfiltered, by_agent, by_type in hub._index.values())
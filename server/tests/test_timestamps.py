@@ -0,0 +1,37 @@
+import os
+import time
+
+import msgspec
+import pytest
+
+from history_store import parse_timestamp
+from schemas import MetricRecord, _check_timestamps, decode
+
+
+@pytest.fixture
+def tokyo():
+    old = os.environ.get("TZ")
+    os.environ["TZ"] = "Asia/Tokyo"
+    time.tzset()
+    yield
+    if old is None:
+        os.environ.pop("TZ")
+    else:
+        os.environ["TZ"] = old
+    time.tzset()
+
+
+def test_naive_iso_timestamps_are_utc_whatever_the_server_zone(tokyo):
+    assert parse_timestamp("2026-01-01T00:00:00") == 1767225600.0
+    assert parse_timestamp("2026-01-01T09:00:00+09:00") == 1767225600.0
+    assert parse_timestamp("2026-01-01 00:00:00.500000") == 1767225600.5
+    assert parse_timestamp(1767225600) == 1767225600.0
+
+
+def test_unparseable_timestamps_are_rejected():
+    with pytest.raises(ValueError):
+        parse_timestamp("yesterday")
+    batch = decode(b'[{"agent_id": "a", "timestamp": "2026-01-01T00:00:00"}, {"agent_id": "b", "timestamp": "soon"}]',
+                   list[MetricRecord])
+    with pytest.raises(msgspec.ValidationError, match="soon"):
+        _check_timestamps(batch)